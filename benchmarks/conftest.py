@@ -0,0 +1,112 @@
+"""Fixtures of benchmarks: bundled test meshes preprocessed once per session with synthetic solver results.
+
+Energy densities of each step come from the analytic field of MockSolver and are written to a .dat file
+in CalculiX format, so no solver is needed and the same inputs are measured on every commit.
+Structured meshes of a chosen size are added by --synthetic, e.g. --synthetic hexa8:100000,tetra4:1000000.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import beso.beso_lib as beso_lib
+from beso.element_states import ElementStates
+from beso.optimizer import Config, Optimizer
+from beso.solvers import MockSolver, write_energy_density_dat
+from beso.synthetic_mesh import NONDESIGN_SET, OPTIMIZED_SET, StructuredMesh
+
+INP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "inp")
+
+MODELS = {
+    "2DBeam": {
+        "domain_optimized": {"SolidMaterialElementGeometry2D": True},
+        "domain_density": {"SolidMaterialElementGeometry2D": [1e-6, 1]},
+        "domain_thickness": {"SolidMaterialElementGeometry2D": [1.0, 1.0]},
+        "domain_material": {"SolidMaterialElementGeometry2D": ["*ELASTIC \n210000e-6,  0.3",
+                                                               "*ELASTIC \n210000,  0.3"]},
+        "filter_radius": 2,
+    },
+    # 4 load cases in the included Gmsh decks FEMMeshGmsh_Node_Force_LC1-4.inp
+    "EngineBracket": {
+        "domain_optimized": {"SolidMaterial001Solid": True, "SolidMaterialSolid": False},
+        "domain_density": {"SolidMaterial001Solid": [1e-6, 7.85e-9], "SolidMaterialSolid": [7.85e-9, 7.85e-9]},
+        "domain_material": {"SolidMaterial001Solid": ["*ELASTIC \n210e-3,  0.3", "*ELASTIC \n210e3,  0.3"],
+                            "SolidMaterialSolid": ["*ELASTIC \n210e3,  0.3", "*ELASTIC \n210e3,  0.3"]},
+        "filter_radius": 2,
+    },
+}
+
+# configuration of meshes of beso.synthetic_mesh with unit cells
+SYNTHETIC_MODEL = {
+    "domain_optimized": {OPTIMIZED_SET: True, NONDESIGN_SET: False},
+    "domain_density": {OPTIMIZED_SET: [1e-6, 1], NONDESIGN_SET: [1, 1]},
+    "domain_thickness": {OPTIMIZED_SET: [1.0, 1.0], NONDESIGN_SET: [1.0, 1.0]},  # of tria3 and quad4
+    "domain_material": {OPTIMIZED_SET: ["*ELASTIC \n210000e-6,  0.3", "*ELASTIC \n210000,  0.3"],
+                        NONDESIGN_SET: ["*ELASTIC \n210000,  0.3", "*ELASTIC \n210000,  0.3"]},
+    "filter_radius": 1.5,
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--synthetic", default="", help="comma separated category:elements of structured meshes "
+                                                     "benchmarked in addition to the bundled ones")
+
+
+class Model:
+    """Preprocessed model with element states and sensitivity numbers of an iteration and its .dat file."""
+
+    def __init__(self, name, directory):
+        file_name = os.path.join(INP_DIR, name + ".inp")
+        options = MODELS.get(name, SYNTHETIC_MODEL)
+        if name not in MODELS:  # category:elements
+            [category, elements] = name.split(":")
+            file_name = os.path.join(directory, "synthetic.inp")
+            StructuredMesh(category, int(elements)).write_inp(file_name)
+        elif name == "2DBeam":  # without the special type elements added for import tests
+            with open(file_name) as f:
+                inp = f.read()
+            file_name = os.path.join(directory, name + ".inp")
+            with open(file_name, "w") as f:
+                f.write(inp[:inp.index("** axisymmetry elements")] + inp[inp.index("** Face elements"):])
+        self.config = Config(path=os.path.dirname(file_name), file_name=os.path.basename(file_name),
+                             **options)
+        self.file_name = file_name
+        self.directory = directory
+        self.optimizer = Optimizer(self.config)
+        self.optimizer.preprocess(self.config)
+        self.domains_from_config = self.config.domain_optimized.keys()
+        self.number_of_states = max(len(density) for density in self.config.domain_density.values())
+        self.inp_template = beso_lib.parse_inp_template(file_name)
+        self.steps = len(beso_lib.split_inp_template_steps(self.inp_template))
+
+        optimizer = self.optimizer
+        self.elm_states = ElementStates(optimizer.en_all)
+        for dn in self.domains_from_config:
+            self.elm_states.set(optimizer.domains[dn], len(self.config.domain_density[dn]) - 1)
+        self.elm_states.set(optimizer.opt_domains[::3], 0)  # part of the optimized elements is void
+
+        solver = MockSolver(optimizer.domains, self.domains_from_config, optimizer.en_all, optimizer.cg,
+                            self.number_of_states)
+        energy_density_step = np.concatenate([solver.energy_density(sn, self.elm_states) for sn in range(self.steps)])
+        self.job_name = os.path.join(directory, "file000")
+        write_energy_density_dat(self.job_name, optimizer.domains, self.domains_from_config, optimizer.en_all,
+                                 energy_density_step)
+        # ordered as element_index rows as in the optimization
+        self.sensitivity_number = energy_density_step.max(axis=0)[
+            self.elm_states.rows(optimizer.element_index.element_numbers)]
+        self.mass = [float(sum(optimizer.volume_elm.get(en, 0.0) + optimizer.area_elm.get(en, 0.0)
+                               for en in optimizer.opt_domains))]
+
+
+def pytest_generate_tests(metafunc):
+    if "model" in metafunc.fixturenames:
+        synthetic = [name for name in metafunc.config.getoption("synthetic").split(",") if name]
+        metafunc.parametrize("model", list(MODELS) + synthetic, indirect=True, scope="session")
+
+
+@pytest.fixture(scope="session")
+def model(request, tmp_path_factory):
+    name = request.param
+    if name == "EngineBracket" and not os.path.isfile(os.path.join(INP_DIR, "FEMMeshGmsh_Node_Elem_sets.inp")):
+        pytest.skip("EngineBracket.inp includes FEMMeshGmsh_Node_Elem_sets.inp, which is not in tests/inp")
+    return Model(name, str(tmp_path_factory.mktemp(name.replace(":", "_"))))
@@ -0,0 +1,53 @@
+import os
+
+import beso.beso_lib as beso_lib
+import beso.vtu as vtu
+from beso.history import HistoryWriter
+
+
+def test_export_vtk(benchmark, model):
+    optimizer = model.optimizer
+    incidence = beso_lib.ElementNodeIncidence(optimizer.element_index)
+    benchmark(beso_lib.export_vtk, os.path.join(model.directory, "file001"), optimizer.nodes, optimizer.Elements,
+              model.elm_states, model.sensitivity_number, incidence)
+
+
+def test_append_vtk_states(benchmark, model):
+    optimizer = model.optimizer
+    file_name = os.path.join(model.directory, "resulting_states")
+    [en_all_vtk, associated_nodes] = beso_lib.vtk_mesh(file_name, optimizer.nodes, optimizer.Elements)
+    benchmark(beso_lib.append_vtk_states, file_name, 1, en_all_vtk, model.elm_states)
+
+
+def test_export_vtu(benchmark, model):
+    optimizer = model.optimizer
+    vtu_mesh = vtu.VtuMesh(optimizer.nodes, optimizer.element_index)
+    benchmark(vtu.export_vtu, os.path.join(model.directory, "file001"), vtu_mesh, model.elm_states,
+              model.sensitivity_number)
+
+
+def test_export_frd(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(beso_lib.export_frd, os.path.join(model.directory, "file001"), optimizer.nodes, optimizer.Elements,
+              model.elm_states, model.number_of_states)
+
+
+def test_export_inp(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(beso_lib.export_inp, os.path.join(model.directory, "file001"), optimizer.nodes, optimizer.Elements,
+              model.elm_states, model.number_of_states)
+
+
+def test_export_csv(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(beso_lib.export_csv, model.domains_from_config, optimizer.domains,
+              os.path.join(model.directory, "file001"), optimizer.cg, model.elm_states, model.sensitivity_number,
+              optimizer.element_index.element_numbers)
+
+
+def test_history_record(benchmark, model):
+    history_writer = HistoryWriter(os.path.join(model.directory, "resulting_history.npz"),
+                                   model.optimizer.element_index.element_numbers)
+    iterations = iter(range(1, 10 ** 6))
+    benchmark(lambda: history_writer.record(next(iterations), model.elm_states, model.sensitivity_number,
+                                            model.mass[0], 1.0))
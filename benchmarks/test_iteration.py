@@ -0,0 +1,39 @@
+import os
+
+import beso.beso_filters as beso_filters
+import beso.beso_lib as beso_lib
+
+
+def test_write_inp(benchmark, model):
+    optimizer = model.optimizer
+    config = model.config
+    job_name = os.path.join(model.directory, "file001")
+    benchmark(beso_lib.write_inp, model.inp_template, job_name, model.elm_states, model.number_of_states,
+              optimizer.domains, model.domains_from_config, config.domain_optimized, config.domain_thickness,
+              config.domain_offset, config.domain_orientation, config.domain_material, optimizer.domain_volumes,
+              optimizer.domain_shells, optimizer.plane_strain, optimizer.plane_stress, optimizer.axisymmetry, 1, 1)
+
+
+def test_import_FI_int_pt(benchmark, model):
+    [energy_density_step, energy_density_eigen] = benchmark(
+        beso_lib.import_FI_int_pt, model.job_name, model.optimizer.en_all, model.domains_from_config)
+    assert energy_density_step.shape == (model.steps, len(model.optimizer.en_all))
+
+
+def test_run2(benchmark, model):
+    filter_matrix = model.optimizer.filter_matrix(model.config.filter_radius)
+    filter_rows = model.optimizer.element_index.rows(filter_matrix.element_numbers)
+    benchmark(beso_filters.run2, model.file_name, model.sensitivity_number[filter_rows], filter_matrix)
+
+
+def test_switching(benchmark, model):
+    optimizer = model.optimizer
+    config = model.config
+
+    def setup():  # switching changes element states and appends to mass
+        args = (model.elm_states.copy(), model.domains_from_config, config.domain_optimized, config.domain_density,
+                config.domain_thickness, optimizer.element_index, model.sensitivity_number, list(model.mass),
+                model.mass[0], config.mass_addition_ratio, config.mass_removal_ratio, 0, 1, 0.4 * model.mass[0])
+        return args, {}
+
+    benchmark.pedantic(beso_lib.switching, setup=setup, rounds=20)
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import beso.beso_filters as beso_filters
+import beso.beso_lib as beso_lib
+from beso.element_index import ElementIndex
+from beso.import_inp import import_inp
+
+from conftest import INP_DIR
+
+
+def test_import_inp(benchmark, model):
+    config = model.config
+    benchmark(import_inp, model.file_name, model.domains_from_config, config.domain_optimized)
+
+
+def test_elm_volume_cg(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(beso_lib.elm_volume_cg, model.file_name, optimizer.nodes, optimizer.Elements)
+
+
+def test_prepare2s(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(beso_filters.prepare2s, optimizer.cg, optimizer.cg_min, optimizer.cg_max, model.config.filter_radius,
+              optimizer.opt_domains)
+
+
+def test_element_index(benchmark, model):
+    optimizer = model.optimizer
+    benchmark(ElementIndex, optimizer.Elements, optimizer.domains, model.domains_from_config)
+
+
+# the deck and its load case decks are parsed without the mesh, so these run also without the EngineBracket mesh
+@pytest.mark.parametrize("name", ["2DBeam", "EngineBracket"])
+def test_parse_inp_template(benchmark, name):
+    benchmark(beso_lib.parse_inp_template, os.path.join(INP_DIR, name + ".inp"))
+
+
+def test_split_load_cases(benchmark):
+    inp_template = beso_lib.parse_inp_template(os.path.join(INP_DIR, "EngineBracket.inp"))
+
+    def split_load_cases():
+        inp_templates = beso_lib.split_inp_template_steps(beso_lib.absolute_include_paths(inp_template, INP_DIR))
+        assert len(inp_templates) == 4
+        return inp_templates
+
+    benchmark(split_load_cases)
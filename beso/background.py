@@ -0,0 +1,61 @@
+import queue
+import threading
+
+
+class BackgroundWorker:
+    """Thread running submitted tasks one after another out of the main loop (e.g. file cleanup or exports).
+
+    An error of a task stops running further tasks and it is raised in the main thread by the next submit or flush.
+
+    :param telemetry: Telemetry timing each task as a phase named by the qualified name of its function.
+    """
+
+    def __init__(self, name="beso-background", telemetry=None):
+        self.telemetry = telemetry
+        self.tasks = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                if self.error is None:
+                    [function, args, kwargs] = task
+                    if self.telemetry is not None:
+                        function = self.telemetry.timed(function.__qualname__, function)
+                    function(*args, **kwargs)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.tasks.task_done()
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def submit(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) in the background thread after previously submitted tasks."""
+        self.raise_error()
+        self.tasks.put((function, args, kwargs))
+
+    def flush(self):
+        """Wait until all submitted tasks are done."""
+        self.tasks.join()
+        self.raise_error()
+
+    def close(self, raise_error=True):
+        """Finish submitted tasks and stop the thread, closing a stopped worker does nothing.
+
+        :param raise_error: Raise an error of a task, False when closing after another error.
+        """
+        if self.thread.is_alive():
+            self.tasks.put(None)
+            self.thread.join()
+        if raise_error:
+            self.raise_error()
@@ -32,7 +32,6 @@ mass_goal_ratio = 0.40  # the goal mass as a fragment of the full mass of optimi
 
 # TODO: Can we automatically determine the filter radius from mesh element size?
 #       Heuristic is element size * 2 or * 3.
-# TODO: Filter radius of 0.1 (small) causes infinite loop
 filter_radius = 2
 # averages sensitivity number with surroundings (suffer from boundary sticking?),
 # works on sensitivities
@@ -46,4 +45,31 @@ save_iteration_results = 10  # every i-th iteration save temporary results, 0 -
 save_solver_files = ""  # not removed outputs from the solver, e.g. "inp frd dat cvg sta" will preserve all outputs in iterations defined by save_iteration_results
 save_resulting_format = "inp vtk" # "frd" or "inp" format of resulting meshes (each state separately in own mesh file)
                                   # "vtk" output for viewing in Paraview (renumbered mesh, states, sensitivity numbers, failure indices)
+                                  # "vtu" binary compressed output for Paraview, states of iterations are written
+                                  #       as resulting_states.pvd time series instead of resulting_states.vtk
+                                  # "history" compressed resulting_history.npz with states (as changes), sensitivity
+                                  #           numbers, mass and mean energy density of all iterations, see history.py
                                   # "csv" simple tabelized data - also possible to import into Paraview (element centres of gravity, states, sensitivity numbers, failure indices)
+scratch_dir = ""  # fast local directory (e.g. "/dev/shm") for solver files of iterations, "" - solver files are in path
+                  # files preserved by save_solver_files are moved to path, relative *INCLUDE paths are resolved from path
+split_solver_deck = False  # True - mesh, boundary conditions and loads are written once to include files (file_staticNNN.inp)
+                           # and iteration files contain only *INCLUDE cards with ELSETs, materials and sections of states
+stream_solver_output = False  # True - energy densities are parsed from .dat file while CalculiX is still writing it
+parallel_load_cases = 0  # 0 - all steps are solved in one CalculiX job,
+                         # n - each *STEP is solved as a separate load case (fileNNN_lcK.inp), n jobs run at once
+                         # with cpu cores divided between them, steps must not depend on each other
+preprocessing_cache = ""  # directory for caching imported mesh, element geometry and filter between runs, "" - no caching
+                          # entries are keyed by a hash of the input file, domain_optimized and filter_radius
+preprocessing_cache_limit = 0  # maximal size of the cache directory in bytes, least recently used entries are evicted first
+                               # 0 - no limit
+checkpoint = False  # True - state of iterations is saved to checkpoint.npz in path after switching of each iteration
+resume = False  # True - continue from the last completed iteration saved in checkpoint.npz (requires the same model),
+                # starts from iteration 0 if there is no checkpoint
+solver_backend = "calculix"  # "calculix" - run ccx found in PATH
+                             # "mock" - deterministic energy densities from element positions and states without ccx,
+                             #          for profiling and benchmarking the iteration pipeline
+mock_solver_dat = ""  # .dat file replayed by the "mock" backend in every iteration instead of the analytic field
+cpu_cores = 0  # number of cpu cores used by CalculiX, 0 - all cores of the computer
+headless = False  # True - no plots at the end (matplotlib is not imported), plot later by python -m beso.plot path/convergence.csv
+telemetry = ""  # "time" - times of phases (import, write_inp, solver, exporters, ...) and switched elements of each iteration as JSON lines in path/telemetry.jsonl,
+                # "time memory" - with tracemalloc peaks of phases and peak RSS (slower), peaks of phases listed in memory_shared include concurrent background exports, "time profile" - with cProfile stats of each phase in path/profiles/
@@ -7,18 +7,99 @@ import numpy as np
 import beso.beso_lib as beso_lib
 import logging
 
-def sround(x, s):
-    """round float number x to s significant digits"""
-    if x > 0:
-        result = round(x, -int(np.floor(np.log10(x))) + s - 1)
-    elif x < 0:
-        result = round(x, -int(np.floor(np.log10(-x))) + s - 1)
-    elif x == 0:
-        result = 0
-    return result
+# neighbouring cells of a cell given by integer offsets, only "forward" half of 26 neighbours is listed
+# so that each couple of cells is visited once
+# down level neighbouring cells:
+# o  o  -
+# o  -  -
+# o  -  -
+# middle level neighbouring cells:
+# o  o  -
+# o self -
+# o  -  -
+# upper level neighbouring cells:
+# o  o  -
+# o  o  -
+# o  -  -
+NEIGHBOUR_CELL_OFFSETS = [(1, -1, -1), (1, 0, -1), (1, 1, -1), (0, 1, -1),
+                          (1, -1, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+                          (1, -1, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1), (0, 0, 1)]
+
+
+# function finding all couples of points closer than r_min
+# points are hashed into cubic cells with edge r_min given by integer indices, only occupied cells are stored,
+# and distances are computed only between points of the same cell and of the neighbouring cells
+# returns row indices of the first and second point of each couple (each couple once) and their distances
+def near_points(points, r_min, origin=None, chunk_size=2 ** 22):
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if origin is None:
+        origin = points.min(axis=0)
+    if r_min <= 0 or len(points) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    cells = np.floor((points - origin) / r_min).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # shift to start from 1 so that neighbour cells have non-negative indices
+
+    # sorting points by cells
+    order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+    sorted_cells = cells[order]
+    new_cell = np.ones(len(points), dtype=bool)
+    new_cell[1:] = np.any(sorted_cells[1:] != sorted_cells[:-1], axis=1)
+    cell_start = np.flatnonzero(new_cell)
+    cell_count = np.diff(np.append(cell_start, len(points)))
+    occupied_cells = sorted_cells[cell_start]
+
+    # occupied cell lookup by a linear key (sorted as lexsort above), dictionary if the key would overflow
+    dims = [int(d) + 2 for d in occupied_cells.max(axis=0)]
+    if dims[0] * dims[1] * dims[2] < 2 ** 62:
+        cell_keys = (occupied_cells[:, 0] * dims[1] + occupied_cells[:, 1]) * dims[2] + occupied_cells[:, 2]
+
+        def find_cells(neighbour_cells):
+            keys = (neighbour_cells[:, 0] * dims[1] + neighbour_cells[:, 1]) * dims[2] + neighbour_cells[:, 2]
+            position = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+            return np.where(cell_keys[position] == keys, position, -1)
+    else:
+        cell_ids = {cell: k for k, cell in enumerate(map(tuple, occupied_cells.tolist()))}
+
+        def find_cells(neighbour_cells):
+            return np.array([cell_ids.get(cell, -1) for cell in map(tuple, neighbour_cells.tolist())],
+                            dtype=np.int64)
+
+    # couples of points from couples of cells, split to chunks of limited size
+    def cell_couples(cells_a, cells_b, same_cell):
+        if len(cells_a) == 0:
+            return
+        chunk_end = np.cumsum(cell_count[cells_a] * cell_count[cells_b])
+        chunk_bounds = np.searchsorted(chunk_end, np.arange(chunk_size, chunk_end[-1], chunk_size), side="right")
+        for ca, cb in zip(np.split(cells_a, chunk_bounds), np.split(cells_b, chunk_bounds)):
+            count = cell_count[ca] * cell_count[cb]
+            couple = np.repeat(np.arange(len(ca)), count)
+            k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            first = cell_start[ca][couple] + k // cell_count[cb][couple]
+            second = cell_start[cb][couple] + k % cell_count[cb][couple]
+            if same_cell:
+                first_is_lower = first < second
+                first = first[first_is_lower]
+                second = second[first_is_lower]
+            first = order[first]
+            second = order[second]
+            distance = np.sqrt(np.sum((points[first] - points[second]) ** 2, axis=1))
+            near = distance < r_min
+            yield first[near], second[near], distance[near]
+
+    all_cells = np.arange(len(occupied_cells))
+    found = list(cell_couples(all_cells, all_cells, True))
+    for offset in NEIGHBOUR_CELL_OFFSETS:
+        neighbours = find_cells(occupied_cells + offset)
+        occupied = neighbours >= 0
+        found.extend(cell_couples(all_cells[occupied], neighbours[occupied], False))
+    first = np.concatenate([f[0] for f in found])
+    second = np.concatenate([f[1] for f in found])
+    distance = np.concatenate([f[2] for f in found])
+    return first, second, distance
+
 
 # function preparing values for filtering element to suppress checkerboard
-# uses sectoring to prevent computing distance of far points
+# uses integer cells (see near_points) to prevent computing distance of far points
 # See the following paper for more information:
 # Convergent and mesh-independent solutions for the bi-directional evolutionary structural optimization method
 # 2.3. Filter scheme
@@ -31,120 +112,61 @@ def sround(x, s):
 # to be about 1–3 times of the size of one element.
 # Also described in
 #   "Using BESO method to optimize the shape and reinforcement of the underground openings"
-def prepare2s(cg, cg_min, cg_max, r_min, opt_domains, weight_factor2, near_elm):
-    sector_elm = {}
-    # preparing empty sectors
-    x = cg_min[0] + 0.5 * r_min
-    while x <= cg_max[0] + 0.5 * r_min:
-        y = cg_min[1] + 0.5 * r_min
-        while y <= cg_max[1] + 0.5 * r_min:
-            z = cg_min[2] + 0.5 * r_min
-            while z <= cg_max[2] + 0.5 * r_min:
-                # 6 significant digit round because of small declination (6 must be used for all sround below)
-                sector_elm[(sround(x, 6), sround(y, 6), sround(z, 6))] = []
-                z += r_min
-            y += r_min
-        x += r_min
-    # assigning elements to the sectors
-    for en in opt_domains:
-        sector_centre = []
-        for k in range(3):
-            position = cg_min[k] + r_min * (0.5 + np.floor((cg[en][k] - cg_min[k]) / r_min))
-            sector_centre.append(sround(position, 6))
-        sector_elm[tuple(sector_centre)].append(en)
-    # finding near elements inside each sector
-    for sector_centre in sector_elm:
-        for en in sector_elm[sector_centre]:
-            near_elm[en] = []
-        for en in sector_elm[sector_centre]:
-            for en2 in sector_elm[sector_centre]:
-                if en == en2:
-                    continue
-                ee = (min(en, en2), max(en, en2))
-                try:
-                    weight_factor2[ee]
-                except KeyError:
-                    dx = cg[en][0] - cg[en2][0]
-                    dy = cg[en][1] - cg[en2][1]
-                    dz = cg[en][2] - cg[en2][2]
-                    distance = (dx ** 2 + dy ** 2 + dz ** 2) ** 0.5
-                    if distance < r_min:
-                        weight_factor2[ee] = r_min - distance
-                        near_elm[en].append(en2)
-                        near_elm[en2].append(en)
-    # finding near elements in neighbouring sectors by comparing distance with neighbouring sector elements
-    x = cg_min[0] + 0.5 * r_min
-    while x <= cg_max[0] + 0.5 * r_min:
-        y = cg_min[1] + 0.5 * r_min
-        while y <= cg_max[1] + 0.5 * r_min:
-            z = cg_min[2] + 0.5 * r_min
-            while z <= cg_max[2] + 0.5 * r_min:
-                position = (sround(x, 6), sround(y, 6), sround(z, 6))
-                # down level neighbouring sectors:
-                # o  o  -
-                # o  -  -
-                # o  -  -
-                # middle level neighbouring sectors:
-                # o  o  -
-                # o self -
-                # o  -  -
-                # upper level neighbouring sectors:
-                # o  o  -
-                # o  o  -
-                # o  -  -
-                for position_neighbour in [(x + r_min, y - r_min, z - r_min),
-                                           (x + r_min, y, z - r_min),
-                                           (x + r_min, y + r_min, z - r_min),
-                                           (x, y + r_min, z - r_min),
-                                           (x + r_min, y - r_min, z),
-                                           (x + r_min, y, z),
-                                           (x + r_min, y + r_min, z),
-                                           (x, y + r_min, z),
-                                           (x + r_min, y - r_min, z + r_min),
-                                           (x + r_min, y, z + r_min),
-                                           (x + r_min, y + r_min, z + r_min),
-                                           (x, y + r_min, z + r_min),
-                                           (x, y, z + r_min)]:
-                    position_neighbour = (sround(position_neighbour[0], 6), sround(position_neighbour[1], 6),
-                                          sround(position_neighbour[2], 6))
-                    for en in sector_elm[position]:
-                        try:
-                            for en2 in sector_elm[position_neighbour]:
-                                dx = cg[en][0] - cg[en2][0]
-                                dy = cg[en][1] - cg[en2][1]
-                                dz = cg[en][2] - cg[en2][2]
-                                distance = (dx ** 2 + dy ** 2 + dz ** 2) ** 0.5
-                                if distance < r_min:
-                                    ee = (min(en, en2), max(en, en2))
-                                    weight_factor2[ee] = r_min - distance
-                                    near_elm[en].append(en2)
-                                    near_elm[en2].append(en)
-                        except KeyError:
-                            pass
-                z += r_min
-            y += r_min
-        x += r_min
+def prepare2s(cg, cg_min, cg_max, r_min, opt_domains):
+    en_opt = list(dict.fromkeys(opt_domains))
+    points = np.array([cg[en] for en in en_opt], dtype=float).reshape(-1, 3)
+    [first, second, distance] = near_points(points, r_min, origin=np.array(cg_min, dtype=float))
+    weight = r_min - distance
     # print ("near elements have been associated, weight factors computed")
-    return weight_factor2, near_elm
+    return FilterMatrix(en_opt, np.concatenate((first, second)), np.concatenate((second, first)),
+                        np.concatenate((weight, weight)))
+
+
+class FilterMatrix:
+    """Row-normalised sparse matrix (CSR) of filter weights between optimized elements.
+
+    Row and column indices refer to positions in ``element_numbers``.
+    Each row holds weights ``r_min - distance`` of near elements divided by their sum,
+    so filtering is a single sparse matrix-vector product.
+    Rows of elements without any near element stay empty and are counted in ``empty_rows``.
+    """
+
+    def __init__(self, element_numbers, rows, columns, weights):
+        self.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        size = len(self.element_numbers)
+        order = np.argsort(rows, kind="stable")
+        rows = np.asarray(rows, dtype=np.int64)[order]
+        self.indices = np.asarray(columns, dtype=np.int64)[order]
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=self.indptr[1:])
+        denominator = np.bincount(rows, weights=np.asarray(weights)[order], minlength=size)
+        self.empty_rows = int(np.count_nonzero(denominator == 0))
+        self.data = np.asarray(weights)[order] / denominator[rows]
+
+    @classmethod
+    def from_csr(cls, element_numbers, indptr, indices, data):
+        """Matrix from already normalised CSR arrays, e.g. loaded from the preprocessing cache."""
+        filter_matrix = cls.__new__(cls)
+        filter_matrix.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        filter_matrix.indptr = np.asarray(indptr, dtype=np.int64)
+        filter_matrix.indices = np.asarray(indices, dtype=np.int64)
+        filter_matrix.data = np.asarray(data, dtype=float)
+        filter_matrix.empty_rows = int(np.count_nonzero(np.diff(filter_matrix.indptr) == 0))
+        return filter_matrix
+
+    def apply(self, values):
+        """Weighted average of values (ordered as element_numbers) from near elements, requires no empty rows."""
+        return np.add.reduceat(self.data * values[self.indices], self.indptr[:-1])
 
 
 # function to filter sensitivity number to suppress checkerboard
 # simplified version: makes weighted average of sensitivity numbers from near elements
-def run2(file_name, sensitivity_number, weight_factor2, near_elm, opt_domains):
-    sensitivity_number_filtered = sensitivity_number.copy()  # sensitivity number of each element after filtering
-    for en in opt_domains:
-        numerator = 0
-        denominator = 0
-        for en2 in near_elm[en]:
-            ee = (min(en, en2), max(en, en2))
-            numerator += weight_factor2[ee] * sensitivity_number[en2]
-            denominator += weight_factor2[ee]
-        if denominator != 0:
-            sensitivity_number_filtered[en] = numerator / denominator
-        else:
-            msg = "\nERROR: simple filter failed due to division by 0." \
-                  "Some element has not a near element in distance <= r_min.\n"
-            print(msg)
-            logging.error(msg)
-            return sensitivity_number
-    return sensitivity_number_filtered
+# sensitivity_number is an array ordered as filter_matrix.element_numbers
+def run2(file_name, sensitivity_number, filter_matrix):
+    if filter_matrix.empty_rows:
+        msg = "\nERROR: simple filter failed due to division by 0." \
+              "Some element has not a near element in distance <= r_min.\n"
+        print(msg)
+        logging.error(msg)
+        return sensitivity_number
+    return filter_matrix.apply(np.asarray(sensitivity_number, dtype=float))
@@ -1,43 +1,51 @@
 import numpy as np
-import operator
 from math import *
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from beso.element_index import CATEGORIES, ElementIndex
+
+# node indices of the triangles and tetrahedrons each element category is split into,
+# mid-nodes of 2nd order elements are not used
+TRIA_SPLITS = [(0, 1, 2)]
+QUAD_SPLITS = [(0, 1, 2), (0, 2, 3)]
+TETRA_SPLITS = [(0, 1, 2, 3)]
+HEXA_SPLITS = [(0, 1, 2, 5), (0, 2, 4, 5), (2, 4, 5, 6), (0, 2, 3, 4), (3, 4, 6, 7), (2, 3, 4, 6)]
+PENTA_SPLITS = [(0, 1, 2, 3), (1, 2, 3, 4), (2, 3, 4, 5)]
+
 
 # function for computing volumes or area (shell elements) and centres of gravity
 # approximate for 2nd order elements!
 # A Linear element or First order element will have nodes only at the corners.
 # However, a Second order element or Quadratic element will have mid side nodes in addition to nodes at the corner.
 # https://www.quora.com/Finite-Element-Analysis-whats-the-difference-between-first-order-and-second-order-elements#:~:text=A%20Linear%20element%20or%20First,to%20nodes%20at%20the%20corner.
+# Each element category is computed at once: its connectivity is stacked into an integer array,
+# node coordinates are gathered in one go and every split triangle or tetrahedron is evaluated with array operations.
 def elm_volume_cg(file_name, nodes, Elements):
-    u = [0.0, 0.0, 0.0]
-    v = [0.0, 0.0, 0.0]
-    w = [0.0, 0.0, 0.0]
-
-    def tria_area_cg(nod):
-        # compute volume
-        for i in [0, 1, 2]:  # denote x, y, z directions
-            u[i] = nodes[nod[2]][i] - nodes[nod[1]][i]
-            v[i] = nodes[nod[0]][i] - nodes[nod[1]][i]
-        area_tria = np.linalg.linalg.norm(np.cross(u, v)) / 2.0
+    node_numbers = np.fromiter(nodes.keys(), dtype=np.int64, count=len(nodes))
+    node_coordinates = np.array(list(nodes.values()), dtype=float).reshape(-1, 3)
+    node_rows = np.zeros(node_numbers.max() + 1, dtype=np.int64)  # node number -> row in node_coordinates
+    node_rows[node_numbers] = np.arange(len(node_numbers))
+
+    def tria_area_cg(p0, p1, p2):
+        # compute area
+        area_tria = np.linalg.norm(np.cross(p2 - p1, p0 - p1), axis=1) / 2.0
         # compute centre of gravity
-        x_cg = (nodes[nod[0]][0] + nodes[nod[1]][0] + nodes[nod[2]][0]) / 3.0
-        y_cg = (nodes[nod[0]][1] + nodes[nod[1]][1] + nodes[nod[2]][1]) / 3.0
-        z_cg = (nodes[nod[0]][2] + nodes[nod[1]][2] + nodes[nod[2]][2]) / 3.0
-        cg_tria = [x_cg, y_cg, z_cg]
+        cg_tria = (p0 + p1 + p2) / 3.0
         return area_tria, cg_tria
 
-    def tetra_volume_cg(nod):
+    def tetra_volume_cg(p0, p1, p2, p3):
         # compute volume
-        for i in [0, 1, 2]:  # denote x, y, z directions
-            u[i] = nodes[nod[2]][i] - nodes[nod[1]][i]
-            v[i] = nodes[nod[3]][i] - nodes[nod[1]][i]
-            w[i] = nodes[nod[0]][i] - nodes[nod[1]][i]
-            volume_tetra = abs(np.dot(np.cross(u, v), w)) / 6.0
+        volume_tetra = abs(np.einsum("ij,ij->i", np.cross(p2 - p1, p3 - p1), p0 - p1)) / 6.0
         # compute centre of gravity
-        x_cg = (nodes[nod[0]][0] + nodes[nod[1]][0] + nodes[nod[2]][0] + nodes[nod[3]][0]) / 4.0
-        y_cg = (nodes[nod[0]][1] + nodes[nod[1]][1] + nodes[nod[2]][1] + nodes[nod[3]][1]) / 4.0
-        z_cg = (nodes[nod[0]][2] + nodes[nod[1]][2] + nodes[nod[2]][2] + nodes[nod[3]][2]) / 4.0
-        cg_tetra = [x_cg, y_cg, z_cg]
+        cg_tetra = (p0 + p1 + p2 + p3) / 4.0
         return volume_tetra, cg_tetra
 
     def second_order_info(elm_type):
@@ -45,366 +53,586 @@ def elm_volume_cg(file_name, nodes, Elements):
         print(msg)
         logging.info(msg)
 
+    def split_measure_cg(elm_category, splits, measure_cg):
+        # area or volume and centre of gravity summed over the element splits
+        en = np.fromiter(elm_category.keys(), dtype=np.int64, count=len(elm_category))
+        corners = max(max(split) for split in splits) + 1
+        connectivity = np.array([nod[:corners] for nod in elm_category.values()], dtype=np.int64)
+        coordinates = node_coordinates[node_rows[connectivity]]  # shape (elements, corners, 3)
+        measure = 0.0
+        moment = 0.0
+        for split in splits:
+            [measure_split, cg_split] = measure_cg(*[coordinates[:, k] for k in split])
+            measure = measure + measure_split
+            moment = moment + measure_split[:, None] * cg_split
+        if len(splits) == 1:
+            cg_elm = cg_split
+        else:
+            cg_elm = moment / measure[:, None]
+        cg.update(zip(en.tolist(), cg_elm.tolist()))
+        return dict(zip(en.tolist(), measure.tolist()))
+
     # defining volume and centre of gravity for all element types
     volume_elm = {}
     area_elm = {}
     cg = {}
 
-    for en, nod in Elements.tria3.items():
-        [area_elm[en], cg[en]] = tria_area_cg(nod)
-
-    if Elements.tria6:
-        second_order_info("tria6")
-    for en, nod in Elements.tria6.items():  # copy from tria3
-        [area_elm[en], cg[en]] = tria_area_cg(nod)
-
-    for en, nod in Elements.quad4.items():
-        [a1, cg1] = tria_area_cg(nod[0:3])
-        [a2, cg2] = tria_area_cg(nod[0:1] + nod[2:4])
-        area_elm[en] = float(a1 + a2)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (a1 * cg1[k] + a2 * cg2[k]) / area_elm[en]
-
-    if Elements.quad8:
-        second_order_info("quad8")
-    for en, nod in Elements.quad8.items():  # copy from quad4
-        [a1, cg1] = tria_area_cg(nod[0:3])
-        [a2, cg2] = tria_area_cg(nod[0:1] + nod[2:4])
-        area_elm[en] = float(a1 + a2)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (a1 * cg1[k] + a2 * cg2[k]) / area_elm[en]
-
-    for en, nod in Elements.tetra4.items():
-        [volume_elm[en], cg[en]] = tetra_volume_cg(nod)
-
-    if Elements.tetra10:
-        second_order_info("tetra10")
-    for en, nod in Elements.tetra10.items():  # copy from tetra4
-        [volume_elm[en], cg[en]] = tetra_volume_cg(nod)
-
-    for en, nod in Elements.hexa8.items():
-        [v1, cg1] = tetra_volume_cg(nod[0:3] + nod[5:6])
-        [v2, cg2] = tetra_volume_cg(nod[0:1] + nod[2:3] + nod[4:6])
-        [v3, cg3] = tetra_volume_cg(nod[2:3] + nod[4:7])
-        [v4, cg4] = tetra_volume_cg(nod[0:1] + nod[2:5])
-        [v5, cg5] = tetra_volume_cg(nod[3:5] + nod[6:8])
-        [v6, cg6] = tetra_volume_cg(nod[2:5] + nod[6:7])
-        volume_elm[en] = float(v1 + v2 + v3 + v4 + v5 + v6)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (v1 * cg1[k] + v2 * cg2[k] + v3 * cg3[k] + v4 * cg4[k] + v5 * cg5[k] + v6 * cg6[k]
-                         ) / volume_elm[en]
-
-    if Elements.hexa20:
-        second_order_info("hexa20")
-    for en, nod in Elements.hexa20.items():  # copy from hexa8
-        [v1, cg1] = tetra_volume_cg(nod[0:3] + nod[5:6])
-        [v2, cg2] = tetra_volume_cg(nod[0:1] + nod[2:3] + nod[4:6])
-        [v3, cg3] = tetra_volume_cg(nod[2:3] + nod[4:7])
-        [v4, cg4] = tetra_volume_cg(nod[0:1] + nod[2:5])
-        [v5, cg5] = tetra_volume_cg(nod[3:5] + nod[6:8])
-        [v6, cg6] = tetra_volume_cg(nod[2:5] + nod[6:7])
-        volume_elm[en] = float(v1 + v2 + v3 + v4 + v5 + v6)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (v1 * cg1[k] + v2 * cg2[k] + v3 * cg3[k] + v4 * cg4[k] + v5 * cg5[k] + v6 * cg6[k]
-                         ) / volume_elm[en]
-
-    for en, nod in Elements.penta6.items():
-        [v1, cg1] = tetra_volume_cg(nod[0:4])
-        [v2, cg2] = tetra_volume_cg(nod[1:5])
-        [v3, cg3] = tetra_volume_cg(nod[2:6])
-        volume_elm[en] = float(v1 + v2 + v3)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (v1 * cg1[k] + v2 * cg2[k] + v3 * cg3[k]) / volume_elm[en]
-
-    if Elements.penta15:
-        second_order_info("penta15")  # copy from penta6
-    for en, nod in Elements.penta15.items():
-        [v1, cg1] = tetra_volume_cg(nod[0:4])
-        [v2, cg2] = tetra_volume_cg(nod[1:5])
-        [v3, cg3] = tetra_volume_cg(nod[2:6])
-        volume_elm[en] = float(v1 + v2 + v3)
-        cg[en] = [[], [], []]
-        for k in [0, 1, 2]:  # denote x, y, z dimensions
-            cg[en][k] = (v1 * cg1[k] + v2 * cg2[k] + v3 * cg3[k]) / volume_elm[en]
+    for category, splits, measure_cg, measure_elm, second_order in [
+            ("tria3", TRIA_SPLITS, tria_area_cg, area_elm, False),
+            ("tria6", TRIA_SPLITS, tria_area_cg, area_elm, True),
+            ("quad4", QUAD_SPLITS, tria_area_cg, area_elm, False),
+            ("quad8", QUAD_SPLITS, tria_area_cg, area_elm, True),
+            ("tetra4", TETRA_SPLITS, tetra_volume_cg, volume_elm, False),
+            ("tetra10", TETRA_SPLITS, tetra_volume_cg, volume_elm, True),
+            ("hexa8", HEXA_SPLITS, tetra_volume_cg, volume_elm, False),
+            ("hexa20", HEXA_SPLITS, tetra_volume_cg, volume_elm, True),
+            ("penta6", PENTA_SPLITS, tetra_volume_cg, volume_elm, False),
+            ("penta15", PENTA_SPLITS, tetra_volume_cg, volume_elm, True)]:
+        elm_category = getattr(Elements, category)
+        if not elm_category:
+            continue
+        if second_order:
+            second_order_info(category)
+        measure_elm.update(split_measure_cg(elm_category, splits, measure_cg))
 
     # finding the minimum and maximum cg position
-    x_cg = []
-    y_cg = []
-    z_cg = []
-    for xyz in cg.values():
-        x_cg.append(xyz[0])
-        y_cg.append(xyz[1])
-        z_cg.append(xyz[2])
-    cg_min = [min(x_cg), min(y_cg), min(z_cg)]
-    cg_max = [max(x_cg), max(y_cg), max(z_cg)]
+    cg_array = np.array(list(cg.values()))
+    cg_min = cg_array.min(axis=0).tolist()
+    cg_max = cg_array.max(axis=0).tolist()
 
     return cg, cg_min, cg_max, volume_elm, area_elm
 
 
-# function for copying .inp file with additional elsets, materials, solid and shell sections, different output request
-# elm_states is a dict of the elements containing 0 for void element or 1 for full element
-def write_inp(file_name, file_nameW, elm_states, number_of_states, domains, domains_from_config, domain_optimized,
+# keywords of output requests in the original .inp file, they are replaced by element energy output requests
+OUTPUT_KEYWORDS = ("*NODE FILE", "*EL FILE", "*CONTACT FILE", "*NODE PRINT", "*EL PRINT", "*CONTACT PRINT")
+
+
+# function for parsing the original .inp file once before iterations
+# returns a template: list of segments (kind, text), where kind is
+#   "static" - text copied to each iteration file unchanged
+#   "optional" - original output requests, copied only in iterations which save solver files
+#   "elsets", "sections", "outputs" - places to insert ELSETs of states, materials and sections of optimized domains,
+#                                      and element energy output requests
+def parse_inp_template(file_name):
+    template = []
+    lines = []
+    lines_kind = "static"
+
+    def add_segment(kind):
+        if lines:
+            template.append((lines_kind, "".join(lines).encode()))
+            del lines[:]
+        if kind not in ("static", "optional"):
+            template.append((kind, b""))
+
+    elsets_done = 0
+    sections_done = 0
+    outputs_done = 1
+    commenting = False
+    with open(file_name, "r") as fR:
+        for line in fR:
+            line_upper = line.upper()
+            if line[0] == "*":
+                commenting = False
+
+            # writing ELSETs
+            if (line_upper.startswith("*ELSET") or line_upper.startswith("*STEP")) and elsets_done == 0:
+                add_segment("elsets")
+                elsets_done = 1
+
+            # optimization materials, solid and shell sections
+            if line_upper.startswith("*STEP") and sections_done == 0:
+                add_segment("sections")
+                sections_done = 1
+
+            if line_upper.startswith("*STEP"):
+                outputs_done -= 1
+
+            # output request only for element stresses in .dat file:
+            if line_upper.startswith(OUTPUT_KEYWORDS):
+                if outputs_done < 1:
+                    add_segment("outputs")
+                    outputs_done += 1
+                commenting = True
+            if commenting != (lines_kind == "optional"):
+                add_segment("static")
+                lines_kind = "optional" if commenting else "static"
+            lines.append(line)
+    add_segment("static")
+    return template
+
+
+# *INCLUDE card in .inp file
+INCLUDE_CARD = re.compile(rb"^(\*INCLUDE\s*,\s*INPUT\s*=\s*)(.*?)[ \t\r]*$", re.MULTILINE | re.IGNORECASE)
+
+
+# function for changing relative paths of *INCLUDE cards in the template to absolute paths from directory,
+# so that iteration files can be solved in another directory
+def absolute_include_paths(inp_template, directory):
+    def absolute_include(match):
+        include = match.group(2).decode()
+        if not os.path.isabs(include):
+            include = os.path.abspath(os.path.join(directory, include))
+        return match.group(1) + include.encode()
+
+    return [(kind, INCLUDE_CARD.sub(absolute_include, text) if kind == "static" else text)
+            for kind, text in inp_template]
+
+
+# line starting a step in .inp file
+STEP_CARD = re.compile(rb"^(?=\*STEP)", re.MULTILINE | re.IGNORECASE)
+
+
+# function for splitting the template (see parse_inp_template) to templates of separate load cases
+# each template contains the model definition (text before the first *STEP) and one step
+# steps should be independent, i.e. not relying on loads or results of the previous steps
+def split_inp_template_steps(inp_template):
+    model = []
+    steps = []
+    for kind, text in inp_template:
+        parts = STEP_CARD.split(text) if kind in ("static", "optional") else [text]
+        for part_number, part in enumerate(parts):
+            if part_number:
+                steps.append([])
+            if part or kind not in ("static", "optional"):
+                (steps[-1] if steps else model).append((kind, part))
+    if len(steps) < 2:
+        return [inp_template]
+    return [model + step for step in steps]
+
+
+# static segments shorter than this are kept in iteration files instead of moving them to include files
+INCLUDE_MIN_SIZE = 4096
+
+
+# function for writing static segments of templates (mesh, boundary conditions, loads, ...) once to include files
+# returns templates in which these segments are replaced by *INCLUDE cards and list of written include files
+# segments shared by more templates (e.g. the model of separate load cases) are written to one include file
+# include files are referenced by their base names, so they must be in the directory where the solver runs
+def split_inp_templates(inp_templates, file_nameI):
+    split_templates = []
+    include_files = []
+    include_cards = {}
+    for inp_template in inp_templates:
+        split_template = []
+        for kind, text in inp_template:
+            if kind == "static" and len(text) >= INCLUDE_MIN_SIZE:
+                if text not in include_cards:
+                    include_file = file_nameI + str(len(include_files)).zfill(3) + ".inp"
+                    with open(include_file, "wb") as f:
+                        f.write(text)
+                        if not text.endswith(b"\n"):
+                            f.write(b"\n")
+                    include_files.append(include_file)
+                    include_cards[text] = ("*INCLUDE, INPUT=" + os.path.basename(include_file) + "\n").encode()
+                text = include_cards[text]
+            split_template.append((kind, text))
+        split_templates.append(split_template)
+    return split_templates, include_files
+
+
+# function for writing .inp file for an iteration from the template of the original file (see parse_inp_template)
+# with additional elsets, materials, solid and shell sections, different output request
+# domain_volumes and domain_shells are arrays of element numbers of each domain (from ElementIndex)
+# elm_states is ElementStates of the elements containing 0 for void element or 1 for full element
+def write_inp(inp_template, file_nameW, elm_states, number_of_states, domains, domains_from_config, domain_optimized,
               domain_thickness, domain_offset, domain_orientation, domain_material, domain_volumes, domain_shells,
               plane_strain, plane_stress, axisymmetry, save_iteration_results, i):
-    fR = open(file_name, "r")
-    check_line_endings = False
-    try:
-        fW = open(file_nameW + ".inp", "w", newline="\n")
-    except TypeError:  # python 2.x do not have newline argument
-        fW = open(file_nameW + ".inp", "w")
-        check_line_endings = True
 
-    # function for writing ELSETs of each state
+    # function for writing ELSETs of each state, elements of a domain are grouped by their states
     def write_elset():
-        fW.write(" \n")
-        fW.write("** Added ELSETs by optimization:\n")
+        text = [" \n", "** Added ELSETs by optimization:\n"]
         for dn in domains_from_config:
             if domain_optimized[dn] is True:
                 elsets_used[dn] = []
-                elset_new[dn] = {}
+                en_array = np.array(domains[dn], dtype=np.int64)
+                states = elm_states.get(en_array).astype(np.int64)
+                order = np.argsort(states, kind="stable")
+                state_ends = np.cumsum(np.bincount(states, minlength=number_of_states))
+                en_lists = np.split(en_array[order], state_ends[:-1])
                 for sn in range(number_of_states):
-                    elset_new[dn][sn] = []
-                    for en in domains[dn]:
-                        if elm_states[en] == sn:
-                            elset_new[dn][elm_states[en]].append(en)
-                for sn, en_list in elset_new[dn].items():
+                    en_list = en_lists[sn].astype(str).tolist()
                     if en_list:
                         elsets_used[dn].append(sn)
-                        fW.write("*ELSET,ELSET=" + dn + str(sn) + "\n")
-                        position = 0
-                        for en in en_list:
-                            if position < 8:
-                                fW.write(str(en) + ", ")
-                                position += 1
-                            else:
-                                fW.write(str(en) + ",\n")
-                                position = 0
-                        fW.write("\n")
-        fW.write(" \n")
+                        text.append("*ELSET,ELSET=" + dn + str(sn) + "\n")
+                        full_lines = len(en_list) // 9 * 9  # 9 element numbers per line
+                        for position in range(0, full_lines, 9):
+                            text.append(", ".join(en_list[position:position + 9]) + ",\n")
+                        if full_lines < len(en_list):
+                            text.append(", ".join(en_list[full_lines:]) + ", ")
+                        text.append("\n")
+        text.append(" \n")
+        return "".join(text)
 
     # function to add orientation to solid or shell section
-    def add_orientation():
+    def add_orientation(dn, sn):
         try:
-            fW.write(", ORIENTATION=" + domain_orientation[dn][sn] + "\n")
+            return ", ORIENTATION=" + domain_orientation[dn][sn] + "\n"
         except (KeyError, IndexError):
-            fW.write("\n")
+            return "\n"
 
-    elsets_done = 0
-    sections_done = 0
-    outputs_done = 1
-    commenting = False
-    elset_new = {}
+    # function for writing materials, solid and shell sections
+    def write_sections():
+        text = [" \n", "** Materials and sections in optimized domains\n",
+                "** (redefines elements properties defined above):\n"]
+        msg_error = ""
+        for dn in domains_from_config:
+            if domain_optimized[dn]:
+                shells = domain_shells[dn].tolist()
+                # numbers of shells of the domain of each 2D type
+                plane_strain_count = len(plane_strain.intersection(shells))
+                plane_stress_count = len(plane_stress.intersection(shells))
+                axisymmetry_count = len(axisymmetry.intersection(shells))
+                for sn in elsets_used[dn]:
+                    text.append("*MATERIAL, NAME=" + dn + str(sn) + "\n")
+                    text.append(domain_material[dn][sn] + "\n")
+                    if len(domain_volumes[dn]):
+                        text.append("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
+                        text.append(add_orientation(dn, sn))
+                    elif plane_strain_count == len(shells):
+                        text.append("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
+                        text.append(add_orientation(dn, sn))
+                        text.append(str(domain_thickness[dn][sn]) + "\n")
+                    elif plane_strain_count:
+                        msg_error = dn + " domain does not contain only plane strain types for 2D elements"
+                    elif plane_stress_count == len(shells):
+                        text.append("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
+                        text.append(add_orientation(dn, sn))
+                        text.append(str(domain_thickness[dn][sn]) + "\n")
+                    elif plane_stress_count:
+                        msg_error = dn + " domain does not contain only plane stress types for 2D elements"
+                    elif axisymmetry_count == len(shells):
+                        text.append("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
+                        text.append(add_orientation(dn, sn))
+                    elif axisymmetry_count:
+                        msg_error = dn + " domain does not contain only axisymmetry types for 2D elements"
+                    else:
+                        text.append("*SHELL SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn) +
+                                    ", OFFSET=" + str(domain_offset[dn]))
+                        text.append(add_orientation(dn, sn))
+                        text.append(str(domain_thickness[dn][sn]) + "\n")
+                    text.append(" \n")
+                    if msg_error:
+                        logging.error("\nERROR: " + msg_error + "\n")
+                        raise Exception(msg_error)
+        return "".join(text)
+
+    # function for writing output requests of element energy density to .dat file
+    def write_outputs():
+        text = [" \n"]
+        for dn in domains_from_config:
+            text.append("*EL PRINT, " + "ELSET=" + dn + "\n")
+            text.append("ENER\n")
+        text.append(" \n")
+        return "".join(text)
+
+    save_outputs = save_iteration_results and np.mod(float(i - 1), save_iteration_results) == 0
     elsets_used = {}
-    msg_error = ""
-    for line in fR:
-        if line[0] == "*":
-            commenting = False
-
-        # writing ELSETs
-        if (line[:6].upper() == "*ELSET" and elsets_done == 0) or (line[:5].upper() == "*STEP" and elsets_done == 0):
-            write_elset()
-            elsets_done = 1
-
-        # optimization materials, solid and shell sections
-        if line[:5].upper() == "*STEP" and sections_done == 0:
-            if elsets_done == 0:
-                write_elset()
-                elsets_done = 1
+    segments = []
+    for kind, text in inp_template:
+        if kind == "static":
+            segments.append(text)
+        elif kind == "optional":
+            if save_outputs:
+                segments.append(text)
+        elif kind == "elsets":
+            segments.append(write_elset().encode())
+        elif kind == "sections":
+            segments.append(write_sections().encode())
+        elif kind == "outputs":
+            segments.append(write_outputs().encode())
+    with open(file_nameW + ".inp", "wb") as fW:
+        fW.writelines(segments)
+
+
+# header lines of .dat file blocks: stresses, internal energy density and eigenvalue number
+DAT_HEADER = re.compile(r"^(?: stresses| internal energy density|                    E I G E N V A L U E    N U M B E R)"
+                        r".*\n", re.MULTILINE)
+DAT_BLANK_LINE = re.compile(r"^ *\n", re.MULTILINE)
+
+
+class EnergyDensityParser:
+    """Parser of internal energy density blocks from CalculiX .dat file.
+
+    Text is passed by feed in arbitrary chunks. Complete lines of each chunk are converted at once, also inside
+    a block, and energy densities of integration points are averaged over elements; only the incomplete last line
+    and the sum and count of the last element, which can continue in the next chunk, are kept between feeds.
+    Results are aligned to element_numbers; values of elements missing in the .dat file are NaN,
+    solvers raise an error for them by solvers.check_missing_elements.
+    """
+
+    def __init__(self, element_numbers, domains_from_config):
+        self.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        # element number -> row, the last item is -1 for all element numbers out of range
+        self.element_rows = np.full(self.element_numbers.max() + 2, -1, dtype=np.int64)
+        self.element_rows[self.element_numbers] = np.arange(len(self.element_numbers))
+        self.set_names = set(dn.upper() for dn in domains_from_config)
+        self.line_rest = ""  # incomplete last line of the fed text
+        self.reading_block = False
+        self.block_started = False  # blank line before block values passed
+        self.last_element = None  # number, sum of energy densities and count of integration points of the last element
+        self.last_sum = 0.0
+        self.last_count = 0
+        self.last_time = "initial"  # TODO solve how to read a new step which differs in time
+        self.read_eigenvalues = False
+        self.eigen_number = None
+        self.energy_density_step = []  # list for steps - [array of element energy densities, next step]
+        self.energy_density_eigen = {}  # energy_density_eigen[eigen_number] = array of element energy densities
+
+    def feed(self, text):
+        line_end = text.rfind("\n") + 1
+        if not line_end:
+            self.line_rest += text
+            return
+        self.parse(self.line_rest + text[:line_end])
+        self.line_rest = text[line_end:]
+
+    def close(self):
+        """Parse the rest of the text and return energy densities of steps and eigenvalues."""
+        if self.line_rest:
+            self.parse(self.line_rest + "\n")
+            self.line_rest = ""
+        self.store_last_element()
+        self.reading_block = False
+        if self.energy_density_step:
+            energy_density_step = np.vstack(self.energy_density_step)
+        else:
+            energy_density_step = np.empty((0, len(self.element_numbers)))
+        return energy_density_step, self.energy_density_eigen
+
+    def parse(self, text):
+        """Parse text of complete lines."""
+        position = 0
+        while position < len(text):
+            if not self.reading_block:
+                header = DAT_HEADER.search(text, position)
+                if header is None:
+                    return
+                position = header.end()
+                self.read_header(header.group(0))
+            elif not self.block_started:
+                # block of energy densities starts after a blank line and ends by the next blank line
+                block_start = DAT_BLANK_LINE.search(text, position)
+                if block_start is None:
+                    return
+                position = block_start.end()
+                self.block_started = True
+            else:
+                block_end = DAT_BLANK_LINE.search(text, position)
+                if block_end is None:
+                    self.read_lines(text[position:])
+                    return
+                self.read_lines(text[position:block_end.start()])
+                self.store_last_element()
+                position = block_end.end()
+                self.reading_block = False
+                self.block_started = False
+
+    def read_header(self, line):
+        line_split = line.split()
+        if line.startswith(" stresses") or line.startswith(" internal energy density"):
+            if line_split[-4] in self.set_names:
+                if self.last_time != line_split[-1]:
+                    self.energy_density_step.append(np.full(len(self.element_numbers), np.nan))
+                    self.last_time = line_split[-1]
+                    self.read_eigenvalues = False  # TODO not for frequencies?
+                self.reading_block = line.startswith(" internal energy density")
+        else:
+            self.eigen_number = int(line_split[-1])
+            self.read_eigenvalues = True
+            self.energy_density_eigen[self.eigen_number] = np.full(len(self.element_numbers), np.nan)
+
+    def read_lines(self, lines):
+        columns = len(lines[:lines.find("\n")].split())
+        if not columns:
+            return
+        values = np.array(lines.split(), dtype=float).reshape(-1, columns)
+        en = values[:, 0].astype(np.int64)
+        energy_density = values[:, 2]
+        # summing integration points of each element, the first one can continue from previous lines
+        elm_start = np.flatnonzero(np.concatenate(([True], en[1:] != en[:-1])))
+        elm_count = np.diff(np.append(elm_start, len(en)))
+        energy_density_sum = np.add.reduceat(energy_density, elm_start)
+        if en[0] == self.last_element:
+            energy_density_sum[0] += self.last_sum
+            elm_count[0] += self.last_count
+        else:
+            self.store_last_element()
+        # the last element can continue in next lines
+        self.last_element = en[elm_start[-1]]
+        self.last_sum = energy_density_sum[-1]
+        self.last_count = elm_count[-1]
+        self.store(en[elm_start[:-1]], energy_density_sum[:-1] / elm_count[:-1])
+
+    def store_last_element(self):
+        if self.last_element is not None:
+            self.store(np.array([self.last_element]), np.array([self.last_sum / self.last_count]))
+            self.last_element = None
+
+    def store(self, en, energy_density_elm):
+        rows = self.element_rows[np.minimum(en, len(self.element_rows) - 1)]
+        known = rows >= 0
+        if self.read_eigenvalues:
+            self.energy_density_eigen[self.eigen_number][rows[known]] = energy_density_elm[known]
+        else:
+            self.energy_density_step[-1][rows[known]] = energy_density_elm[known]
+
+
+class DatFollower(threading.Thread):
+    """Thread reading .dat file while the solver is still writing it and feeding the text to the parser.
+
+    Start it before the solver, after the solver exits call results to get parsed energy densities.
+    """
+
+    def __init__(self, file_nameW, parser, chunk_size=2 ** 22, poll_interval=0.05):
+        threading.Thread.__init__(self, daemon=True)
+        self.file_name_dat = file_nameW + ".dat"
+        self.parser = parser
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.solver_finished = threading.Event()
+        self.error = None
+        if os.path.isfile(self.file_name_dat):  # do not read results of a previous run
+            os.remove(self.file_name_dat)
+
+    def run(self):
+        try:
+            f = None
+            while f is None:
+                solver_finished = self.solver_finished.is_set()
+                try:
+                    f = open(self.file_name_dat, "r")
+                except IOError:
+                    if solver_finished:
+                        return
+                    time.sleep(self.poll_interval)
+            with f:
+                while True:
+                    solver_finished = self.solver_finished.is_set()
+                    text = f.read(self.chunk_size)
+                    if text:
+                        self.parser.feed(text)
+                    elif solver_finished:
+                        return
+                    else:
+                        time.sleep(self.poll_interval)
+        except Exception as e:
+            self.error = e
 
-            fW.write(" \n")
-            fW.write("** Materials and sections in optimized domains\n")
-            fW.write("** (redefines elements properties defined above):\n")
-            for dn in domains_from_config:
-                if domain_optimized[dn]:
-                    for sn in elsets_used[dn]:
-                        fW.write("*MATERIAL, NAME=" + dn + str(sn) + "\n")
-                        fW.write(domain_material[dn][sn] + "\n")
-                        if domain_volumes[dn]:
-                            fW.write("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
-                            add_orientation()
-                        elif len(plane_strain.intersection(domain_shells[dn])) == len(domain_shells[dn]):
-                            fW.write("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
-                            add_orientation()
-                            fW.write(str(domain_thickness[dn][sn]) + "\n")
-                        elif plane_strain.intersection(domain_shells[dn]):
-                            msg_error = dn + " domain does not contain only plane strain types for 2D elements"
-                        elif len(plane_stress.intersection(domain_shells[dn])) == len(domain_shells[dn]):
-                            fW.write("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
-                            add_orientation()
-                            fW.write(str(domain_thickness[dn][sn]) + "\n")
-                        elif plane_stress.intersection(domain_shells[dn]):
-                            msg_error = dn + " domain does not contain only plane stress types for 2D elements"
-                        elif len(axisymmetry.intersection(domain_shells[dn])) == len(domain_shells[dn]):
-                            fW.write("*SOLID SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn))
-                            add_orientation()
-                        elif axisymmetry.intersection(domain_shells[dn]):
-                            msg_error = dn + " domain does not contain only axisymmetry types for 2D elements"
-                        else:
-                            fW.write("*SHELL SECTION, ELSET=" + dn + str(sn) + ", MATERIAL=" + dn + str(sn) +
-                                     ", OFFSET=" + str(domain_offset[dn]))
-                            add_orientation()
-                            fW.write(str(domain_thickness[dn][sn]) + "\n")
-                        fW.write(" \n")
-                        if msg_error:
-                            logging.error("\nERROR: " + msg_error + "\n")
-                            raise Exception(msg_error)
-            sections_done = 1
-
-        if line[:5].upper() == "*STEP":
-            outputs_done -= 1
-
-        # output request only for element stresses in .dat file:
-        if line[0:10].upper() == "*NODE FILE" or line[0:8].upper() == "*EL FILE" or \
-                        line[0:13].upper() == "*CONTACT FILE" or line[0:11].upper() == "*NODE PRINT" or \
-                        line[0:9].upper() == "*EL PRINT" or line[0:14].upper() == "*CONTACT PRINT":
-            if outputs_done < 1:
-                fW.write(" \n")
-                for dn in domains_from_config:
-                    fW.write("*EL PRINT, " + "ELSET=" + dn + "\n")
-                    fW.write("ENER\n")
-                fW.write(" \n")
-                outputs_done += 1
-            commenting = True
-            if not save_iteration_results or np.mod(float(i - 1), save_iteration_results) != 0:
-                continue
-        elif commenting is True:
-            if not save_iteration_results or np.mod(float(i - 1), save_iteration_results) != 0:
-                continue
-
-        fW.write(line)
-    fR.close()
-    fW.close()
-    if check_line_endings:
-        fW = open(file_nameW + ".inp", "rb")
-        content = fW.read().replace("\r\n", "\n")
-        fW.close()
-        fW = open(file_nameW + ".inp", "wb")
-        fW.write(content)
-        fW.close()
+    def results(self):
+        """Wait for reading the rest of the file and return energy densities as import_FI_int_pt."""
+        self.solver_finished.set()
+        self.join()
+        if self.error:
+            raise self.error
+        return self.parser.close()
 
 
 # function for importing results from .dat file
-# Failure Indices are computed at each integration point and maximum or average above each element is returned
-def import_FI_int_pt(file_nameW, domains, file_name, elm_states, domains_from_config):
+# Energy densities are computed at each integration point and their average above each element is returned
+# as array of steps x element_numbers, elements missing in the .dat file are NaN
+def import_FI_int_pt(file_nameW, element_numbers, domains_from_config):
     try:
         f = open(file_nameW + ".dat", "r")
     except IOError:
         msg = "CalculiX result file not found, check your inputs"
         logging.error("\nERROR: " + msg + "\n")
         assert False, msg
-    last_time = "initial"  # TODO solve how to read a new step which differs in time
-    step_number = -1
-    energy_density_step = []  # list for steps - [{en1: energy_density, en2: ..., ...}, {en1: ..., ...}, next step]
-    energy_density_eigen = {}  # energy_density_eigen[eigen_number][en_last] = np.average(ener_int_pt)
-
-    read_stresses = 0
-    read_energy_density = 0
-    read_eigenvalues = 0
-    for line in f:
-        line_split = line.split()
-        if line.replace(" ", "") == "\n":
-            if read_energy_density == 1:
-                if read_eigenvalues:
-                    energy_density_eigen[eigen_number][en_last] = np.average(ener_int_pt)
-                else:
-                    energy_density_step[step_number][en_last] = np.average(ener_int_pt)
-            read_stresses -= 1
-            read_energy_density -= 1
-            ener_int_pt = []
-            en_last = None
-
-        elif line[:9] == " stresses":
-            if line.split()[-4] in map(lambda x: x.upper(), domains_from_config):  # TODO upper already on user input
-                read_stresses = 2
-                if last_time != line_split[-1]:
-                    step_number += 1
-                    energy_density_step.append({})
-                    last_time = line_split[-1]
-                    read_eigenvalues = False  # TODO not for frequencies?
-        elif line[:24] == " internal energy density":
-            if line.split()[-4] in map(lambda x: x.upper(), domains_from_config):  # TODO upper already on user input
-                read_energy_density = 2
-                if last_time != line_split[-1]:
-                    step_number += 1
-                    energy_density_step.append({})
-                    last_time = line_split[-1]
-                    read_eigenvalues = False  # TODO not for frequencies?
-        elif line[:54] == "                    E I G E N V A L U E    N U M B E R":
-            eigen_number = int(line_split[-1])
-            read_eigenvalues = True
-            energy_density_eigen[eigen_number] = {}
-        elif read_energy_density == 1:
-            en = int(line_split[0])
-            if en_last != en:
-                if en_last:
-                    if read_eigenvalues:
-                        energy_density_eigen[eigen_number][en_last] = np.average(ener_int_pt)
-                    else:
-                        energy_density_step[step_number][en_last] = np.average(ener_int_pt)
-                    ener_int_pt = []
-                en_last = en
-            energy_density = float(line_split[2])
-            ener_int_pt.append(energy_density)
-
-    if read_energy_density == 1:
-        if read_eigenvalues:
-            energy_density_eigen[eigen_number][en_last] = np.average(ener_int_pt)
-        else:
-            energy_density_step[step_number][en_last] = np.average(ener_int_pt)
+    parser = EnergyDensityParser(element_numbers, domains_from_config)
+    parser.feed(f.read())
     f.close()
+    return parser.close()
+
+
+# function for running CalculiX jobs (e.g. separate load cases) concurrently
+# available cpu cores are divided between the jobs running at once, exit codes of jobs are returned
+def run_ccx_jobs(ccx_path, job_names, path, cpu_cores, jobs_limit=1):
+    jobs = max(1, min(jobs_limit, len(job_names)))
+    env = dict(os.environ, OMP_NUM_THREADS=str(max(1, cpu_cores // jobs)))
+
+    def run_job(job_name):
+        if sys.platform == 'linux':
+            return subprocess.call([ccx_path, job_name], cwd=path, env=env)
+        else:
+            return subprocess.call([ccx_path, job_name], cwd=path, env=env, shell=True)
+
+    with ThreadPoolExecutor(jobs) as executor:
+        return list(executor.map(run_job, job_names))
+
+
+# function for removing solver files of a job, files with extensions listed in keep are preserved
+# and moved to results_dir if it is given (e.g. from a scratch directory)
+def remove_solver_files(file_nameW, keep="", results_dir=None):
+    for extension in ["inp", "dat", "frd", "sta", "cvg"]:
+        solver_file = file_nameW + "." + extension
+        if extension not in keep:
+            os.remove(solver_file)
+        elif results_dir is not None:
+            shutil.move(solver_file, os.path.join(results_dir, os.path.basename(solver_file)))
 
-    return energy_density_step, energy_density_eigen
 
 # function for switch element states
-def switching(elm_states, domains_from_config, domain_optimized, domains, domain_density, domain_thickness,
-              domain_shells, area_elm, volume_elm, sensitivity_number, mass, mass_referential, mass_addition_ratio,
-              mass_removal_ratio, i_violated, i,
+# elements are ordered by sensitivity numbers, numbers of switched elements are found by cumulative sums of their
+# mass differences and states are switched at once
+# rows of domains, shells and measures (areas or volumes) are taken from element_index (ElementIndex),
+# sensitivity_number is an array ordered as its rows
+def switching(elm_states, domains_from_config, domain_optimized, domain_density, domain_thickness, element_index,
+              sensitivity_number, mass, mass_referential, mass_addition_ratio, mass_removal_ratio, i_violated, i,
               mass_goal_i, decay_coefficient=-0.2):
     # k - exponential decay coefficient to dump mass_additive_ratio and mass_removal_ratio after freezing mass
     # fits to equation: exp(k * i), where i is iteration number from triggering by reaching goal mass ratio?
     # k = -0.2 ~ after 10 iterations slows down approximately 10 times
     # k = 0 ~ no decaying
-    def compute_difference():
-        if en in domain_shells[dn]:  # shells mass difference
-            mass[i] += area_elm[en] * domain_density[dn][elm_states_en] * domain_thickness[dn][elm_states_en]
-            if elm_states_en != 0:  # for potential switching down
-                mass_decrease[en] = area_elm[en] * (
-                    domain_density[dn][elm_states_en] * domain_thickness[dn][elm_states_en] -
-                    domain_density[dn][elm_states_en - 1] * domain_thickness[dn][elm_states_en - 1])
-            if elm_states_en < len(domain_density[dn]) - 1:  # for potential switching up
-                mass_increase[en] = area_elm[en] * (
-                    domain_density[dn][elm_states_en + 1] * domain_thickness[dn][elm_states_en + 1] -
-                    domain_density[dn][elm_states_en] * domain_thickness[dn][elm_states_en])
-        else:  # volumes mass difference
-            mass[i] += volume_elm[en] * domain_density[dn][elm_states_en]
-            if elm_states_en != 0:  # for potential switching down
-                mass_decrease[en] = volume_elm[en] * (
-                    domain_density[dn][elm_states_en] - domain_density[dn][elm_states_en - 1])
-            if elm_states_en < len(domain_density[dn]) - 1:  # for potential switching up
-                mass_increase[en] = volume_elm[en] * (
-                    domain_density[dn][elm_states_en + 1] - domain_density[dn][elm_states_en])
-
-    mass_increase = {}
-    mass_decrease = {}
-    sensitivity_number_opt = {}
-    mass.append(0)
-    mass_overloaded = 0.0
-    # switch up overloaded elements
+
+    # arrays of optimized elements: numbers, states, masses and mass to add or remove by switching
+    rows_opt = []
+    states = []
+    mass_elm = []
+    mass_increase = []
+    mass_decrease = []
+    can_increase = []
+    rows_done = np.zeros(len(element_index.element_numbers), dtype=bool)  # elements of more domains taken once
     for dn in domains_from_config:
         if domain_optimized[dn] is True:
-            for en in domains[dn]:
-                # rest of elements prepare to sorting and switching
-                elm_states_en = elm_states[en]
-                compute_difference()  # mass to add or remove
-                sensitivity_number_opt[en] = sensitivity_number[en]
-    # sorting
-    sensitivity_number_sorted = sorted(sensitivity_number_opt.items(), key=operator.itemgetter(1))
-    sensitivity_number_sorted2 = list(sensitivity_number_sorted)
+            rows = element_index.domain_rows[dn]
+            rows = rows[~rows_done[rows]]
+            rows_done[rows] = True
+            state = elm_states.get(element_index.element_numbers[rows]).astype(np.int64)
+            is_shell = element_index.is_shell[rows]
+            measure = element_index.measure[rows]
+            density = np.array(domain_density[dn], dtype=float)
+            thickness = np.array(domain_thickness[dn], dtype=float) if is_shell.any() else np.ones(len(density))
+            lower = np.maximum(state - 1, 0)
+            upper = np.minimum(state + 1, len(density) - 1)
+            # shells mass difference or volumes mass difference
+            mass_elm.append(np.where(is_shell, measure * density[state] * thickness[state],
+                                     measure * density[state]))
+            mass_decrease.append(np.where(state != 0, np.where(
+                is_shell, measure * (density[state] * thickness[state] - density[lower] * thickness[lower]),
+                measure * (density[state] - density[lower])), 0.0))  # for potential switching down
+            mass_increase.append(np.where(state < len(density) - 1, np.where(
+                is_shell, measure * (density[upper] * thickness[upper] - density[state] * thickness[state]),
+                measure * (density[upper] - density[state])), 0.0))  # for potential switching up
+            can_increase.append(state < len(density) - 1)
+            rows_opt.append(rows)
+            states.append(state)
+    if not rows_opt:
+        mass.append(0)
+        return elm_states, mass
+    rows_opt = np.concatenate(rows_opt)
+    en_opt = element_index.element_numbers[rows_opt]
+    states = np.concatenate(states)
+    states_before = states.copy()
+    mass_elm = np.concatenate(mass_elm)
+    mass_increase = np.concatenate(mass_increase)
+    mass_decrease = np.concatenate(mass_decrease)
+    can_increase = np.concatenate(can_increase)
+    sensitivity_number_opt = sensitivity_number[rows_opt]
+    mass.append(float(np.cumsum(mass_elm)[-1]))
+    mass_overloaded = 0.0
+
+    # sorting, stable as the previous sorting of dictionary items
+    sensitivity_order = np.argsort(sensitivity_number_opt, kind="stable")
     if i_violated:
         if mass_removal_ratio - mass_addition_ratio > 0:  # removing from initial mass
             mass_to_add = mass_addition_ratio * mass_referential * np.exp(decay_coefficient * (i - i_violated))
@@ -416,71 +644,38 @@ def switching(elm_states, domains_from_config, domain_optimized, domains, domain
     else:
         mass_to_add = mass_addition_ratio * mass_referential
         mass_to_remove = mass_removal_ratio * mass_referential
-    mass_added = mass_overloaded
-    mass_removed = 0.0
-    # if mass_goal_i < mass[i - 1]:  # going from bigger mass to lower
-    added_elm = set()
-    while mass_added < mass_to_add:
-        if sensitivity_number_sorted:
-            en = sensitivity_number_sorted.pop(-1)[0]  # highest sensitivity number
-            try:
-                mass[i] += mass_increase[en]
-                mass_added += mass_increase[en]
-                if isinstance(en, int):
-                    elm_states[en] += 1
-                else:  # same state domain en
-                    if mass_increase[en] == 0:
-                        raise KeyError
-                    for en2 in domains[en]:
-                        elm_states[en2] += 1
-                added_elm.add(en)
-            except KeyError:  # there is no mass_increase due to highest element state
-                pass
-        else:
-            break
-    popped = 0
-    while mass_removed < mass_to_remove:
-        if mass[i] <= mass_goal_i:
-            break
-        if sensitivity_number_sorted:
-            en = sensitivity_number_sorted.pop(0)[0]  # lowest sensitivity number
-            popped += 1
-            if isinstance(en, int):
-                if elm_states[en] != 0:
-                    mass[i] -= mass_decrease[en]
-                    mass_removed += mass_decrease[en]
-                    elm_states[en] -= 1
-            else:  # same state domain en
-                if mass_decrease[en] != 0:
-                    mass[i] -= mass_decrease[en]
-                    mass_removed += mass_decrease[en]
-                    for en2 in domains[en]:
-                        elm_states[en2] -= 1
-        else:  # switch down elements just switched up or tried to be switched up (already in the highest state)
-            try:
-                en = sensitivity_number_sorted2[popped][0]
-                popped += 1
-            except IndexError:
-                break
-            if isinstance(en, int):
-                if elm_states[en] != 0:
-                    elm_states[en] -= 1
-                    if en in added_elm:
-                        mass[i] -= mass_increase[en]
-                        mass_removed += mass_increase[en]
-                    else:
-                        mass[i] -= mass_decrease[en]
-                        mass_removed += mass_decrease[en]
-            else:  # same state domain en
-                if mass_decrease[en] != 0:
-                    for en2 in domains[en]:
-                        elm_states[en2] -= 1
-                    if en in added_elm:
-                        mass[i] -= mass_increase[en]
-                        mass_removed += mass_increase[en]
-                    else:
-                        mass[i] -= mass_decrease[en]
-                        mass_removed += mass_decrease[en]
+
+    def switched_count(stop):
+        # number of elements taken before the first stop condition, stop has one more item than elements
+        return int(np.argmax(stop)) if stop.any() else len(stop) - 1
+
+    # switching up elements with the highest sensitivity numbers until mass_to_add is added
+    # elements already in the highest state are taken but not switched
+    add_order = sensitivity_order[::-1]
+    mass_added = np.cumsum(np.concatenate(([mass_overloaded], mass_increase[add_order])))
+    mass_path = np.cumsum(np.concatenate(([mass[i]], mass_increase[add_order])))
+    taken = switched_count(mass_added >= mass_to_add)
+    added_elm = add_order[:taken][can_increase[add_order[:taken]]]
+    states[added_elm] += 1
+    mass[i] = float(mass_path[taken])
+
+    # switching down elements with the lowest sensitivity numbers until mass_to_remove is removed or mass_goal_i
+    # is reached, then elements just switched up or tried to be switched up (already in the highest state)
+    # are switched down from the lowest sensitivity number
+    added = np.zeros(len(states), dtype=bool)
+    added[added_elm] = True
+    mass_to_switch_down = np.where(added, mass_increase, mass_decrease)[sensitivity_order]
+    switching_down = states[sensitivity_order] != 0
+    mass_to_switch_down[~switching_down] = 0.0
+    mass_removed = np.cumsum(np.concatenate(([0.0], mass_to_switch_down)))
+    mass_path = np.subtract.accumulate(np.concatenate(([mass[i]], mass_to_switch_down)))
+    taken = switched_count((mass_removed >= mass_to_remove) | (mass_path <= mass_goal_i))
+    removed_elm = sensitivity_order[:taken][switching_down[:taken]]
+    states[removed_elm] -= 1
+    mass[i] = float(mass_path[taken])
+
+    switched = states != states_before
+    elm_states.set(en_opt[switched], states[switched])
     return elm_states, mass
 
 
@@ -489,13 +684,13 @@ def switching(elm_states, domains_from_config, domain_optimized, domains, domain
 def export_frd(file_nameW, nodes, Elements, elm_states, number_of_states):
 
     def get_associated_nodes(elm_category):
-        for en in elm_category:
-            if elm_states[en] == state:
+        for en, en_state in zip(elm_category, elm_states.get(list(elm_category))):
+            if en_state == state:
                 associated_nodes.extend(elm_category[en])
 
     def write_elm(elm_category, category_symbol):
-        for en in elm_category:
-            if elm_states[en] == state:
+        for en, en_state in zip(elm_category, elm_states.get(list(elm_category))):
+            if en_state == state:
                 f.write(" -1" + str(en).rjust(10, " ") + category_symbol.rjust(5, " ") + "\n")
                 line = ""
                 nodes_done = 0
@@ -549,10 +744,7 @@ def export_frd(file_nameW, nodes, Elements, elm_states, number_of_states):
         f.write(" -3\n")
 
         # print elements
-        elm_sum = 0
-        for en in elm_states:
-            if elm_states[en] == state:
-                elm_sum += 1
+        elm_sum = int(np.count_nonzero(elm_states.array == state))
         f.write("    3C" + str(elm_sum).rjust(30, " ") + 37 * " " + "1\n")
         write_elm(Elements.tria3, "7")
         write_elm(Elements.tria6, "8")
@@ -573,15 +765,15 @@ def export_frd(file_nameW, nodes, Elements, elm_states, number_of_states):
 def export_inp(file_nameW, nodes, Elements, elm_states, number_of_states):
 
     def get_associated_nodes(elm_category):
-        for en in elm_category:
-            if elm_states[en] == state:
+        for en, en_state in zip(elm_category, elm_states.get(list(elm_category))):
+            if en_state == state:
                 associated_nodes.extend(elm_category[en])
 
     def write_elements_of_type(elm_type, elm_type_inp):
         if elm_type:
             f.write("*ELEMENT, TYPE=" + elm_type_inp + ", ELSET=state" + str(state) + "\n")
-            for en, nod in elm_type.items():
-                if elm_states[en] == state:
+            for (en, nod), en_state in zip(elm_type.items(), elm_states.get(list(elm_type))):
+                if en_state == state:
                     f.write(str(en))
                     for nn in nod:
                         f.write(", " + str(nn))
@@ -634,6 +826,45 @@ def export_inp(file_nameW, nodes, Elements, elm_states, number_of_states):
         f.close()
 
 
+# order of element categories in vtk element numbering, rows of ElementIndex follow it
+VTK_CATEGORIES = CATEGORIES
+
+
+# element numbers in the order of vtk element numbering from 0
+def vtk_element_numbers(Elements):
+    return list(Elements.tria3.keys()) + list(Elements.tria6.keys()) + list(Elements.quad4.keys()) + \
+        list(Elements.quad8.keys()) + list(Elements.tetra4.keys()) + list(Elements.tetra10.keys()) + \
+        list(Elements.penta6.keys()) + list(Elements.penta15.keys()) + list(Elements.hexa8.keys()) + \
+        list(Elements.hexa20.keys())
+
+
+class ElementNodeIncidence:
+    """Sparse element-node incidence (one entry for each node of each element) built from ElementIndex arrays.
+
+    Elements are rows of the element index (the order of vtk element numbering), nodes are sorted node numbers
+    of elements. Element values are summed to nodes by one bincount (sparse matrix-vector product) and divided
+    by node valence.
+    """
+
+    def __init__(self, element_index):
+        self.element_numbers = element_index.element_numbers
+        self.nodes_per_element = element_index.nodes_per_element
+        self.node_numbers = np.unique(element_index.connectivity)
+        # row (node) and column (element) of each entry, entries are ordered by elements as connectivity
+        self.node_rows = np.searchsorted(self.node_numbers, element_index.connectivity)
+        self.element_columns = np.repeat(np.arange(len(self.element_numbers)), self.nodes_per_element)
+        self.valence = np.bincount(self.node_rows, minlength=len(self.node_numbers))
+
+    def nodal_sum(self, values):
+        """Sum of element values (ordered as element_numbers) over elements of each node."""
+        return np.bincount(self.node_rows, weights=np.asarray(values, dtype=float)[self.element_columns],
+                           minlength=len(self.node_numbers))
+
+    def nodal_average(self, values):
+        """Average of element values (ordered as element_numbers) over elements of each node."""
+        return self.nodal_sum(values) / self.valence
+
+
 # sub-function to write vth mesh
 def vtk_mesh(file_nameW, nodes, Elements):
     f = open(file_nameW + ".vtk", "w")
@@ -670,10 +901,7 @@ def vtk_mesh(file_nameW, nodes, Elements):
     number_of_elements = len(Elements.tria3) + len(Elements.tria6) + len(Elements.quad4) + len(Elements.quad8) + \
                          len(Elements.tetra4) + len(Elements.tetra10) + len(Elements.penta6) + len(Elements.penta15) + \
                          len(Elements.hexa8) + len(Elements.hexa20)
-    en_all = list(Elements.tria3.keys()) + list(Elements.tria6.keys()) + list(Elements.quad4.keys()) + \
-             list(Elements.quad8.keys()) + list(Elements.tetra4.keys()) + list(Elements.tetra10.keys()) + \
-             list(Elements.penta6.keys()) + list(Elements.penta15.keys()) + list(Elements.hexa8.keys()) + \
-             list(Elements.hexa20.keys())  # defines vtk element numbering from 0
+    en_all = vtk_element_numbers(Elements)
 
     size_of_cells = 4 * len(Elements.tria3) + 7 * len(Elements.tria6) + 5 * len(Elements.quad4) + \
                     9 * len(Elements.quad8) + 5 * len(Elements.tetra4) + 11 * len(Elements.tetra10) + \
@@ -726,8 +954,8 @@ def append_vtk_states(file_nameW, i, en_all, elm_states):
     f.write("\nSCALARS element_states" + str(i).zfill(3) + " float\n")
     f.write("LOOKUP_TABLE default\n")
     line_count = 0
-    for en in en_all:
-        f.write(str(elm_states[en]) + " ")
+    for en_state in elm_states.get(en_all).tolist():
+        f.write(str(en_state) + " ")
         line_count += 1
         if line_count % 30 == 0:
             f.write("\n")
@@ -737,7 +965,9 @@ def append_vtk_states(file_nameW, i, en_all, elm_states):
 
 # function for exporting result in the legacy vtk format
 # nodes and elements are renumbered from 0 not to jump over values
-def export_vtk(file_nameW, nodes, Elements, elm_states, sensitivity_number):
+# sensitivity_number is an array in the order of vtk element numbering (rows of ElementIndex)
+# incidence (ElementNodeIncidence) can be built once and passed for repeated exports
+def export_vtk(file_nameW, nodes, Elements, elm_states, sensitivity_number, incidence=None):
     [en_all, associated_nodes] = vtk_mesh(file_nameW, nodes, Elements)
     f = open(file_nameW + ".vtk", "a")
 
@@ -745,8 +975,8 @@ def export_vtk(file_nameW, nodes, Elements, elm_states, sensitivity_number):
     f.write("\nSCALARS element_states float\n")
     f.write("LOOKUP_TABLE default\n")
     line_count = 0
-    for en in en_all:
-        f.write(str(elm_states[en]) + " ")
+    for en_state in elm_states.get(en_all).tolist():
+        f.write(str(en_state) + " ")
         line_count += 1
         if line_count % 30 == 0:
             f.write("\n")
@@ -756,49 +986,24 @@ def export_vtk(file_nameW, nodes, Elements, elm_states, sensitivity_number):
     f.write("\nSCALARS sensitivity_number float\n")
     f.write("LOOKUP_TABLE default\n")
     line_count = 0
-    for en in en_all:
-        f.write(str(sensitivity_number[en]) + " ")
+    for sensitivity_number_en in sensitivity_number.tolist():
+        f.write(str(sensitivity_number_en) + " ")
         line_count += 1
         if line_count % 6 == 0:
             f.write("\n")
     f.write("\n")
 
     # element state averaged at nodes
-    def append_nodal_state(en, elm_type):
-        for nn in elm_type[en]:
-            try:
-                nodal_state[nn].append(elm_states[en])
-            except KeyError:
-                nodal_state[nn] = [elm_states[en]]
-
-    nodal_state = {}
-    for en in Elements.tria3:
-        append_nodal_state(en, Elements.tria3)
-    for en in Elements.tria6:
-        append_nodal_state(en, Elements.tria6)
-    for en in Elements.quad4:
-        append_nodal_state(en, Elements.quad4)
-    for en in Elements.quad8:
-        append_nodal_state(en, Elements.quad8)
-    for en in Elements.tetra4:
-        append_nodal_state(en, Elements.tetra4)
-    for en in Elements.tetra10:
-        append_nodal_state(en, Elements.tetra10)
-    for en in Elements.penta6:
-        append_nodal_state(en, Elements.penta6)
-    for en in Elements.penta15:
-        append_nodal_state(en, Elements.penta15)
-    for en in Elements.hexa8:
-        append_nodal_state(en, Elements.hexa8)
-    for en in Elements.hexa20:
-        append_nodal_state(en, Elements.hexa20)
+    if incidence is None:
+        incidence = ElementNodeIncidence(ElementIndex(Elements))
+    nodal_state = incidence.nodal_average(elm_states.get(incidence.element_numbers)).tolist()
 
     f.write("\nPOINT_DATA " + str(len(associated_nodes)) + "\n")
     f.write("FIELD field_data 1\n")
     f.write("\nelement_states_averaged_at_nodes 1 " + str(len(associated_nodes)) + " float\n")
     line_count = 0
-    for nn in associated_nodes:
-        f.write(str(np.average(nodal_state[nn])) + " ")
+    for nodal_state_nn in nodal_state:
+        f.write(str(nodal_state_nn) + " ")
         line_count += 1
         if line_count % 10 == 0:
             f.write("\n")
@@ -810,8 +1015,10 @@ def export_vtk(file_nameW, nodes, Elements, elm_states, sensitivity_number):
 # function for exporting element values to csv file for displaying in Paraview, output format:
 # element_number, cg_x, cg_y, cg_z, element_state, sensitivity_number, failure indices 1, 2,..., maximal failure index
 # only elements found by import_inp function are taken into account
+# sensitivity_number is an array ordered as element_numbers
 def export_csv(domains_from_config, domains, file_nameW, cg, elm_states,
-               sensitivity_number):
+               sensitivity_number, element_numbers):
+    sensitivity_number = dict(zip(np.asarray(element_numbers).tolist(), np.asarray(sensitivity_number).tolist()))
     # write element values to the csv file
     f = open(file_nameW + ".csv", "w")
     line = "element_number, cg_x, cg_y, cg_z, element_state, sensitivity_number"
@@ -822,3 +1029,14 @@ def export_csv(domains_from_config, domains, file_nameW, cg, elm_states,
                    str(elm_states[en]) + ", " + str(sensitivity_number[en])
             f.write(line)
     f.close()
+
+
+# function for exporting mass and mean energy density of iterations to csv file, the data of plots of beso.plot
+# energy_density_mean of the last iteration is empty if it was not evaluated (oscillation)
+def export_convergence(file_name, mass, energy_density_mean):
+    with open(file_name + ".tmp", "w") as f:
+        f.write("iteration,mass,energy_density_mean\n")
+        for i in range(len(mass)):
+            f.write(str(i) + "," + repr(mass[i]) + "," +
+                    (repr(energy_density_mean[i]) if i < len(energy_density_mean) else "") + "\n")
+    os.replace(file_name + ".tmp", file_name)
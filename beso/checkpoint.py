@@ -0,0 +1,69 @@
+import logging
+import os
+
+import numpy as np
+
+from beso.element_states import ElementStates
+
+
+def save_checkpoint(checkpoint_file: str, i: int, elm_states: ElementStates, mass: list, energy_density_mean: list,
+                    sensitivity_number_old: np.ndarray, i_violated: int, check_tolerance: bool, mass_goal_i,
+                    elm_states_before_last: ElementStates):
+    """Store the state of the main loop after switching of the iteration i - 1 so that iteration i can be resumed.
+
+    The file is written to a temporary file first and then renamed, so a crash leaves the previous checkpoint intact.
+
+    :param sensitivity_number_old: Sensitivity numbers of the previous iteration for sensitivity_averaging,
+        ordered as element rows of ElementIndex.
+    :param mass_goal_i: None if not defined yet.
+    :param elm_states_before_last: None if not defined yet.
+    """
+    arrays = {
+        "i": np.array(i),
+        "element_numbers": elm_states.element_numbers,
+        "states": elm_states.array,
+        "mass": np.array(mass, dtype=float),
+        "energy_density_mean": np.array(energy_density_mean, dtype=float),
+        "sensitivity_old": np.asarray(sensitivity_number_old, dtype=float),
+        "i_violated": np.array(i_violated),
+        "check_tolerance": np.array(check_tolerance),
+        "mass_goal_i": np.array(np.nan if mass_goal_i is None else mass_goal_i, dtype=float),
+        "states_before_last": np.empty(0, dtype=np.uint8) if elm_states_before_last is None
+        else elm_states_before_last.array,
+    }
+    temporary_file = checkpoint_file + ".tmp"
+    with open(temporary_file, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary_file, checkpoint_file)
+
+
+def load_checkpoint(checkpoint_file: str, element_numbers) -> dict:
+    """Load the state of the main loop stored by save_checkpoint.
+
+    :param element_numbers: Element numbers of the present model, they must be the same as in the checkpoint.
+    :return: dict with keys of save_checkpoint parameters, None if the checkpoint file does not exist.
+    """
+    if not os.path.isfile(checkpoint_file):
+        return None
+    with np.load(checkpoint_file, allow_pickle=False) as arrays:
+        if not np.array_equal(arrays["element_numbers"], element_numbers):
+            msg = "Checkpoint " + checkpoint_file + " was written for different elements of optimization domains."
+            logging.error("\nERROR: " + msg + "\n")
+            raise ValueError(msg)
+        states_before_last = arrays["states_before_last"]
+        checkpoint = {
+            "i": int(arrays["i"]),
+            "elm_states": ElementStates(element_numbers, arrays["states"]),
+            "mass": arrays["mass"].tolist(),
+            "energy_density_mean": arrays["energy_density_mean"].tolist(),
+            "sensitivity_number_old": arrays["sensitivity_old"],
+            "i_violated": int(arrays["i_violated"]),
+            "check_tolerance": bool(arrays["check_tolerance"]),
+            "mass_goal_i": None if np.isnan(arrays["mass_goal_i"]) else float(arrays["mass_goal_i"]),
+            "elm_states_before_last": ElementStates(element_numbers, states_before_last)
+            if len(states_before_last) else None,
+        }
+    msg = "\nresuming from checkpoint " + checkpoint_file + " at iteration " + str(checkpoint["i"]) + "\n"
+    print(msg)
+    logging.info(msg)
+    return checkpoint
@@ -0,0 +1,75 @@
+import numpy as np
+
+# categories in the order of category codes and of vtk element numbering, shell categories first
+CATEGORIES = ["tria3", "tria6", "quad4", "quad8", "tetra4", "tetra10", "penta6", "penta15", "hexa8", "hexa20"]
+SHELL_CATEGORIES = ["tria3", "tria6", "quad4", "quad8"]
+
+
+class ElementIndex:
+    """Dense rows of imported elements with their category, nodes and domain membership as arrays.
+
+    Built once after import and shared by later stages: rows of element numbers are looked up in an array,
+    elements of domains are selected by boolean masks, and the element-node incidence of exports
+    (ElementNodeIncidence, VtuMesh) uses the same rows and connectivity.
+    Rows follow categories in the order of CATEGORIES and elements in the order of Elements dicts.
+
+    :param Elements: Imported elements with a dict of element number: node numbers for each category.
+    :param domains: Element numbers of element sets.
+    :param domains_from_config: Names of domains with a membership mask and rows.
+    :param area_elm: Areas of shell elements, with volume_elm (volumes of volume elements) gives measure of rows.
+    """
+
+    def __init__(self, Elements, domains=None, domains_from_config=(), area_elm=None, volume_elm=None):
+        element_numbers = []
+        category_codes = []
+        nodes_per_element = []
+        connectivity = []
+        for code, category in enumerate(CATEGORIES):
+            elm_category = getattr(Elements, category)
+            element_numbers.append(np.fromiter(elm_category.keys(), dtype=np.int64, count=len(elm_category)))
+            category_codes.append(np.full(len(elm_category), code, dtype=np.uint8))
+            nodes_per_element.append(np.fromiter((len(nodes) for nodes in elm_category.values()), dtype=np.int64,
+                                                 count=len(elm_category)))
+            connectivity.extend(elm_category.values())
+        self.element_numbers = np.concatenate(element_numbers)
+        self.category_codes = np.concatenate(category_codes)
+        self.nodes_per_element = np.concatenate(nodes_per_element)
+        # node numbers of elements one after another, nodes_per_element of each row
+        self.connectivity = np.fromiter((nn for nodes in connectivity for nn in nodes), dtype=np.int64,
+                                        count=int(self.nodes_per_element.sum()))
+        self.element_rows = np.full(self.element_numbers.max() + 1 if len(self.element_numbers) else 0, -1,
+                                    dtype=np.int64)
+        self.element_rows[self.element_numbers] = np.arange(len(self.element_numbers))
+        self.is_shell = self.category_codes < len(SHELL_CATEGORIES)
+        # area of shells and volume of volume elements, masses of rows are computed from it at once
+        if area_elm is not None and volume_elm is not None:
+            self.measure = np.array([area_elm[en] if shell else volume_elm[en] for en, shell in
+                                     zip(self.element_numbers.tolist(), self.is_shell.tolist())], dtype=float)
+        self.domain_masks = {}
+        self.domain_rows = {}  # rows of imported elements of domains in the order of domains
+        for dn in domains_from_config:
+            en_array = np.asarray(domains[dn], dtype=np.int64)
+            en_array = en_array[en_array < len(self.element_rows)]
+            rows = self.element_rows[en_array]
+            self.domain_rows[dn] = rows[rows >= 0]
+            mask = np.zeros(len(self.element_numbers), dtype=bool)
+            mask[self.domain_rows[dn]] = True
+            self.domain_masks[dn] = mask
+
+    def rows(self, element_numbers):
+        """Rows of element numbers."""
+        element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        rows = np.full(element_numbers.shape, -1, dtype=np.int64)
+        known = (element_numbers >= 0) & (element_numbers < len(self.element_rows))
+        rows[known] = self.element_rows[element_numbers[known]]
+        if np.any(rows < 0):
+            raise KeyError("elements not imported: {}".format(element_numbers[rows < 0][:10].tolist()))
+        return rows
+
+    def shells(self, dn):
+        """Shell element numbers of domain dn."""
+        return self.element_numbers[self.domain_masks[dn] & self.is_shell]
+
+    def volumes(self, dn):
+        """Volume element numbers of domain dn."""
+        return self.element_numbers[self.domain_masks[dn] & ~self.is_shell]
@@ -0,0 +1,85 @@
+import numpy as np
+
+FINGERPRINT_MODULO = 2 ** 64
+
+
+class ElementStates:
+    """States of elements stored in a compact array indexed by dense element rows.
+
+    Element numbers are mapped to rows by a lookup array, so states of many elements are read or written at once.
+    A fingerprint of all states (sum of random row keys multiplied by states) is updated with every change,
+    so comparison of snapshots is cheap.
+    States should be changed only by item assignment or set to keep the fingerprint valid.
+
+    :param element_numbers: Element numbers in the order of rows.
+    :param states: Initial states, all 0 by default.
+    """
+
+    def __init__(self, element_numbers, states=None):
+        self.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        self.element_rows = np.full(self.element_numbers.max() + 1 if len(self.element_numbers) else 0, -1,
+                                    dtype=np.int64)
+        self.element_rows[self.element_numbers] = np.arange(len(self.element_numbers))
+        self.keys = np.random.RandomState(0).randint(0, 2 ** 63, size=len(self.element_numbers), dtype=np.uint64)
+        self.array = np.zeros(len(self.element_numbers), dtype=np.uint8)
+        self.fingerprint = 0
+        if states is not None:
+            self.set_rows(np.arange(len(self.element_numbers)), states)
+
+    def rows(self, element_numbers):
+        """Rows of element numbers."""
+        rows = self.element_rows[np.asarray(element_numbers, dtype=np.int64)]
+        if np.any(rows < 0):
+            raise KeyError("elements without state: {}".format(
+                np.asarray(element_numbers)[rows < 0][:10].tolist()))
+        return rows
+
+    def get(self, element_numbers):
+        """Array of states of element numbers."""
+        return self.array[self.rows(element_numbers)]
+
+    def set(self, element_numbers, states):
+        self.set_rows(self.rows(element_numbers), states)
+
+    def set_rows(self, rows, states):
+        rows = np.asarray(rows, dtype=np.int64)
+        states = np.broadcast_to(np.asarray(states, dtype=np.uint8), rows.shape)
+        change = states.astype(np.uint64) - self.array[rows].astype(np.uint64)  # wraps around as the fingerprint
+        self.fingerprint = (self.fingerprint + int(np.sum(self.keys[rows] * change, dtype=np.uint64))) \
+            % FINGERPRINT_MODULO
+        self.array[rows] = states
+
+    def copy(self):
+        """Snapshot of states sharing element numbers and rows with the original."""
+        snapshot = ElementStates.__new__(ElementStates)
+        snapshot.element_numbers = self.element_numbers
+        snapshot.element_rows = self.element_rows
+        snapshot.keys = self.keys
+        snapshot.array = self.array.copy()
+        snapshot.fingerprint = self.fingerprint
+        return snapshot
+
+    def __getitem__(self, en):
+        if en not in self:
+            raise KeyError(en)
+        return int(self.array[self.element_rows[en]])
+
+    def __setitem__(self, en, state):
+        if en not in self:
+            raise KeyError(en)
+        self.set_rows(self.element_rows[[en]], state)
+
+    def __contains__(self, en):
+        return 0 <= en < len(self.element_rows) and self.element_rows[en] >= 0
+
+    def __len__(self):
+        return len(self.element_numbers)
+
+    def __iter__(self):
+        return iter(self.element_numbers.tolist())
+
+    def __eq__(self, other):
+        if not isinstance(other, ElementStates):
+            return False
+        return self.fingerprint == other.fingerprint and np.array_equal(self.element_numbers, other.element_numbers) \
+            and np.array_equal(self.array, other.array)
@@ -44,12 +44,16 @@ element_types_by_category = {
     # volume elements
     'tetra4': FOUR_NODE_TETRAHEDRAL_TYPES,
     'tetra10': TEN_NODE_TETRAHEDRAL_TYPES,
-    'hexa8': EIGHT_NODE_SHELL_TYPES,
+    'hexa8': EIGHT_NODE_BRICK_TYPES,
     'hexa20': TWENTY_NODE_BRICK_TYPES,
     'penta6': SIX_NODE_WEDGE_TYPES,
     'penta15': FIFTEEN_NODE_WEDGE_TYPES
 }
 
+# reverse lookup of the category of an element type
+category_by_element_type = {element_type: category
+                            for category, types in element_types_by_category.items() for element_type in types}
+
 
 def group_elements_by_category(element_dict_by_type: dict) -> dict:
     """Group elements by "category".
@@ -76,7 +80,7 @@ def group_elements_by_category(element_dict_by_type: dict) -> dict:
         'penta15': {}
     }
     for element_type, element_dict in element_dict_by_type.items():
-        for category, types in element_types_by_category.items():
-            if element_type in types:
-                elements_by_category[category].update(element_dict)
+        category = category_by_element_type.get(element_type)
+        if category:
+            elements_by_category[category].update(element_dict)
     return elements_by_category
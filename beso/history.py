@@ -0,0 +1,127 @@
+import os
+import re
+import shutil
+import zipfile
+
+import numpy as np
+
+ITERATION_MEMBER = re.compile(r"^i(\d+)/(\w+)\.npy$")
+
+
+class HistoryWriter:
+    """Compressed history of iterations in one .npz file (zip of .npy members) for replaying and post-processing.
+
+    Each iteration stores rows of elements which changed their state and their new states, a keyframe with all
+    states every keyframe_interval iterations, sensitivity numbers (float32) and mass with mean energy density.
+    Members are appended to the zip file in each record, so the file is complete after every iteration.
+
+    :param element_numbers: Element numbers, rows of stored arrays are in this order.
+    :param resume_iteration: Iteration from which a resumed run continues, records of earlier iterations in
+        the existing file are kept and the first record is a keyframe.
+    """
+
+    def __init__(self, file_name, element_numbers, keyframe_interval=20, resume_iteration=None):
+        self.file_name = file_name
+        self.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        self.keyframe_interval = keyframe_interval
+        self.last_states = None
+        if resume_iteration is not None and os.path.isfile(file_name):
+            self.remove_records(resume_iteration)
+        else:
+            with zipfile.ZipFile(file_name, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                self.write_array(zf, "element_numbers.npy", self.element_numbers)
+
+    def remove_records(self, first_iteration):
+        """Rewrite the file without records of first_iteration and later ones, which are recorded again
+        by the resumed run; members cannot be replaced in a zip file."""
+        temporary_file = self.file_name + ".tmp"
+        with zipfile.ZipFile(self.file_name, "r") as zf_old, \
+                zipfile.ZipFile(temporary_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for info in zf_old.infolist():
+                match = ITERATION_MEMBER.match(info.filename)
+                if match is None or int(match.group(1)) < first_iteration:
+                    with zf_old.open(info) as f_old, zf.open(info.filename, "w", force_zip64=True) as f:
+                        shutil.copyfileobj(f_old, f)
+        os.replace(temporary_file, self.file_name)
+
+    @staticmethod
+    def write_array(zf, name, array):
+        with zf.open(name, "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+    def record(self, i, elm_states, sensitivity_number, mass, energy_density_mean):
+        """Append iteration i, sensitivity_number is an array ordered as element_numbers."""
+        states = elm_states.get(self.element_numbers)
+        prefix = "i" + str(i).zfill(5) + "/"
+        with zipfile.ZipFile(self.file_name, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+            if self.last_states is None or i % self.keyframe_interval == 0:
+                self.write_array(zf, prefix + "states.npy", states)
+            else:
+                changed_rows = np.flatnonzero(states != self.last_states)
+                self.write_array(zf, prefix + "changed_rows.npy", changed_rows.astype(np.int64))
+                self.write_array(zf, prefix + "changed_states.npy", states[changed_rows])
+            self.write_array(zf, prefix + "sensitivity_number.npy", np.asarray(sensitivity_number, dtype=np.float32))
+            self.write_array(zf, prefix + "scalars.npy", np.array([mass, energy_density_mean], dtype=float))
+        self.last_states = states
+
+
+class HistoryReader:
+    """Random access to iterations stored by HistoryWriter.
+
+    States of an iteration are rebuilt from the nearest previous keyframe and the following changes.
+    """
+
+    def __init__(self, file_name):
+        self.npz = np.load(file_name, allow_pickle=False)
+        self.element_numbers = self.npz["element_numbers"]
+        self.members = {}  # iteration: set of member names
+        for name in self.npz.zip.namelist():
+            match = ITERATION_MEMBER.match(name)
+            if match:
+                self.members.setdefault(int(match.group(1)), set()).add(match.group(2))
+        self.iterations = sorted(self.members)
+
+    def close(self):
+        self.npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def array(self, i, name):
+        return self.npz["i" + str(i).zfill(5) + "/" + name]
+
+    def states(self, i):
+        """Element states of iteration i ordered as element_numbers."""
+        if i not in self.members:
+            raise KeyError("iteration {} is not in the history".format(i))
+        position = self.iterations.index(i)
+        keyframe = position
+        while "states" not in self.members[self.iterations[keyframe]]:
+            keyframe -= 1
+        states = self.array(self.iterations[keyframe], "states").copy()
+        for iteration in self.iterations[keyframe + 1:position + 1]:
+            states[self.array(iteration, "changed_rows")] = self.array(iteration, "changed_states")
+        return states
+
+    def switched(self, i):
+        """Element numbers which changed their state in iteration i against the previous stored iteration."""
+        position = self.iterations.index(i)
+        if "changed_rows" in self.members[i]:
+            return self.element_numbers[self.array(i, "changed_rows")]
+        if position == 0:
+            return self.element_numbers[:0]
+        return self.element_numbers[self.states(i) != self.states(self.iterations[position - 1])]
+
+    def sensitivity_number(self, i):
+        return self.array(i, "sensitivity_number")
+
+    def mass(self):
+        """Mass of all stored iterations."""
+        return np.array([self.array(i, "scalars")[0] for i in self.iterations])
+
+    def energy_density_mean(self):
+        """Mean energy density of all stored iterations."""
+        return np.array([self.array(i, "scalars")[1] for i in self.iterations])
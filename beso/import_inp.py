@@ -1,12 +1,13 @@
 import logging
 from typing import List
 
+import numpy as np
 from ccxmeshreader import read_mesh
 
 from beso.get_special_type_elements import (get_axisymmetry_elements,
                                             get_plane_strain_elements,
                                             get_plane_stress_elements)
-from beso.group_elements_by_category import group_elements_by_category
+from beso.group_elements_by_category import element_types_by_category, group_elements_by_category
 
 
 def import_inp(filename, domains_from_config, domain_optimized):
@@ -75,44 +76,16 @@ def get_filtered_elements(en_all: List[int], element_dict_by_category):
         hexa20 = {}
         penta6 = {}
         penta15 = {}
-    all_tria3 = element_dict_by_category['tria3']
-    keys = set(en_all).intersection(set(all_tria3.keys()))
-    Elements.tria3 = {k: all_tria3[k] for k in keys}
-
-    all_tria6 = element_dict_by_category['tria6']
-    keys = set(en_all).intersection(set(all_tria6.keys()))
-    Elements.tria6 = {k: all_tria6[k] for k in keys}
-
-    all_quad4 = element_dict_by_category['quad4']
-    keys = set(en_all).intersection(set(all_quad4.keys()))
-    Elements.quad4 = {k: all_quad4[k] for k in keys}
-
-    all_quad8 = element_dict_by_category['quad8']
-    keys = set(en_all).intersection(set(all_quad8.keys()))
-    Elements.quad8 = {k: all_quad8[k] for k in keys}
-
-    all_tetra4 = element_dict_by_category['tetra4']
-    keys = set(en_all).intersection(set(all_tetra4.keys()))
-    Elements.tetra4 = {k: all_tetra4[k] for k in keys}
-
-    all_tetra10 = element_dict_by_category['tetra10']
-    keys = set(en_all).intersection(set(all_tetra10.keys()))
-    Elements.tetra10 = {k: all_tetra10[k] for k in keys}
-
-    all_hexa8 = element_dict_by_category['hexa8']
-    keys = set(en_all).intersection(set(all_hexa8.keys()))
-    Elements.hexa8 = {k: all_hexa8[k] for k in keys}
-
-    all_hexa20 = element_dict_by_category['hexa20']
-    keys = set(en_all).intersection(set(all_hexa20.keys()))
-    Elements.hexa20 = {k: all_hexa20[k] for k in keys}
-
-    all_penta6 = element_dict_by_category['penta6']
-    keys = set(en_all).intersection(set(all_penta6.keys()))
-    Elements.penta6 = {k: all_penta6[k] for k in keys}
-
-    all_penta15 = element_dict_by_category['penta15']
-    keys = set(en_all).intersection(set(all_penta15.keys()))
-    Elements.penta15 = {k: all_penta15[k] for k in keys}
+    # one membership test for element numbers of all categories, elements are kept in ascending order
+    category_numbers = [np.fromiter(element_dict_by_category[category].keys(), dtype=np.int64,
+                                    count=len(element_dict_by_category[category]))
+                        for category in element_types_by_category]
+    element_numbers = np.concatenate(category_numbers)
+    found = np.isin(element_numbers, np.asarray(list(en_all), dtype=np.int64))
+    category_ends = np.cumsum([len(numbers) for numbers in category_numbers])
+    for category, numbers, found_category in zip(element_types_by_category, category_numbers,
+                                                 np.split(found, category_ends[:-1])):
+        all_category = element_dict_by_category[category]
+        setattr(Elements, category, {k: all_category[k] for k in np.sort(numbers[found_category]).tolist()})
 
     return Elements
@@ -0,0 +1,826 @@
+# BESO (Bi-directional Evolutionary Structural Optimization Method) of a CalculiX model as a reusable object
+# the model is imported and preprocessed once and can be optimized several times, e.g. for different mass goals
+
+import contextlib
+import copy
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import beso.beso_filters as beso_filters
+import beso.beso_lib as beso_lib
+import beso.checkpoint as checkpoint_lib
+import beso.history as history
+import beso.preprocessing_cache as preprocessing_cache_lib
+import beso.solvers as solvers
+import beso.vtu as vtu
+from .background import BackgroundWorker
+from .element_index import ElementIndex
+from .element_states import ElementStates
+from .import_inp import import_inp
+from .telemetry import NO_TELEMETRY, Telemetry
+
+# the maximum relative difference in mean stress in optimization domains between the last 5 iterations needed to finish
+TOLERANCE = 0.001
+
+
+class Config:
+    """Settings of the optimization, options have the names and meaning of variables in beso_conf.py.
+
+    Domain properties are dicts with elset names as keys, missing domain_thickness, domain_offset
+    and domain_orientation of a domain are set to their defaults.
+    """
+
+    DEFAULTS = {
+        "domain_optimized": {},
+        "domain_density": {},
+        "domain_thickness": {},
+        "domain_offset": {},
+        "domain_orientation": {},
+        "domain_material": {},
+        "path": ".",
+        "file_name": "Plane_Mesh.inp",
+        "mass_goal_ratio": 0.4,
+        "filter_radius": 0,
+        "sensitivity_averaging": False,
+        "mass_addition_ratio": 0.01,
+        "mass_removal_ratio": 0.03,
+        "save_iteration_results": 1,
+        "save_solver_files": "",
+        "save_resulting_format": "inp vtk",
+        "preprocessing_cache": "",
+        "preprocessing_cache_limit": 0,
+        "split_solver_deck": False,
+        "scratch_dir": "",
+        "stream_solver_output": False,
+        "checkpoint": False,
+        "resume": False,
+        "parallel_load_cases": 0,
+        "solver_backend": "calculix",
+        "mock_solver_dat": "",
+        "cpu_cores": 0,
+        "headless": False,
+        "telemetry": "",
+    }
+
+    def __init__(self, **options):
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError("unknown configuration options: " + ", ".join(sorted(unknown)))
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, copy.deepcopy(options.get(name, default)))
+        # default values if not defined by user
+        for dn in self.domain_optimized:
+            self.domain_thickness.setdefault(dn, [])
+            self.domain_offset.setdefault(dn, 0.0)
+            self.domain_orientation.setdefault(dn, [])
+
+    @classmethod
+    def from_file(cls, conf_file):
+        """Read configuration file executed as python commands (beso_conf.py), other variables are ignored."""
+        namespace = copy.deepcopy(cls.DEFAULTS)
+        with open(conf_file, "r") as f:
+            exec(f.read(), namespace)
+        return cls(**{name: namespace[name] for name in cls.DEFAULTS})
+
+    def copy(self, **overrides):
+        """Copy of the configuration with options replaced by overrides."""
+        options = {name: getattr(self, name) for name in self.DEFAULTS}
+        options.update(overrides)
+        return type(self)(**options)
+
+    def model_key(self):
+        """Options which define the imported model, other options can change between runs of one Optimizer."""
+        return (os.path.join(self.path, self.file_name),
+                tuple((dn, bool(self.domain_optimized[dn])) for dn in self.domain_optimized))
+
+    def create_telemetry(self):
+        """Telemetry writing telemetry.jsonl to path if any of "time memory profile" is in the telemetry option."""
+        if not any(token in self.telemetry for token in ["time", "memory", "profile"]):
+            return Telemetry()
+        return Telemetry(os.path.join(self.path, "telemetry.jsonl"), memory="memory" in self.telemetry,
+                         profile_dir=os.path.join(self.path, "profiles") if "profile" in self.telemetry else "")
+
+
+# sum of values added one after another as by a loop, numpy sum adds them pairwise with different rounding
+def sequential_sum(values):
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+
+class OptimizationResult:
+    """Element states of the last iteration and mass and mean energy density of all iterations of Optimizer.run."""
+
+    def __init__(self, elm_states, mass, energy_density_mean, iterations, oscillations):
+        self.elm_states = elm_states
+        self.mass = mass
+        self.energy_density_mean = energy_density_mean
+        self.iterations = iterations  # number of the last iteration
+        self.oscillations = oscillations  # True if the last iteration returned to the state of the one before last
+
+
+
+class OptimizationRun:
+    """State of one Optimizer.run shared by the phases of its iterations."""
+
+    def __init__(self, config, callbacks, telemetry):
+        self.config = config
+        self.callbacks = callbacks
+        self.telemetry = telemetry
+        self.checkpoint_file = os.path.join(config.path, "checkpoint.npz")
+        self.convergence_file = os.path.join(config.path, "convergence.csv")
+        self.file_name_resulting_states = os.path.join(config.path, "resulting_states")
+        self.filter_matrix = None
+        self.filter_rows = None
+        self.number_of_states = 0  # number of states possible in elm_states
+        self.mass_full = None
+        self.iterations_limit = 0
+        self.resumed = None  # loaded checkpoint of a resumed run
+
+        # iteration state, saved to the checkpoint
+        self.i = 0
+        self.elm_states = None
+        self.mass = []
+        self.energy_density_mean = []  # list of mean energy density in every iteration
+        self.sensitivity_number = None
+        self.sensitivity_number_old = None
+        self.i_violated = 0
+        self.check_tolerance = False
+        self.mass_goal_i = None
+        self.elm_states_before_last = None
+        self.elm_states_last = None
+        self.continue_iterations = True
+        self.oscillations = False
+
+        # exports
+        self.vtu_mesh = None
+        self.pvd_series = None
+        self.en_all_vtk = None
+        self.incidence = None
+        self.history_writer = None
+        self.file_worker = None
+        self.export_worker = None
+
+        # solver
+        self.solver = None
+        self.solver_path = None
+        self.inp_templates = []
+        self.include_files = []
+        self.job_names = []
+        self.file_name_iteration = None
+
+    def is_saved_iteration(self, i):
+        """True if results of the i-th iteration are exported by save_iteration_results."""
+        save_iteration_results = self.config.save_iteration_results
+        return bool(save_iteration_results and np.mod(float(i), save_iteration_results) == 0)
+
+# context manager writing log messages of the optimization to the log file named after the input file
+@contextlib.contextmanager
+def log_to_file(config):
+    handler = logging.FileHandler(config.file_name[:-4] + ".log", mode="a")
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    logger = logging.getLogger()
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        yield
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+        handler.close()
+
+
+class Optimizer:
+    """BESO optimization of a CalculiX model.
+
+    prepare() imports the mesh and computes element geometry and the filter matrix, run() optimizes the prepared
+    model. run() can be called repeatedly with overridden options; the model is imported again only if path,
+    file_name or optimized domains change, filter matrices are kept for each used filter_radius.
+
+    :param config: Config of the optimization.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.model_key = None
+        self.filter_matrices = {}
+
+    def prepare(self):
+        """Import the model of the config and compute element geometry and the filter matrix."""
+        telemetry = self.config.create_telemetry()
+        with log_to_file(self.config):
+            self.preprocess(self.config, telemetry)
+        telemetry.record(stage="preprocessing")
+        telemetry.close()
+
+    def preprocess(self, config, telemetry=NO_TELEMETRY):
+        file_name = os.path.join(config.path, config.file_name)
+        domains_from_config = config.domain_optimized.keys()
+
+        # mesh and domains importing, element geometry and filter parameters are loaded from the cache if possible
+        cached_preprocessing = None
+        if config.preprocessing_cache:
+            cache_key = preprocessing_cache_lib.get_cache_key(file_name, config.domain_optimized,
+                                                              config.filter_radius)
+            cached_preprocessing = preprocessing_cache_lib.load_preprocessed(config.preprocessing_cache, cache_key)
+        if cached_preprocessing:
+            [[nodes, Elements, domains, opt_domains, plane_strain, plane_stress, axisymmetry],
+             [cg, cg_min, cg_max, volume_elm, area_elm], filter_matrix] = cached_preprocessing
+        else:
+            # plane_strain, plane_stress, axisymmetry "special type" sets are only used when writing the inp
+            # opt_domains is short for "optimized domains"; Just a list of element numbers.
+            with telemetry.phase("import"):
+                [nodes, Elements, domains, opt_domains, plane_strain, plane_stress, axisymmetry] = import_inp(
+                    file_name, domains_from_config, config.domain_optimized)
+
+            # computing volume or area, and centre of gravity of each element
+            with telemetry.phase("geometry"):
+                [cg, cg_min, cg_max, volume_elm, area_elm] = beso_lib.elm_volume_cg(file_name, nodes, Elements)
+
+            # PREPARING PARAMETERS FOR FILTERING SENSITIVITY NUMBERS
+            # ======================================================
+            """
+            filter_matrix is a row-normalised sparse (CSR) matrix over optimized elements.
+            Row of each element holds weights (filter_radius - distance) of near elements divided by their sum,
+            so filtering of sensitivity numbers is a single sparse matrix-vector product.
+            """
+            with telemetry.phase("filter_preparation"):
+                filter_matrix = beso_filters.prepare2s(cg, cg_min, cg_max, config.filter_radius, opt_domains)
+            # =========================================================================================================
+
+            if config.preprocessing_cache:
+                preprocessing_cache_lib.save_preprocessed(
+                    config.preprocessing_cache, cache_key,
+                    [nodes, Elements, domains, opt_domains, plane_strain, plane_stress, axisymmetry],
+                    [cg, cg_min, cg_max, volume_elm, area_elm], filter_matrix, config.preprocessing_cache_limit)
+
+        # dense rows, categories, nodes, measures and domain membership of elements shared by all later stages,
+        # shells and volumes are selected by masks
+        element_index = ElementIndex(Elements, domains, domains_from_config, area_elm, volume_elm)
+        domain_shells = {}
+        domain_volumes = {}
+        for dn in domains_from_config:  # distinguishing shell elements and volume elements, arrays of the index
+            # Shell elements are surface elements, they have no thickness
+            domain_shells[dn] = element_index.shells(dn)
+            # Volume elements are three-dimensional and have a volume.
+            # Volume elements are also called solids, bricks or tets. The last is short for tetrahedrons.
+            domain_volumes[dn] = element_index.volumes(dn)
+
+        self.file_name = file_name
+        self.nodes = nodes
+        self.Elements = Elements
+        self.domains = domains
+        self.opt_domains = opt_domains
+        self.plane_strain = plane_strain
+        self.plane_stress = plane_stress
+        self.axisymmetry = axisymmetry
+        self.cg = cg
+        self.cg_min = cg_min
+        self.cg_max = cg_max
+        self.volume_elm = volume_elm
+        self.area_elm = area_elm
+        self.filter_matrices = {config.filter_radius: filter_matrix}
+        self.element_index = element_index
+        self.domain_shells = domain_shells
+        self.domain_volumes = domain_volumes
+        # element numbers of all domains from config, energy densities imported from .dat files are in this order
+        self.en_all = np.array(list(dict.fromkeys(en for dn in domains_from_config for en in domains[dn])),
+                               dtype=np.int64)
+        self.model_key = config.model_key()
+
+    def filter_matrix(self, filter_radius):
+        """Filter matrix of the prepared model, computed once for each filter_radius."""
+        if filter_radius not in self.filter_matrices:
+            self.filter_matrices[filter_radius] = beso_filters.prepare2s(self.cg, self.cg_min, self.cg_max,
+                                                                         filter_radius, self.opt_domains)
+        return self.filter_matrices[filter_radius]
+
+    def element_mass(self, config, elm_states, highest_state=False):
+        """Masses of elements of optimized domains in the order of loops over domain_shells and domain_volumes.
+
+        :param highest_state: Masses of elements in the highest state instead of the present states.
+        :return: [rows, mass_elm] - rows of elements in element_index and their masses
+        """
+        element_index = self.element_index
+        rows_list = []
+        mass_elm = []
+        for dn in config.domain_optimized:
+            if config.domain_optimized[dn] is True:
+                density = np.array(config.domain_density[dn], dtype=float)
+                thickness = np.array(config.domain_thickness[dn], dtype=float)
+                for shell in [True, False]:
+                    rows = np.flatnonzero(element_index.domain_masks[dn] & (element_index.is_shell == shell))
+                    if highest_state:
+                        state = np.full(len(rows), len(density) - 1)
+                    else:
+                        state = elm_states.get(element_index.element_numbers[rows]).astype(np.int64)
+                    if shell:
+                        mass_elm.append(density[state] * element_index.measure[rows] * thickness[state])
+                    else:
+                        mass_elm.append(density[state] * element_index.measure[rows])
+                    rows_list.append(rows)
+        if not rows_list:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(rows_list), np.concatenate(mass_elm)
+
+    def run(self, callbacks=(), **overrides):
+        """Run the optimization and return OptimizationResult.
+
+        :param callbacks: Functions called after evaluation of each iteration as
+            callback(i, elm_states, sensitivity_number, mass, energy_density_mean), sensitivity_number is an array
+            ordered as element_index.element_numbers, elm_states and sensitivity_number must not be modified.
+            The optimization finishes if a callback returns True.
+        :param overrides: Options replacing options of the config in this run, e.g. mass_goal_ratio=0.3.
+        """
+        config = self.config.copy(**overrides)
+        telemetry = config.create_telemetry()
+        try:
+            with log_to_file(config):
+                return self.optimize(config, callbacks, telemetry)
+        finally:
+            telemetry.close()
+
+    def optimize(self, config, callbacks, telemetry):
+        start_time = time.time()
+        self.log_settings(config)
+
+        # the model is imported only once for all runs with the same input file and optimized domains
+        if self.model_key != config.model_key():
+            self.preprocess(config, telemetry)
+        run = OptimizationRun(config, callbacks, telemetry)
+        with telemetry.phase("filter_preparation"):
+            run.filter_matrix = self.filter_matrix(config.filter_radius)
+            # rows of optimized elements (FilterMatrix.element_numbers) in arrays of element_index rows
+            run.filter_rows = self.element_index.rows(run.filter_matrix.element_numbers)
+        telemetry.record(stage="preprocessing")
+
+        self.initialize_states(run)
+        self.prepare_exports(run)
+        # solver files are moved or removed in the background, out of the way between solves
+        run.file_worker = BackgroundWorker("beso-solver-files", telemetry)
+        # results are exported in the background from snapshots of element states and sensitivity numbers
+        run.export_worker = BackgroundWorker("beso-exports", telemetry)
+        try:
+            self.prepare_solver(run)
+
+            # ===================================================
+            #                     MAIN LOOP
+            # ===================================================
+            while True:
+                energy_density_max = self.solve(run)
+                self.compute_sensitivity(run, energy_density_max)
+                self.evaluate(run, energy_density_max)
+
+                # finish or start new iteration
+                if run.continue_iterations is False or run.i >= run.iterations_limit:
+                    if not run.is_saved_iteration(run.i):
+                        self.export_element_values(run)
+                    telemetry.record(stage="iteration", iteration=run.i, mass=run.mass[run.i],
+                                     energy_density_mean=run.energy_density_mean[run.i], switched_up=0,
+                                     switched_down=0)
+                    break
+                run.i += 1  # iteration number
+                print("\n----------- new iteration number %d ----------" % run.i)
+
+                self.update_mass_goal(run)
+                [switched_up, switched_down] = self.switch_states(run)
+                elm_states_snapshot = self.export_states(run)
+                if self.check_oscillations(run):
+                    telemetry.record(stage="iteration", iteration=run.i - 1, mass=run.mass[run.i - 1],
+                                     energy_density_mean=run.energy_density_mean[run.i - 1],
+                                     switched_up=switched_up, switched_down=switched_down)
+                    break
+                self.remove_iteration_files(run)
+
+                # checkpoint is saved after exports of the iteration, so resumed runs do not miss any exported states
+                if config.checkpoint:
+                    run.export_worker.submit(checkpoint_lib.save_checkpoint, run.checkpoint_file, run.i,
+                                             elm_states_snapshot, list(run.mass), list(run.energy_density_mean),
+                                             run.sensitivity_number_old.copy(), run.i_violated, run.check_tolerance,
+                                             run.mass_goal_i, run.elm_states_before_last)
+
+                # times of phases of the evaluated iteration and its switching as one JSON line
+                telemetry.record(stage="iteration", iteration=run.i - 1, mass=run.mass[run.i - 1],
+                                 energy_density_mean=run.energy_density_mean[run.i - 1], switched_up=switched_up,
+                                 switched_down=switched_down)
+            # ===================================================
+            #                   END OF MAIN LOOP
+            # ===================================================
+
+            self.finish(run)
+        finally:
+            # also after errors, background tasks are finished and solver files are removed from scratch_dir
+            run.export_worker.close(raise_error=False)
+            run.file_worker.close(raise_error=False)
+            if config.scratch_dir and run.solver_path:
+                shutil.rmtree(run.solver_path, ignore_errors=True)
+
+        # PRINT TOTAL TIME
+        # =====================================================================
+        total_time = time.time() - start_time
+        total_time_h = int(total_time / 3600.0)
+        total_time_min = int((total_time % 3600) / 60.0)
+        total_time_s = int(round(total_time % 60))
+        msg = "\n"
+        msg += ("Finished at  " + time.ctime() + "\n")
+        msg += ("Total time   " + str(total_time_h) + " h " +
+                str(total_time_min) + " min " + str(total_time_s) + " s\n")
+        msg += "\n"
+        logging.info(msg)
+        print("total time: " + str(total_time_h) + " h " +
+              str(total_time_min) + " min " + str(total_time_s) + " s")
+        # =====================================================================
+
+        return OptimizationResult(run.elm_states, run.mass, run.energy_density_mean, run.i, run.oscillations)
+
+    # writing log file with settings
+    def log_settings(self, config):
+        msg = "\n"
+        msg += "---------------------------------------------------\n"
+        msg += ("file_name = %s\n" % config.file_name)
+        msg += ("Start at    " + time.ctime() + "\n\n")
+        for dn in config.domain_optimized:
+            msg += ("elset_name              = %s\n" % dn)
+            msg += ("domain_optimized        = %s\n" % config.domain_optimized[dn])
+            msg += ("domain_density          = %s\n" % config.domain_density[dn])
+            msg += ("domain_thickness        = %s\n" % config.domain_thickness[dn])
+            msg += ("domain_offset           = %s\n" % config.domain_offset[dn])
+            msg += ("domain_orientation      = %s\n" % config.domain_orientation[dn])
+            msg += ("domain_material         = %s\n" % config.domain_material[dn])
+            msg += "\n"
+        msg += ("mass_goal_ratio         = %s\n" % config.mass_goal_ratio)
+        msg += ("filter_radius           = %s\n" % config.filter_radius)
+        msg += ("mass_addition_ratio     = %s\n" % config.mass_addition_ratio)
+        msg += ("mass_removal_ratio      = %s\n" % config.mass_removal_ratio)
+        msg += ("sensitivity_averaging   = %s\n" % config.sensitivity_averaging)
+        msg += ("save_iteration_results  = %s\n" % config.save_iteration_results)
+        msg += ("save_solver_files       = %s\n" % config.save_solver_files)
+        msg += ("save_resulting_format   = %s\n" % config.save_resulting_format)
+        msg += ("split_solver_deck       = %s\n" % config.split_solver_deck)
+        msg += ("scratch_dir             = %s\n" % config.scratch_dir)
+        msg += ("stream_solver_output    = %s\n" % config.stream_solver_output)
+        msg += ("preprocessing_cache     = %s\n" % config.preprocessing_cache)
+        msg += ("preprocessing_cache_limit = %s\n" % config.preprocessing_cache_limit)
+        msg += ("checkpoint              = %s\n" % config.checkpoint)
+        msg += ("resume                  = %s\n" % config.resume)
+        msg += ("parallel_load_cases     = %s\n" % config.parallel_load_cases)
+        msg += ("solver_backend          = %s\n" % config.solver_backend)
+        msg += ("cpu_cores               = %s\n" % config.cpu_cores)
+        msg += ("headless                = %s\n" % config.headless)
+        msg += ("telemetry               = %s\n" % config.telemetry)
+        if config.solver_backend == "mock":
+            msg += ("mock_solver_dat         = %s\n" % config.mock_solver_dat)
+        msg += "\n"
+        logging.info(msg)
+
+    # initial element states, mass and iterations limit or the state of the checkpoint when resuming
+    def initialize_states(self, run):
+        config = run.config
+        for dn in config.domain_optimized:
+            run.number_of_states = max(run.number_of_states, len(config.domain_density[dn]))
+
+        # initialize element states
+        run.elm_states = ElementStates(self.en_all)
+        for dn in config.domain_optimized:
+            run.elm_states.set(self.domains[dn], len(config.domain_density[dn]) - 1)  # set to highest state
+        run.elm_states_last = run.elm_states
+
+        run.mass = [sequential_sum(self.element_mass(config, run.elm_states)[1])]
+        # sum from initial states TODO make it independent on starting elm_states?
+        run.mass_full = sequential_sum(self.element_mass(config, run.elm_states, highest_state=True)[1])
+        print("initial optimization domains mass {}" .format(run.mass[0]))
+
+        # iterations limit - default "auto"matic setting
+        m = run.mass[0] / run.mass_full
+        it = 0
+        if config.mass_removal_ratio - config.mass_addition_ratio > 0:
+            while m > config.mass_goal_ratio:
+                m -= m * (config.mass_removal_ratio - config.mass_addition_ratio)
+                it += 1
+        else:
+            while m < config.mass_goal_ratio:
+                m += m * (config.mass_addition_ratio - config.mass_removal_ratio)
+                it += 1
+        run.iterations_limit = it + 25
+        print("\niterations_limit set automatically to %s" % run.iterations_limit)
+        msg = ("\niterations_limit        = %s\n" % run.iterations_limit)
+        logging.info(msg)
+
+        # writing log table header
+        msg = "\n"
+        msg += "domain order: \n"
+        dorder = 0
+        for dn in config.domain_optimized:
+            msg += str(dorder) + ") " + dn + "\n"
+            dorder += 1
+        msg += "\n   i              mass"
+        msg += "    ener_dens_mean"
+
+        msg += "\n"
+        logging.info(msg)
+
+        # sensitivity numbers are arrays ordered as element_index rows, solver results are in the same order
+        run.sensitivity_number_old = np.full(len(self.element_index.element_numbers), np.nan)
+
+        # continue from the last completed iteration, solved iterations are not run again
+        if config.resume:
+            run.resumed = checkpoint_lib.load_checkpoint(run.checkpoint_file, self.en_all)
+        if run.resumed:
+            run.i = run.resumed["i"]
+            run.elm_states = run.resumed["elm_states"]
+            run.mass = run.resumed["mass"]
+            run.energy_density_mean = run.resumed["energy_density_mean"]
+            run.sensitivity_number_old = run.resumed["sensitivity_number_old"]
+            run.i_violated = run.resumed["i_violated"]
+            run.check_tolerance = run.resumed["check_tolerance"]
+            run.mass_goal_i = run.resumed["mass_goal_i"]
+            run.elm_states_before_last = run.resumed["elm_states_before_last"]
+            run.elm_states_last = run.elm_states.copy()
+
+    # preparing for writing quick results, states of resumed iterations are kept
+    def prepare_exports(self, run):
+        save_resulting_format = run.config.save_resulting_format
+        if "vtu" in save_resulting_format:  # binary files with topology built once, states as .pvd series
+            run.vtu_mesh = vtu.VtuMesh(self.nodes, self.element_index)
+            run.pvd_series = vtu.PvdSeries(run.file_name_resulting_states + ".pvd", resume=bool(run.resumed))
+        elif run.resumed:
+            run.en_all_vtk = beso_lib.vtk_element_numbers(self.Elements)
+        else:
+            [run.en_all_vtk, associated_nodes] = beso_lib.vtk_mesh(
+                run.file_name_resulting_states, self.nodes, self.Elements)
+        if "vtk" in save_resulting_format:  # element-node incidence for nodal averages built once for all exports
+            run.incidence = run.vtu_mesh.incidence if "vtu" in save_resulting_format else \
+                beso_lib.ElementNodeIncidence(self.element_index)
+        if "history" in save_resulting_format:  # compressed states (as changes), sensitivities, mass of iterations
+            run.history_writer = history.HistoryWriter(os.path.join(run.config.path, "resulting_history.npz"),
+                                                       self.element_index.element_numbers,
+                                                       resume_iteration=run.resumed["i"] if run.resumed else None)
+
+    # templates of solver input files and the solver backend
+    def prepare_solver(self, run):
+        config = run.config
+        # number of cpu cores used by CalculiX is passed to its jobs as OMP_NUM_THREADS
+        cpu_cores = config.cpu_cores or multiprocessing.cpu_count()
+        # the original .inp file is parsed once, iteration files are written from the template
+        run.inp_templates = [beso_lib.parse_inp_template(self.file_name)]
+        # solver files are written to a unique subdirectory of scratch_dir, kept files are moved to path
+        if config.scratch_dir:
+            run.solver_path = tempfile.mkdtemp(prefix="beso_", dir=config.scratch_dir)
+            run.inp_templates[0] = beso_lib.absolute_include_paths(run.inp_templates[0], config.path)
+        else:
+            run.solver_path = config.path
+        if config.parallel_load_cases:  # each step is solved as a separate job (load case)
+            run.inp_templates = beso_lib.split_inp_template_steps(run.inp_templates[0])
+        if config.solver_backend == "mock":  # deterministic energy densities without running CalculiX
+            run.solver = solvers.MockSolver(self.domains, config.domain_optimized.keys(),
+                                            self.element_index.element_numbers, self.cg, run.number_of_states,
+                                            config.mock_solver_dat)
+        else:
+            run.solver = solvers.CalculixSolver(run.solver_path, self.element_index.element_numbers,
+                                                config.domain_optimized.keys(), cpu_cores,
+                                                config.parallel_load_cases, config.stream_solver_output)
+        if config.split_solver_deck:  # static parts of the .inp file are written only once and included
+            [run.inp_templates, run.include_files] = beso_lib.split_inp_templates(
+                run.inp_templates, os.path.join(run.solver_path, "file_static"))
+
+    # writing .inp files of the iteration, running the analysis and reading results
+    def solve(self, run):
+        config = run.config
+        # creating the new .inp files for CalculiX, one file for each load case solved separately
+        run.file_name_iteration = os.path.join(config.path, "file" + str(run.i).zfill(3))
+        job_nameW = os.path.join(run.solver_path, "file" + str(run.i).zfill(3))
+        if len(run.inp_templates) == 1:
+            run.job_names = [job_nameW]
+        else:
+            run.job_names = [job_nameW + "_lc" + str(lc) for lc in range(len(run.inp_templates))]
+        with run.telemetry.phase("write_inp"):
+            for inp_template, job_name in zip(run.inp_templates, run.job_names):
+                beso_lib.write_inp(inp_template, job_name, run.elm_states, run.number_of_states, self.domains,
+                                   config.domain_optimized.keys(), config.domain_optimized, config.domain_thickness,
+                                   config.domain_offset, config.domain_orientation, config.domain_material,
+                                   self.domain_volumes, self.domain_shells, self.plane_strain, self.plane_stress,
+                                   self.axisymmetry, config.save_iteration_results, run.i)
+        # running the analysis and reading results
+        # from .dat files, array of steps (of all load cases) x element_index rows
+        [energy_density_step, energy_density_eigen] = run.solver.solve(run.job_names, run.elm_states, run.telemetry)
+
+        # check if results were found
+        missing_ccx_results = False
+        if not len(energy_density_step):
+            missing_ccx_results = True
+        if missing_ccx_results:
+            msg = "CalculiX results not found, check CalculiX for errors."
+            logging.error("\nERROR: " + msg + "\n")
+            assert False, msg
+
+        # handling with more steps
+        # [max(energy of en1 from sn1, energy of en1 from sn2, ...), max(energy of en2 ...), ...]
+        return energy_density_step.max(axis=0)
+
+    # filtered and averaged sensitivity numbers of the iteration
+    def compute_sensitivity(self, run, energy_density_max):
+        filter_rows = run.filter_rows
+        run.sensitivity_number = energy_density_max.copy()
+
+        # filtering sensitivity number
+        with run.telemetry.phase("filtering"):
+            run.sensitivity_number[filter_rows] = beso_filters.run2(self.file_name,
+                                                                    run.sensitivity_number[filter_rows],
+                                                                    run.filter_matrix)
+
+        # TODO: sensitivity_averaging is a config option.
+        #       why is it needed, and what does it do?
+        #       If it should stabilize iterations, then why not always use it?
+        #       See Andrea_De_Marco_MSc_thesis.pdf p. 18
+        #       Application of Evolutionary Structural Optimization to Reinforced Concrete Structures
+        #       Andrea De Marco
+        if run.config.sensitivity_averaging:
+            # averaging with the last iteration should stabilize iterations
+            if run.i > 0:
+                run.sensitivity_number[filter_rows] = (
+                    run.sensitivity_number[filter_rows] + run.sensitivity_number_old[filter_rows]) / 2.0
+            # for averaging in the next step
+            run.sensitivity_number_old[filter_rows] = run.sensitivity_number[filter_rows]
+
+    # mean energy density, exports and callbacks of the evaluated iteration and the check of convergence
+    def evaluate(self, run, energy_density_max):
+        config = run.config
+        i = run.i
+        mass = run.mass
+        energy_density_mean = run.energy_density_mean
+        # computing mean stress from maximums of each element in all steps in the optimization domain
+        [rows, mass_elm] = self.element_mass(config, run.elm_states)
+        energy_density_mean_sum = sequential_sum(energy_density_max[rows] * mass_elm)
+        energy_density_mean.append(energy_density_mean_sum / mass[i])  # mean of element maximums
+        print("energy_density_mean    = {}".format(energy_density_mean[i]))
+
+        # writing log table row
+        msg = str(i).rjust(4, " ") + " " + str(mass[i]).rjust(17, " ") + " "
+        msg += " " + str(energy_density_mean[i]).rjust(17, " ")
+        logging.info(msg)
+
+        if "history" in config.save_resulting_format:
+            run.export_worker.submit(run.history_writer.record, i, run.elm_states.copy(),
+                                     run.sensitivity_number.copy(), mass[i], energy_density_mean[i])
+
+        run.export_worker.submit(beso_lib.export_convergence, run.convergence_file, list(mass),
+                                 list(energy_density_mean))
+
+        # callbacks can stop the optimization after the evaluated iteration
+        for callback in run.callbacks:
+            if callback(i, run.elm_states, run.sensitivity_number, mass[i], energy_density_mean[i]) is True:
+                run.continue_iterations = False
+
+        # export element values
+        if run.is_saved_iteration(i):
+            self.export_element_values(run)
+
+        # relative difference in a mean energy density for the last 5 iterations must be < tolerance
+        if len(energy_density_mean) > 5:
+            difference_last = []
+            for last in range(1, 6):
+                difference_last.append(abs(
+                    energy_density_mean[i] - energy_density_mean[i - last]) / energy_density_mean[i])
+            difference = max(difference_last)
+            if run.check_tolerance is True:
+                print("maximum relative difference in energy_density_mean for the last 5 iterations = "
+                      "{}".format(difference))
+            if difference < TOLERANCE:
+                run.continue_iterations = False
+            elif energy_density_mean[i] == energy_density_mean[i - 1] == energy_density_mean[i - 2]:
+                run.continue_iterations = False
+                print(
+                    "energy_density_mean[i] == energy_density_mean[i-1] == energy_density_mean[i-2]")
+
+    # export element values of the evaluated iteration from snapshots
+    def export_element_values(self, run):
+        save_resulting_format = run.config.save_resulting_format
+        elm_states_snapshot = run.elm_states.copy()
+        sensitivity_number_snapshot = run.sensitivity_number.copy()
+        if "csv" in save_resulting_format:
+            run.export_worker.submit(beso_lib.export_csv, run.config.domain_optimized.keys(), self.domains,
+                                     run.file_name_iteration, self.cg, elm_states_snapshot,
+                                     sensitivity_number_snapshot, self.element_index.element_numbers)
+        if "vtk" in save_resulting_format:
+            run.export_worker.submit(beso_lib.export_vtk, run.file_name_iteration, self.nodes, self.Elements,
+                                     elm_states_snapshot, sensitivity_number_snapshot, run.incidence)
+        if "vtu" in save_resulting_format:
+            run.export_worker.submit(vtu.export_vtu, run.file_name_iteration, run.vtu_mesh, elm_states_snapshot,
+                                     sensitivity_number_snapshot)
+
+    # set mass_goal for i-th iteration, check for number of violated elements
+    def update_mass_goal(self, run):
+        config = run.config
+        i = run.i
+        mass_full = run.mass_full
+        if config.mass_removal_ratio - config.mass_addition_ratio > 0:  # removing from initial mass
+            if run.mass[i - 1] <= config.mass_goal_ratio * mass_full:  # goal mass achieved
+                if not run.i_violated:
+                    run.i_violated = i  # to start decaying
+                    run.check_tolerance = True
+                if run.mass_goal_i is None:
+                    msg = "\nWARNING: mass goal is lower than initial mass. Check mass_goal_ratio."
+                    logging.warning(msg + "\n")
+            else:
+                run.mass_goal_i = config.mass_goal_ratio * mass_full
+        else:  # adding to initial mass  TODO include stress limit
+            if run.mass[i - 1] < config.mass_goal_ratio * mass_full:
+                run.mass_goal_i = run.mass[i - 1] + \
+                    (config.mass_addition_ratio - config.mass_removal_ratio) * mass_full
+            elif run.mass[i - 1] >= config.mass_goal_ratio * mass_full:
+                if not run.i_violated:
+                    run.i_violated = i  # to start decaying
+                    run.check_tolerance = True
+                run.mass_goal_i = config.mass_goal_ratio * mass_full
+
+    # switch element states, returns numbers of elements switched up and down
+    def switch_states(self, run):
+        config = run.config
+        mass_referential = run.mass[run.i - 1]
+        states_before = run.elm_states.array.copy()
+        with run.telemetry.phase("switching"):
+            [run.elm_states, run.mass] = beso_lib.switching(run.elm_states, config.domain_optimized.keys(),
+                                                            config.domain_optimized, config.domain_density,
+                                                            config.domain_thickness, self.element_index,
+                                                            run.sensitivity_number, run.mass, mass_referential,
+                                                            config.mass_addition_ratio, config.mass_removal_ratio,
+                                                            run.i_violated, run.i, run.mass_goal_i)
+        switched_up = int(np.count_nonzero(run.elm_states.array > states_before))
+        switched_down = int(np.count_nonzero(run.elm_states.array < states_before))
+        return [switched_up, switched_down]
+
+    # export the present mesh, returns the snapshot of element states used by exports
+    def export_states(self, run):
+        save_resulting_format = run.config.save_resulting_format
+        elm_states_snapshot = run.elm_states.copy()
+        if "vtu" in save_resulting_format:
+            run.export_worker.submit(vtu.append_vtu_states, run.file_name_resulting_states, run.pvd_series,
+                                     run.vtu_mesh, run.i, elm_states_snapshot)
+        else:
+            run.export_worker.submit(beso_lib.append_vtk_states,
+                                     run.file_name_resulting_states, run.i, run.en_all_vtk, elm_states_snapshot)
+
+        file_nameW2 = os.path.join(run.config.path, "file" + str(run.i).zfill(3))
+        if run.is_saved_iteration(run.i):
+            if "frd" in save_resulting_format:
+                run.export_worker.submit(beso_lib.export_frd, file_nameW2, self.nodes, self.Elements,
+                                         elm_states_snapshot, run.number_of_states)
+            if "inp" in save_resulting_format:
+                run.export_worker.submit(beso_lib.export_inp, file_nameW2, self.nodes, self.Elements,
+                                         elm_states_snapshot, run.number_of_states)
+        return elm_states_snapshot
+
+    # check for oscillation state, snapshots are compared by fingerprints first
+    def check_oscillations(self, run):
+        if run.elm_states_before_last == run.elm_states:  # oscillating state
+            msg = "\nOSCILLATION: model turns back to " + \
+                str(run.i - 2) + "th iteration.\n"
+            logging.info(msg)
+            print(msg)
+            run.oscillations = True
+            return True
+        run.elm_states_before_last = run.elm_states_last.copy()
+        run.elm_states_last = run.elm_states.copy()
+        return False
+
+    # removing solver files of the evaluated iteration
+    def remove_iteration_files(self, run):
+        config = run.config
+        results_dir = config.path if config.scratch_dir else None
+        for job_name in run.job_names:
+            if run.is_saved_iteration(run.i - 1):
+                run.file_worker.submit(beso_lib.remove_solver_files, job_name, config.save_solver_files,
+                                       results_dir)
+            else:
+                run.file_worker.submit(beso_lib.remove_solver_files, job_name)
+
+    # exporting the result mesh and removing solver files after the last iteration
+    def finish(self, run):
+        config = run.config
+        if not run.is_saved_iteration(run.i):
+            if "frd" in config.save_resulting_format:
+                run.export_worker.submit(beso_lib.export_frd, run.file_name_iteration, self.nodes, self.Elements,
+                                         run.elm_states.copy(), run.number_of_states)
+            if "inp" in config.save_resulting_format:
+                run.export_worker.submit(beso_lib.export_inp, run.file_name_iteration, self.nodes, self.Elements,
+                                         run.elm_states.copy(), run.number_of_states)
+        run.export_worker.submit(beso_lib.export_convergence, run.convergence_file, list(run.mass),
+                                 list(run.energy_density_mean))
+        run.export_worker.close()  # waits for all exports, errors of exports are raised here
+
+        results_dir = config.path if config.scratch_dir else None
+        for job_name in run.job_names:
+            run.file_worker.submit(beso_lib.remove_solver_files, job_name, config.save_solver_files, results_dir)
+        for include_file in run.include_files:
+            if "inp" not in config.save_solver_files:
+                run.file_worker.submit(os.remove, include_file)
+            elif config.scratch_dir:
+                run.file_worker.submit(shutil.move, include_file,
+                                       os.path.join(config.path, os.path.basename(include_file)))
+        run.file_worker.close()
+        run.telemetry.record(stage="finishing")  # exports and cleanup finished after the last iteration
@@ -0,0 +1,71 @@
+# plots of mass and mean energy density of iterations from convergence.csv written by the optimization
+#
+# usage: python -m beso.plot [path/convergence.csv] [--show]
+# matplotlib is imported only here, the optimization itself runs without it
+
+import argparse
+import csv
+import os
+import sys
+
+
+# function reading mass and mean energy density of iterations written by beso_lib.export_convergence
+def read_convergence(file_name):
+    mass = []
+    energy_density_mean = []
+    with open(file_name, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            mass.append(float(row["mass"]))
+            if row["energy_density_mean"]:
+                energy_density_mean.append(float(row["energy_density_mean"]))
+    return mass, energy_density_mean
+
+
+# function saving Mass.png and energy_density_mean.png figures to output_dir (directory of file_name by default)
+def plot_convergence(file_name, output_dir=None, show=False):
+    import matplotlib.pyplot as plt
+
+    [mass, energy_density_mean] = read_convergence(file_name)
+    if output_dir is None:
+        output_dir = os.path.dirname(file_name)
+    plt.close("all")
+
+    fn = 0  # figure number
+    # plot mass
+    fn += 1
+    plt.figure(fn)
+    plt.plot(range(len(mass)), mass, label="mass")
+    plt.title("Mass of optimization domains")
+    plt.xlabel("Iteration")
+    plt.ylabel("Mass")
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig(os.path.join(output_dir, "Mass"), dpi=100)
+
+    # plot mean energy density
+    fn += 1
+    plt.figure(fn)
+    plt.plot(range(len(energy_density_mean)), energy_density_mean)
+    plt.title("Mean Energy Density weighted by element mass")
+    plt.xlabel("Iteration")
+    plt.ylabel("energy_density_mean")
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig(os.path.join(output_dir, "energy_density_mean"), dpi=100)
+
+    if show:
+        plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plot mass and mean energy density of optimization iterations.")
+    parser.add_argument("file_name", nargs="?", default="convergence.csv", help="convergence.csv of the optimization")
+    parser.add_argument("--output", default=None, help="directory for figures, the directory of file_name by default")
+    parser.add_argument("--show", action="store_true", help="show figures in a window")
+    args = parser.parse_args(argv)
+    plot_convergence(args.file_name, args.output, args.show)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from beso.beso_filters import FilterMatrix
+from beso.group_elements_by_category import element_types_by_category
+from beso.import_inp import get_filtered_elements
+
+CACHE_EXTENSION = ".npz"
+
+
+def get_cache_key(file_name: str, domain_optimized: dict, filter_radius) -> str:
+    """Content hash of the input file (and files it includes), the configured domains and filter radius."""
+    key = hashlib.sha256()
+    file_names = [file_name]
+    while file_names:
+        name = file_names.pop(0)
+        with open(name, "rb") as f:
+            for line in f:
+                key.update(line)
+                if line[:8].upper() == b"*INCLUDE":
+                    include = line.split(b"=", 1)[-1].strip().decode()
+                    file_names.append(os.path.join(os.path.dirname(name), include))
+    settings = {"domain_optimized": {dn: bool(domain_optimized[dn]) for dn in domain_optimized},
+                "filter_radius": float(filter_radius)}
+    key.update(json.dumps(settings, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def save_preprocessed(cache_dir: str, cache_key: str, mesh: list, geometry: list, filter_matrix: FilterMatrix,
+                      size_limit: float = 0):
+    """Store results of import_inp, elm_volume_cg and prepare2s as numpy arrays.
+
+    :param mesh: [nodes, Elements, domains, opt_domains, plane_strain, plane_stress, axisymmetry]
+    :param geometry: [cg, cg_min, cg_max, volume_elm, area_elm]
+    :param size_limit: Maximal size of the cache directory in bytes, 0 - no limit.
+        The least recently used entries are evicted first.
+    """
+    [nodes, Elements, domains, opt_domains, plane_strain, plane_stress, axisymmetry] = mesh
+    [cg, cg_min, cg_max, volume_elm, area_elm] = geometry
+    arrays = {
+        "node_numbers": np.fromiter(nodes.keys(), dtype=np.int64, count=len(nodes)),
+        "node_coordinates": np.array(list(nodes.values()), dtype=float).reshape(-1, 3),
+        "domain_names": np.array(list(domains.keys()), dtype=str),
+        "domain_sizes": np.array([len(en_list) for en_list in domains.values()], dtype=np.int64),
+        "domain_elements": np.array([en for en_list in domains.values() for en in en_list], dtype=np.int64),
+        "opt_domains": np.array(opt_domains, dtype=np.int64),
+        "plane_strain": np.array(sorted(plane_strain), dtype=np.int64),
+        "plane_stress": np.array(sorted(plane_stress), dtype=np.int64),
+        "axisymmetry": np.array(sorted(axisymmetry), dtype=np.int64),
+        "cg_numbers": np.fromiter(cg.keys(), dtype=np.int64, count=len(cg)),
+        "cg": np.array(list(cg.values()), dtype=float).reshape(-1, 3),
+        "cg_min": np.array(cg_min, dtype=float),
+        "cg_max": np.array(cg_max, dtype=float),
+        "volume_numbers": np.fromiter(volume_elm.keys(), dtype=np.int64, count=len(volume_elm)),
+        "volume_elm": np.fromiter(volume_elm.values(), dtype=float, count=len(volume_elm)),
+        "area_numbers": np.fromiter(area_elm.keys(), dtype=np.int64, count=len(area_elm)),
+        "area_elm": np.fromiter(area_elm.values(), dtype=float, count=len(area_elm)),
+        "filter_element_numbers": filter_matrix.element_numbers,
+        "filter_indptr": filter_matrix.indptr,
+        "filter_indices": filter_matrix.indices,
+        "filter_data": filter_matrix.data,
+    }
+    for category in element_types_by_category:
+        elm_category = getattr(Elements, category)
+        arrays[category + "_numbers"] = np.fromiter(elm_category.keys(), dtype=np.int64, count=len(elm_category))
+        arrays[category + "_connectivity"] = np.array(list(elm_category.values()), dtype=np.int64)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = os.path.join(cache_dir, cache_key + CACHE_EXTENSION)
+    temporary_file = cache_file + ".tmp"
+    with open(temporary_file, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary_file, cache_file)
+    if size_limit:
+        evict(cache_dir, size_limit, keep=cache_file)
+
+
+def load_preprocessed(cache_dir: str, cache_key: str):
+    """Load cached preprocessing results, returns None if there is no entry for the cache_key.
+
+    :return: [mesh, geometry, filter_matrix] as stored by save_preprocessed.
+    """
+    cache_file = os.path.join(cache_dir, cache_key + CACHE_EXTENSION)
+    if not os.path.isfile(cache_file):
+        return None
+    with np.load(cache_file, allow_pickle=False) as arrays:
+        nodes = dict(zip(arrays["node_numbers"].tolist(), arrays["node_coordinates"].tolist()))
+        element_dict_by_category = {}
+        en_all = []
+        for category in element_types_by_category:
+            numbers = arrays[category + "_numbers"].tolist()
+            element_dict_by_category[category] = dict(zip(numbers, arrays[category + "_connectivity"].tolist()))
+            en_all.extend(numbers)
+        Elements = get_filtered_elements(en_all, element_dict_by_category)
+        domain_elements = np.split(arrays["domain_elements"], np.cumsum(arrays["domain_sizes"])[:-1])
+        domains = {str(dn): en_list.tolist() for dn, en_list in zip(arrays["domain_names"], domain_elements)}
+        mesh = [nodes, Elements, domains, arrays["opt_domains"].tolist(), set(arrays["plane_strain"].tolist()),
+                set(arrays["plane_stress"].tolist()), set(arrays["axisymmetry"].tolist())]
+
+        geometry = [dict(zip(arrays["cg_numbers"].tolist(), arrays["cg"].tolist())),
+                    arrays["cg_min"].tolist(),
+                    arrays["cg_max"].tolist(),
+                    dict(zip(arrays["volume_numbers"].tolist(), arrays["volume_elm"].tolist())),
+                    dict(zip(arrays["area_numbers"].tolist(), arrays["area_elm"].tolist()))]
+
+        filter_matrix = FilterMatrix.from_csr(arrays["filter_element_numbers"], arrays["filter_indptr"],
+                                              arrays["filter_indices"], arrays["filter_data"])
+    os.utime(cache_file)  # mark as recently used for eviction
+    msg = "\npreprocessed mesh, element geometry and filter loaded from cache " + cache_file + "\n"
+    print(msg)
+    logging.info(msg)
+    return mesh, geometry, filter_matrix
+
+
+def evict(cache_dir: str, size_limit: float, keep: str = None):
+    """Remove the least recently used cache entries until the cache directory fits to size_limit bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_EXTENSION):
+            path = os.path.join(cache_dir, name)
+            entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= size_limit:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total_size -= size
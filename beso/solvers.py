@@ -0,0 +1,168 @@
+import logging
+import shutil
+
+import numpy as np
+
+import beso.beso_lib as beso_lib
+from beso.telemetry import NO_TELEMETRY
+
+
+class CalculixSolver:
+    """Solver backend running CalculiX on the written decks and reading energy densities from .dat files.
+
+    :param path: Directory where the solver runs.
+    :param element_numbers: Element numbers of optimization domains, results are arrays in this order.
+    :param cpu_cores: Cores divided between jobs running at once.
+    :param parallel_jobs: Maximal number of jobs (load cases) running at once.
+    :param stream_output: Parse .dat files while CalculiX is writing them.
+    """
+
+    def __init__(self, path, element_numbers, domains_from_config, cpu_cores, parallel_jobs=1, stream_output=False):
+        self.ccx_path = shutil.which('ccx')
+        if self.ccx_path is None:
+            msg = "ccx must be installed, and available in your PATH."
+            logging.error("\nERROR: " + msg + "\n")
+            raise FileNotFoundError(msg)
+        self.path = path
+        self.element_numbers = element_numbers
+        self.domains_from_config = domains_from_config
+        self.cpu_cores = cpu_cores
+        self.parallel_jobs = parallel_jobs
+        self.stream_output = stream_output
+
+    def solve(self, job_names, elm_states, telemetry=NO_TELEMETRY):
+        """Run jobs of written decks job_name.inp and return energy densities of their steps.
+
+        :param telemetry: Telemetry measuring "solver" and "dat_parsing" phases.
+        :return: [energy_density_step, energy_density_eigen] - array of steps (of all jobs) x element_numbers
+            and dict of job_name: dict of eigen_number: array as import_FI_int_pt
+        :raises RuntimeError: If a job exits with an error or its .dat file has no energy densities.
+        """
+        if self.stream_output:  # parsing energy densities from .dat file while CalculiX is writing it
+            dat_followers = [beso_lib.DatFollower(job_name, beso_lib.EnergyDensityParser(self.element_numbers,
+                                                                                         self.domains_from_config))
+                             for job_name in job_names]
+            for dat_follower in dat_followers:
+                dat_follower.start()
+        with telemetry.phase("solver"):
+            exit_codes = beso_lib.run_ccx_jobs(self.ccx_path, job_names, self.path, self.cpu_cores,
+                                               self.parallel_jobs)
+
+        energy_density_step = []
+        energy_density_eigen = {}
+        with telemetry.phase("dat_parsing"):  # only the rest of parsing after the solver end if streaming
+            for jn, job_name in enumerate(job_names):
+                if self.stream_output:
+                    [energy_density_step_job, energy_density_eigen_job] = dat_followers[jn].results()
+                else:
+                    [energy_density_step_job, energy_density_eigen_job] = \
+                        beso_lib.import_FI_int_pt(job_name, self.element_numbers, self.domains_from_config)
+                check_missing_elements(job_name, self.element_numbers, energy_density_step_job)
+                energy_density_step.append(energy_density_step_job)
+                energy_density_eigen[job_name] = energy_density_eigen_job
+        check_job_results(job_names, energy_density_step, exit_codes)
+        return np.concatenate(energy_density_step), energy_density_eigen
+
+
+class MockSolver:
+    """Deterministic solver backend for profiling and benchmarking without CalculiX.
+
+    Energy densities are computed from a cheap analytic field of element centres of gravity, lowered for elements
+    in lower states, or replayed from a recorded .dat file. They are written to job_name.dat in CalculiX format
+    (with empty .frd, .sta and .cvg files) and parsed back, so the whole iteration runs as with CalculiX.
+
+    :param domains: Element numbers of each domain, results are written for sets of domains_from_config.
+    :param element_numbers: Element numbers of optimization domains, results are arrays in this order.
+    :param cg: Centres of gravity of elements.
+    :param number_of_states: Number of element states.
+    :param recorded_dat: .dat file to replay instead of the analytic field, the same results are returned
+        in every iteration.
+    """
+
+    def __init__(self, domains, domains_from_config, element_numbers, cg, number_of_states, recorded_dat=""):
+        self.domains = domains
+        self.domains_from_config = domains_from_config
+        self.element_numbers = np.asarray(element_numbers, dtype=np.int64)
+        points = np.array([cg[en] for en in self.element_numbers.tolist()], dtype=float).reshape(-1, 3)
+        extent = points.max(axis=0) - points.min(axis=0) if len(points) else np.ones(3)
+        self.relative_position = (points - points.min(axis=0)) / np.where(extent > 0, extent, 1.0)
+        self.number_of_states = number_of_states
+        self.recorded = None
+        if recorded_dat:
+            file_nameR = recorded_dat[:-4] if recorded_dat.endswith(".dat") else recorded_dat
+            self.recorded = beso_lib.import_FI_int_pt(file_nameR, self.element_numbers, domains_from_config)[0]
+            check_missing_elements(file_nameR, self.element_numbers, self.recorded)
+
+    def energy_density(self, job_number, elm_states):
+        """Array of steps x element_numbers of energy densities for a job."""
+        if self.recorded is not None:
+            return self.recorded
+        [u, v, w] = self.relative_position.T
+        field = 1.0 + np.cos(np.pi * (u + 0.5 * job_number)) ** 2 * (1.0 + v) + 0.5 * np.sin(np.pi * w) ** 2
+        state_factor = (elm_states.get(self.element_numbers) + 0.01) / max(1, self.number_of_states - 1)
+        return (field * state_factor)[np.newaxis, :]
+
+    def solve(self, job_names, elm_states, telemetry=NO_TELEMETRY):
+        """Write and parse results of jobs as CalculixSolver.solve, decks are not read."""
+        with telemetry.phase("solver"):
+            for jn, job_name in enumerate(job_names):
+                write_energy_density_dat(job_name, self.domains, self.domains_from_config, self.element_numbers,
+                                         self.energy_density(jn, elm_states))
+                for extension in ["frd", "sta", "cvg"]:
+                    open(job_name + "." + extension, "w").close()
+        energy_density_step = []
+        energy_density_eigen = {}
+        with telemetry.phase("dat_parsing"):
+            for job_name in job_names:
+                [energy_density_step_job, energy_density_eigen_job] = \
+                    beso_lib.import_FI_int_pt(job_name, self.element_numbers, self.domains_from_config)
+                check_missing_elements(job_name, self.element_numbers, energy_density_step_job)
+                energy_density_step.append(energy_density_step_job)
+                energy_density_eigen[job_name] = energy_density_eigen_job
+        check_job_results(job_names, energy_density_step)
+        return np.concatenate(energy_density_step), energy_density_eigen
+
+
+# function checking that each job (load case) ended without error and has energy densities of some steps,
+# so that a failed load case is not left out of the maximum over steps
+def check_job_results(job_names, energy_density_step_jobs, exit_codes=None):
+    failed = []
+    for jn, job_name in enumerate(job_names):
+        if exit_codes is not None and exit_codes[jn]:
+            failed.append("%s (exit code %s)" % (job_name, exit_codes[jn]))
+        elif not len(energy_density_step_jobs[jn]):
+            failed.append("%s (no energy densities in .dat file)" % job_name)
+    if failed:
+        msg = "CalculiX results not found for jobs: " + ", ".join(failed) + ", check CalculiX for errors."
+        logging.error("\nERROR: " + msg + "\n")
+        raise RuntimeError(msg)
+
+
+# function checking that energy densities of all elements were found in .dat file of a job,
+# missing elements are NaN and would spread to sensitivity numbers through the maximum over steps
+def check_missing_elements(job_name, element_numbers, energy_density_step):
+    missing = np.isnan(energy_density_step).any(axis=0)
+    if missing.any():
+        msg = ("Energy densities of %d elements not found in %s.dat, e.g. elements %s. Check that the elsets of "
+               "domains are written to the .dat file." % (np.count_nonzero(missing), job_name,
+                                                          np.asarray(element_numbers)[missing][:10].tolist()))
+        logging.error("\nERROR: " + msg + "\n")
+        raise RuntimeError(msg)
+
+
+# function for writing energy densities (array of steps x element_numbers) to .dat file in CalculiX format
+# one integration point is written for each element of sets given by domains_from_config which is in element_numbers
+def write_energy_density_dat(file_nameW, domains, domains_from_config, element_numbers, energy_density_step):
+    element_rows = dict(zip(np.asarray(element_numbers).tolist(), range(len(element_numbers))))
+    domains = {dn: [en for en in domains[dn] if en in element_rows] for dn in domains_from_config}
+    with open(file_nameW + ".dat", "w") as f:
+        for sn, energy_density in enumerate(energy_density_step):
+            f.write("\n                        S T E P       " + str(sn + 1) + "\n\n\n")
+            for dn in domains_from_config:
+                f.write(" internal energy density (element, integration point, energy) for set " + dn.upper() +
+                        " and time  " + "%.7E" % (sn + 1) + "\n\n")
+                rows = [element_rows[en] for en in domains[dn]]
+                lines = ["%10d%5d %13.6E\n" % (en, 1, value)
+                         for en, value in zip(domains[dn], energy_density[rows].tolist())]
+                f.writelines(lines)
+                f.write("\n")
@@ -0,0 +1,153 @@
+# parameter sweep running optimization jobs of a base configuration in separate working directories
+#
+# usage: python -m beso.sweep beso/beso_conf.py --grid mass_goal_ratio=0.3,0.4 --grid filter_radius=2,3 --cores 8
+#                                               --cores-per-job 2 --output sweep
+
+import argparse
+import ast
+import csv
+import itertools
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from beso.beso_lib import absolute_include_paths
+from beso.optimizer import Config
+from beso.plot import read_convergence
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# row of the log table written by beso_main: iteration, mass, mean energy density
+LOG_TABLE_ROW = re.compile(r"^INFO:root:\s*(\d+)\s+(\S+)\s+(\S+)\s*$")
+SUMMARY_FIELDS = ["job", "returncode", "iterations", "mass", "energy_density_mean", "wall_time"]
+
+
+# function returning list of dicts with all combinations of the parameter grid {name: [values]}
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+# function parsing command line grid definitions "name=value1,value2" to {name: [values]}
+def parse_grid(definitions):
+    grid = {}
+    for definition in definitions:
+        [name, values] = definition.split("=", 1)
+        grid[name.strip()] = [ast.literal_eval(value.strip()) for value in values.split(",")]
+    return grid
+
+
+# function reading path and file_name of the input file from the configuration file
+def read_input_file(conf_file):
+    config = Config.from_file(conf_file)
+    return os.path.join(config.path, config.file_name)
+
+
+# function preparing the working directory of one job: copy of the input file (with absolute include paths)
+# and configuration file made of the base configuration followed by the job parameters
+def write_job(job_dir, base_conf_text, input_file, parameters, cpu_cores):
+    os.makedirs(job_dir, exist_ok=True)
+    with open(input_file, "rb") as f:
+        [[_, inp_text]] = absolute_include_paths([("static", f.read())], os.path.dirname(os.path.abspath(input_file)))
+    with open(os.path.join(job_dir, os.path.basename(input_file)), "wb") as f:
+        f.write(inp_text)
+    lines = ["\n# parameters of the sweep job\n",
+             "path = \".\"\n",
+             "file_name = %r\n" % os.path.basename(input_file),
+             "cpu_cores = %r\n" % cpu_cores,
+             "headless = True\n"]
+    for name, value in parameters.items():
+        lines.append("%s = %r\n" % (name, value))
+    conf_file = os.path.join(job_dir, "beso_conf.py")
+    with open(conf_file, "w") as f:
+        f.write(base_conf_text + "".join(lines))
+    return conf_file
+
+
+# function running beso in the job directory, stdout and stderr are saved to beso.out
+def run_job(job_dir, conf_file, cpu_cores):
+    env = dict(os.environ)
+    env["BESO_CONF"] = os.path.abspath(conf_file)
+    env["OMP_NUM_THREADS"] = str(cpu_cores)
+    env["PYTHONPATH"] = os.pathsep.join([REPO_DIR] + [p for p in [env.get("PYTHONPATH")] if p])
+    start = time.time()
+    with open(os.path.join(job_dir, "beso.out"), "w") as out:
+        returncode = subprocess.call([sys.executable, "-c", "import beso.beso_main"], cwd=job_dir, env=env,
+                                     stdout=out, stderr=subprocess.STDOUT)
+    return returncode, time.time() - start
+
+
+# function reading the last row of the log table: (iteration, mass, energy_density_mean) or None
+def read_log_table(log_file):
+    last_row = None
+    if os.path.isfile(log_file):
+        with open(log_file, "r") as f:
+            for line in f:
+                match = LOG_TABLE_ROW.match(line)
+                if match:
+                    last_row = (int(match.group(1)), float(match.group(2)), float(match.group(3)))
+    return last_row
+
+
+# function reading the last evaluated iteration of a job from convergence.csv, or from the log table if the job
+# failed before writing it: (iteration, mass, energy_density_mean) or None
+def read_job_result(job_dir, log_name):
+    convergence_file = os.path.join(job_dir, "convergence.csv")
+    if os.path.isfile(convergence_file):
+        [mass, energy_density_mean] = read_convergence(convergence_file)
+        if energy_density_mean:
+            last = len(energy_density_mean) - 1
+            return last, mass[last], energy_density_mean[last]
+    return read_log_table(os.path.join(job_dir, log_name))
+
+
+# function running all jobs of the grid under the core budget and writing summary.csv to the output directory
+def run_sweep(base_conf, grid, output_dir, cores=0, cores_per_job=1):
+    cores = cores or multiprocessing.cpu_count()
+    cores_per_job = max(1, min(cores_per_job, cores))
+    with open(base_conf, "r") as f:
+        base_conf_text = f.read()
+    input_file = read_input_file(base_conf)
+    log_name = os.path.basename(input_file)[:-4] + ".log"
+    parameter_sets = expand_grid(grid)
+
+    def job(j, parameters):
+        job_name = "job" + str(j).zfill(3)
+        job_dir = os.path.join(output_dir, job_name)
+        conf_file = write_job(job_dir, base_conf_text, input_file, parameters, cores_per_job)
+        [returncode, wall_time] = run_job(job_dir, conf_file, cores_per_job)
+        last_row = read_job_result(job_dir, log_name) or (None, None, None)
+        row = {"job": job_name, "returncode": returncode, "iterations": last_row[0], "mass": last_row[1],
+               "energy_density_mean": last_row[2], "wall_time": round(wall_time, 3)}
+        row.update(parameters)
+        print("%s finished with return code %s in %.1f s" % (job_name, returncode, wall_time))
+        return row
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, cores // cores_per_job)) as executor:
+        rows = list(executor.map(job, range(len(parameter_sets)), parameter_sets))
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS[:1] + list(grid) + SUMMARY_FIELDS[1:])
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run beso for all combinations of configuration parameters.")
+    parser.add_argument("base_conf", help="configuration file used as a base of all jobs")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=VALUE1,VALUE2",
+                        help="values of a configuration parameter, can be repeated")
+    parser.add_argument("--cores", type=int, default=0, help="cores used by all jobs together, 0 - all cores")
+    parser.add_argument("--cores-per-job", type=int, default=1, help="cores (OMP_NUM_THREADS) of each job")
+    parser.add_argument("--output", default="sweep", help="directory for job directories and summary.csv")
+    args = parser.parse_args(argv)
+    rows = run_sweep(args.base_conf, parse_grid(args.grid), args.output, args.cores, args.cores_per_job)
+    return 0 if all(row["returncode"] == 0 for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
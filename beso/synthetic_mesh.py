@@ -0,0 +1,201 @@
+import argparse
+import sys
+
+import numpy as np
+
+from beso.solvers import write_energy_density_dat
+
+# names of element sets written to decks
+OPTIMIZED_SET = "SolidOptimized"
+NONDESIGN_SET = "SolidNondesign"
+
+# CalculiX element types of generated categories, plane stress elements for 2D meshes
+ELEMENT_TYPES = {"tria3": "CPS3", "quad4": "CPS4", "tetra4": "C3D4", "hexa8": "C3D8", "hexa20": "C3D20"}
+
+# material of both element sets written to decks, 2D sections have a unit thickness
+MATERIAL_NAME = "SolidMaterial"
+MATERIAL = "*ELASTIC\n210000, 0.3"
+
+# elements of a unit cell, local coordinates of their nodes in the node order of CalculiX
+CELL_ELEMENTS = {
+    "tria3": [[(0, 0), (1, 0), (1, 1)], [(0, 0), (1, 1), (0, 1)]],
+    "quad4": [[(0, 0), (1, 0), (1, 1), (0, 1)]],
+    "hexa8": [[(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]],
+    "hexa20": [[(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1),
+                (0.5, 0, 0), (1, 0.5, 0), (0.5, 1, 0), (0, 0.5, 0), (0.5, 0, 1), (1, 0.5, 1), (0.5, 1, 1),
+                (0, 0.5, 1), (0, 0, 0.5), (1, 0, 0.5), (1, 1, 0.5), (0, 1, 0.5)]],
+}
+
+
+# Kuhn subdivision of the cell to 6 tetrahedra along its diagonal, conforming between neighbouring cells
+def _cell_tetrahedra():
+    tetrahedra = []
+    for axes in [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)]:
+        vertices = [np.zeros(3)]
+        for axis in axes:
+            vertices.append(vertices[-1] + np.eye(3)[axis])
+        if np.linalg.det(np.array(vertices[1:]) - vertices[0]) < 0:  # nodes 1, 2, 3 anticlockwise seen from node 4
+            vertices[1], vertices[2] = vertices[2], vertices[1]
+        tetrahedra.append([tuple(vertex) for vertex in vertices])
+    return tetrahedra
+
+
+CELL_ELEMENTS["tetra4"] = _cell_tetrahedra()
+
+
+# function returning numbers of cells in each direction for about element_count elements,
+# the length is twice the height (and width) as in a cantilever beam
+def grid_divisions(category, element_count):
+    cell_elements = len(CELL_ELEMENTS[category])
+    dimensions = len(CELL_ELEMENTS[category][0][0])
+    cells = max(1.0, element_count / cell_elements)
+    n = max(1, int(round((cells / 2) ** (1.0 / dimensions))))
+    return (2 * n,) + (n,) * (dimensions - 1)
+
+
+class StructuredMesh:
+    """Structured grid of unit cells split to elements of one category, with an optimized and a non-design element set.
+
+    Elements of cells in the last nondesign_ratio of the length form NONDESIGN_SET, the rest OPTIMIZED_SET.
+    The mesh is a cantilever fixed at x = 0 and loaded at the opposite end, so energy densities of a plausible field
+    are highest near the fixed end and at the top and bottom faces.
+
+    :param category: Element category, one of ELEMENT_TYPES.
+    :param element_count: Requested number of elements, the generated number follows from whole numbers of cells.
+    :param nondesign_ratio: Ratio of the length with non-design elements.
+    :param divisions: Numbers of cells in each direction instead of element_count.
+    """
+
+    def __init__(self, category, element_count=1000, nondesign_ratio=0.1, divisions=None):
+        if category not in ELEMENT_TYPES:
+            raise ValueError("unknown element category '{}', choose from {}".format(category, list(ELEMENT_TYPES)))
+        self.category = category
+        self.divisions = tuple(divisions) if divisions else grid_divisions(category, element_count)
+        cell_elements = np.array(CELL_ELEMENTS[category], dtype=float)
+        dimensions = cell_elements.shape[2]
+        if len(self.divisions) != dimensions:
+            raise ValueError("{} needs {} divisions".format(category, dimensions))
+        scale = 2 if np.any(cell_elements % 1) else 1  # midside nodes lie on a grid of half cells
+        local = (cell_elements * scale).astype(np.int64)
+        shape = [n * scale + 1 for n in self.divisions]
+
+        # grid point numbers of element nodes, cells ordered with x fastest
+        cell_origins = np.indices(self.divisions[::-1]).reshape(dimensions, -1)[::-1]
+        points = np.zeros((cell_origins.shape[1],) + local.shape[:2], dtype=np.int64)
+        stride = 1
+        for d in range(dimensions):
+            points += ((cell_origins[d] * scale)[:, np.newaxis, np.newaxis] + local[np.newaxis, :, :, d]) * stride
+            stride *= shape[d]
+
+        # only grid points used by elements are nodes, numbered from 1 in the order of the grid
+        used_points = np.unique(points) if scale > 1 else np.arange(np.prod(shape))
+        self.connectivity = (np.searchsorted(used_points, points) + 1).reshape(-1, local.shape[1])
+        self.node_numbers = np.arange(1, len(used_points) + 1)
+        self.node_coordinates = np.zeros((len(used_points), 3))
+        self.node_coordinates[:, :dimensions] = np.array(np.unravel_index(used_points, shape[::-1])[::-1]).T / scale
+
+        self.element_numbers = np.arange(1, len(self.connectivity) + 1)
+        cell_x = np.repeat(cell_origins[0], local.shape[0])
+        self.optimized = cell_x < int(round(self.divisions[0] * (1 - nondesign_ratio)))
+        self.domains = {OPTIMIZED_SET: self.element_numbers[self.optimized].tolist(),
+                        NONDESIGN_SET: self.element_numbers[~self.optimized].tolist()}
+
+    def __len__(self):
+        return len(self.element_numbers)
+
+    def centres(self):
+        """Array of element centres, mean of node coordinates."""
+        centres = np.zeros((len(self), 3))
+        for d in range(3):
+            centres[:, d] = self.node_coordinates[self.connectivity - 1, d].mean(axis=1)
+        return centres
+
+    def energy_density(self, steps=1):
+        """Array of steps x elements of energy densities of a bending-like field, varying between steps."""
+        extent = np.maximum(self.node_coordinates.max(axis=0), 1.0)
+        [u, v, w] = (self.centres() / extent).T
+        bending = (1.05 - u) ** 2 * ((2 * v - 1) ** 2 + 0.1)
+        return np.array([bending * (1.0 + 0.5 * np.sin(np.pi * (w + 0.5 * sn))) for sn in range(steps)])
+
+    def write_inp(self, file_name, steps=1):
+        """Write CalculiX deck with nodes, elements, element sets and steps loading the free end in turns.
+
+        Data blocks end with an empty line as in FreeCAD decks. Both element sets get a section of MATERIAL,
+        so the deck can be solved as it is; the optimization redefines sections of its optimized domains.
+        """
+        dimensions = len(self.divisions)
+        nodes_per_element = self.connectivity.shape[1]
+        element_format = ", ".join(["%d"] * min(nodes_per_element + 1, 16))
+        if nodes_per_element + 1 > 16:  # at most 16 entries on a line
+            element_format += ",\n" + ", ".join(["%d"] * (nodes_per_element + 1 - 16))
+        length = self.node_coordinates[:, 0].max()
+        fixed = self.node_numbers[self.node_coordinates[:, 0] == 0]
+        loaded = self.node_numbers[self.node_coordinates[:, 0] == length]
+        with open(file_name, "w") as f:
+            f.write("** synthetic mesh of {} {} elements in {} cells\n".format(len(self), self.category,
+                                                                              " x ".join(map(str, self.divisions))))
+            f.write("*NODE, NSET=Nall\n")
+            np.savetxt(f, np.column_stack([self.node_numbers, self.node_coordinates]), fmt="%d, %.6f, %.6f, %.6f")
+            f.write("\n*ELEMENT, TYPE={}, ELSET=Eall\n".format(ELEMENT_TYPES[self.category]))
+            np.savetxt(f, np.column_stack([self.element_numbers, self.connectivity]), fmt=element_format)
+            f.write("\n")
+            for dn, en in self.domains.items():
+                f.write("*ELSET, ELSET={}\n".format(dn))
+                _write_numbers(f, en)
+            f.write("*NSET, NSET=Fixed\n")
+            _write_numbers(f, fixed)
+            f.write("*NSET, NSET=Loaded\n")
+            _write_numbers(f, loaded)
+            f.write("*MATERIAL, NAME={}\n{}\n\n".format(MATERIAL_NAME, MATERIAL))
+            for dn in self.domains:
+                f.write("*SOLID SECTION, ELSET={}, MATERIAL={}\n".format(dn, MATERIAL_NAME))
+                if dimensions == 2:  # thickness of plane stress elements
+                    f.write("1.0\n")
+                f.write("\n")
+            for sn in range(steps):
+                direction = [2, 1, 3][sn % dimensions]  # bending down, tension and bending to the side in turns
+                f.write("*STEP\n*STATIC\n*BOUNDARY\nFixed, 1, {}\n".format(dimensions))
+                f.write("*CLOAD\n")
+                np.savetxt(f, loaded, fmt="%d, {}, {:.6E}".format(direction, -1.0 / len(loaded)))
+                f.write("*NODE FILE\nU\n*EL FILE\nS, E\n*END STEP\n")
+
+    def write_dat(self, file_nameW, steps=1):
+        """Write energy densities of the field to file_nameW.dat as CalculiX for elements of both sets."""
+        write_energy_density_dat(file_nameW, self.domains, self.domains, self.element_numbers,
+                                 self.energy_density(steps))
+
+
+# function writing numbers of a set, 16 on a line
+def _write_numbers(f, numbers):
+    numbers = np.asarray(numbers)
+    full = len(numbers) - len(numbers) % 16
+    if full:
+        np.savetxt(f, numbers[:full].reshape(-1, 16), fmt="%d", delimiter=", ")
+    if len(numbers) > full:
+        f.write(", ".join(map(str, numbers[full:].tolist())) + ",\n")
+    f.write("\n")  # the mesh reader ends data of a keyword at an empty line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a structured mesh deck and energy densities for scaling "
+                                                 "studies without a solver.")
+    parser.add_argument("category", choices=list(ELEMENT_TYPES), help="element category")
+    parser.add_argument("elements", type=int, help="approximate number of elements")
+    parser.add_argument("--output", default="synthetic.inp", help="deck file name, .dat is written next to it")
+    parser.add_argument("--steps", type=int, default=1, help="number of load cases")
+    parser.add_argument("--nondesign-ratio", type=float, default=0.1, help="ratio of the length with non-design "
+                                                                           "elements")
+    parser.add_argument("--no-dat", action="store_true", help="write only the deck")
+    args = parser.parse_args(argv)
+    mesh = StructuredMesh(args.category, args.elements, args.nondesign_ratio)
+    mesh.write_inp(args.output, args.steps)
+    if not args.no_dat:
+        mesh.write_dat(args.output[:-4] if args.output.endswith(".inp") else args.output, args.steps)
+    print("{}: {} {} elements ({}), {} nodes, element sets {} and {}".format(
+        args.output, len(mesh), args.category, ELEMENT_TYPES[args.category], len(mesh.node_numbers), OPTIMIZED_SET,
+        NONDESIGN_SET))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is not reported
+    resource = None
+
+
+# function returning the peak resident set size of the process in kB, or None if it is not available
+def peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, kB elsewhere
+
+
+class Telemetry:
+    """Timers of optimization phases written as one JSON line for each record (iteration).
+
+    Times of phases are summed from their start to the next record. Phases run by background threads are wrapped by
+    timed() and are counted in the record following their end. Phases must not be nested.
+
+    :param file_name: File of JSON lines, "" - telemetry is disabled and phases cost nothing.
+    :param memory: Add peak memory traced by tracemalloc in each phase and peak RSS of the process to records.
+        Before Python 3.9, a phase not exceeding the peak of earlier phases reports its larger traced memory
+        at its start and end instead of its peak. tracemalloc traces all threads, so peaks of phases overlapping
+        tasks of background threads (e.g. exports) include memory of those tasks, such phases are listed in
+        memory_shared of the record.
+    :param profile_dir: Directory for cProfile stats of each phase (phase_name.prof) dumped by close,
+        "" - no profiling. Only phases of the main thread are profiled.
+    """
+
+    def __init__(self, file_name="", memory=False, profile_dir=""):
+        self.file_name = file_name
+        self.memory = memory and bool(file_name)
+        self.profile_dir = profile_dir if file_name else ""
+        self.times = {}
+        self.memory_peaks = {}
+        self.memory_shared = set()  # phases which overlapped background tasks
+        self.background_running = 0  # number of running background tasks
+        self.background_started = 0  # number of started background tasks
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.started_tracemalloc = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context measuring time (and memory, profile) of phase name."""
+        if not self.file_name:
+            yield
+            return
+        profile = None
+        if self.profile_dir:
+            if name not in self.profiles:
+                self.profiles[name] = cProfile.Profile()
+            profile = self.profiles[name]
+            profile.enable()
+        if self.memory:
+            with self.lock:
+                [running_start, started_start] = [self.background_running, self.background_started]
+            [memory_start, peak_start] = tracemalloc.get_traced_memory()
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile:
+                profile.disable()
+            if self.memory:
+                [memory_end, peak_end] = tracemalloc.get_traced_memory()
+                # without reset_peak, the peak is of the phase only if the phase exceeded the previous peak,
+                # otherwise traced memory at the phase start and end is the best known estimate
+                if not hasattr(tracemalloc, "reset_peak") and peak_end <= peak_start:
+                    peak_end = max(memory_start, memory_end)
+            with self.lock:
+                self.times[name] = self.times.get(name, 0.0) + elapsed
+                if self.memory:
+                    self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak_end)
+                    if running_start or self.background_started != started_start:
+                        self.memory_shared.add(name)
+
+    def timed(self, name, function):
+        """Function adding its run time to phase name, for tasks of background threads."""
+        if not self.file_name:
+            return function
+
+        def timed_function(*args, **kwargs):
+            with self.lock:
+                self.background_running += 1
+                self.background_started += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.times[name] = self.times.get(name, 0.0) + elapsed
+                    self.background_running -= 1
+        return timed_function
+
+    def record(self, **values):
+        """Append JSON line of values with times (and memory) of phases since the previous record."""
+        if not self.file_name:
+            return
+        with self.lock:
+            [times, self.times] = [self.times, {}]
+            [memory_peaks, self.memory_peaks] = [self.memory_peaks, {}]
+            [memory_shared, self.memory_shared] = [self.memory_shared, set()]
+        line = dict(values)
+        line["time"] = {name: round(elapsed, 6) for name, elapsed in times.items()}
+        if self.memory:
+            line["memory_peak"] = memory_peaks
+            line["memory_shared"] = sorted(memory_shared)
+            line["rss_peak_kb"] = peak_rss()
+        with open(self.file_name, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def close(self):
+        """Dump profiles of phases and stop tracemalloc started by this instance."""
+        if self.profiles:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for name, profile in self.profiles.items():
+                profile.dump_stats(os.path.join(self.profile_dir, name + ".prof"))
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+
+# disabled telemetry for callers which do not measure phases
+NO_TELEMETRY = Telemetry()
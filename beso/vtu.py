@@ -0,0 +1,138 @@
+import os
+import re
+import zlib
+
+import numpy as np
+
+from beso.beso_lib import VTK_CATEGORIES, ElementNodeIncidence
+
+# vtk cell types of element categories
+VTK_CELL_TYPES = {"tria3": 5, "tria6": 22, "quad4": 9, "quad8": 23, "tetra4": 10, "tetra10": 24, "penta6": 13,
+                  "penta15": 26, "hexa8": 12, "hexa20": 25}
+# size of blocks compressed separately by zlib
+BLOCK_SIZE = 2 ** 20
+VTU_TYPES = {np.dtype("<f8"): "Float64", np.dtype("<i8"): "Int64", np.dtype("u1"): "UInt8"}
+
+
+# function for encoding an array to a block of appended raw data, UInt64 header with the data size
+# or zlib compressed blocks with a header of their sizes
+def encode_array(array, compress):
+    data = np.ascontiguousarray(array).tobytes()
+    if not compress:
+        return np.array([len(data)], dtype="<u8").tobytes() + data
+    blocks = [data[start:start + BLOCK_SIZE] for start in range(0, len(data), BLOCK_SIZE)]
+    compressed_blocks = [zlib.compress(block) for block in blocks]
+    header = [len(blocks), BLOCK_SIZE, len(blocks[-1]) if blocks else 0] + [len(block) for block in compressed_blocks]
+    return np.array(header, dtype="<u8").tobytes() + b"".join(compressed_blocks)
+
+
+class VtuMesh:
+    """Mesh topology for binary XML VTU files (appended raw data, zlib compressed by default).
+
+    Node renumbering, connectivity (from ElementNodeIncidence), offsets and cell types are built once as arrays
+    from rows of the element index and their encoded data are reused by every written file, so each write encodes
+    only the result arrays. Elements are numbered in the same order as by vtk_mesh.
+    """
+
+    def __init__(self, nodes, element_index, compress=True):
+        self.compress = compress
+        self.incidence = ElementNodeIncidence(element_index)
+        self.element_numbers = self.incidence.element_numbers
+        self.node_numbers = self.incidence.node_numbers  # only nodes of elements are written, renumbered from 0
+        self.connectivity = self.incidence.node_rows
+        self.offsets = np.cumsum(self.incidence.nodes_per_element)
+        self.cell_types = np.array([VTK_CELL_TYPES[category] for category in VTK_CATEGORIES],
+                                   dtype=np.uint8)[element_index.category_codes]
+        points = np.array([nodes[nn] for nn in self.node_numbers.tolist()], dtype="<f8").reshape(-1, 3)
+        self.topology = [("Points", "Float64", 3, encode_array(points, compress)),
+                         ("connectivity", "Int64", 1, encode_array(self.connectivity.astype("<i8"), compress)),
+                         ("offsets", "Int64", 1, encode_array(self.offsets.astype("<i8"), compress)),
+                         ("types", "UInt8", 1, encode_array(self.cell_types, compress))]
+
+    def write(self, file_name, cell_data, point_data=None):
+        """Write .vtu file with cell_data and point_data given as dicts of name: array."""
+        point_data = point_data or {}
+        offset = 0
+        appended = []
+
+        def data_array(name, array_type, components, data, name_attribute=True):
+            nonlocal offset
+            appended.append(data)
+            line = '<DataArray type="' + array_type + '"'
+            if name_attribute:
+                line += ' Name="' + name + '"'
+            if components > 1:
+                line += ' NumberOfComponents="' + str(components) + '"'
+            line += ' format="appended" offset="' + str(offset) + '"/>\n'
+            offset += len(data)
+            return line
+
+        def result_arrays(data):
+            lines = []
+            for name, values in data.items():
+                values = np.asarray(values)
+                values = values.astype("u1" if values.dtype == np.uint8 else "<f8")
+                lines.append(data_array(name, VTU_TYPES[values.dtype], 1, encode_array(values, self.compress)))
+            return lines
+
+        text = ['<?xml version="1.0"?>\n',
+                '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64"' +
+                (' compressor="vtkZLibDataCompressor"' if self.compress else '') + '>\n',
+                '<UnstructuredGrid>\n',
+                '<Piece NumberOfPoints="' + str(len(self.node_numbers)) + '" NumberOfCells="' +
+                str(len(self.element_numbers)) + '">\n',
+                '<PointData>\n'] + result_arrays(point_data) + ['</PointData>\n', '<CellData>\n'] + \
+            result_arrays(cell_data) + ['</CellData>\n', '<Points>\n']
+        [name, array_type, components, data] = self.topology[0]
+        text += [data_array(name, array_type, components, data, name_attribute=False), '</Points>\n', '<Cells>\n']
+        for name, array_type, components, data in self.topology[1:]:
+            text.append(data_array(name, array_type, components, data))
+        text += ['</Cells>\n', '</Piece>\n', '</UnstructuredGrid>\n', '<AppendedData encoding="raw">\n_']
+        with open(file_name, "wb") as f:
+            f.write("".join(text).encode())
+            f.writelines(appended)
+            f.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+class PvdSeries:
+    """ParaView .pvd collection of files written in iterations, time step is the iteration number.
+
+    :param resume: Keep data sets of the existing file (of a resumed run).
+    """
+
+    def __init__(self, file_name, resume=False):
+        self.file_name = file_name
+        self.data_sets = []
+        if resume and os.path.isfile(file_name):
+            with open(file_name, "r") as f:
+                self.data_sets = [(int(float(timestep)), data_file) for timestep, data_file in
+                                  re.findall(r'<DataSet timestep="([^"]*)" part="0" file="([^"]*)"/>', f.read())]
+
+    def add(self, i, data_file):
+        """Add data_file (path relative to the .pvd file) for iteration i and rewrite the .pvd file."""
+        self.data_sets = [(timestep, name) for timestep, name in self.data_sets if timestep < i]
+        self.data_sets.append((i, data_file))
+        text = ['<?xml version="1.0"?>\n',
+                '<VTKFile type="Collection" version="0.1" byte_order="LittleEndian">\n',
+                '<Collection>\n']
+        for timestep, name in self.data_sets:
+            text.append('<DataSet timestep="' + str(timestep) + '" part="0" file="' + name + '"/>\n')
+        text += ['</Collection>\n', '</VTKFile>\n']
+        with open(self.file_name, "w") as f:
+            f.write("".join(text))
+
+
+# function for exporting results to binary .vtu file, element values as export_vtk
+# sensitivity_number is an array ordered as vtu_mesh.element_numbers (rows of ElementIndex)
+def export_vtu(file_nameW, vtu_mesh, elm_states, sensitivity_number):
+    states = elm_states.get(vtu_mesh.element_numbers)
+    vtu_mesh.write(file_nameW + ".vtu",
+                   {"element_states": states, "sensitivity_number": np.asarray(sensitivity_number, dtype=float)},
+                   {"element_states_averaged_at_nodes": vtu_mesh.incidence.nodal_average(states)})
+
+
+# function for exporting states of the iteration i to the .vtu file added to the .pvd time series
+def append_vtu_states(file_nameW, pvd_series, vtu_mesh, i, elm_states):
+    data_file = file_nameW + str(i).zfill(3) + ".vtu"
+    vtu_mesh.write(data_file, {"element_states": elm_states.get(vtu_mesh.element_numbers)})
+    pvd_series.add(i, os.path.relpath(data_file, os.path.dirname(os.path.abspath(pvd_series.file_name))))
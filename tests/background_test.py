@@ -0,0 +1,32 @@
+import unittest
+
+from beso.background import BackgroundWorker
+
+
+class BackgroundWorkerTest(unittest.TestCase):
+
+    def test_tasks_run_in_submitted_order(self):
+        worker = BackgroundWorker()
+        done = []
+        for task in range(5):
+            worker.submit(done.append, task)
+        worker.close()
+        self.assertListEqual(done, [0, 1, 2, 3, 4])
+
+    def test_error_is_raised_in_main_thread(self):
+        worker = BackgroundWorker()
+        worker.submit(int, 'not a number')
+        with self.assertRaises(ValueError):
+            worker.flush()
+        worker.close()
+
+    def test_close_without_raising_error_after_another_error(self):
+        worker = BackgroundWorker()
+        worker.submit(int, 'not a number')
+        worker.close(raise_error=False)
+        worker.close(raise_error=False)  # closing a stopped worker does nothing
+        self.assertFalse(worker.thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from beso.beso_filters import near_points, prepare2s, run2
+
+
+class NearPointsTest(unittest.TestCase):
+
+    def test_near_points_matches_brute_force(self):
+        points = np.random.RandomState(0).rand(500, 3) * [10, 3, 0.5]
+        r_min = 0.6
+
+        [first, second, distance] = near_points(points, r_min, chunk_size=1000)
+
+        found = {(min(a, b), max(a, b)) for a, b in zip(first.tolist(), second.tolist())}
+        expected = set()
+        for a in range(len(points)):
+            for b in range(a + 1, len(points)):
+                if np.linalg.norm(points[a] - points[b]) < r_min:
+                    expected.add((a, b))
+        self.assertEqual(len(found), len(first))
+        self.assertSetEqual(found, expected)
+        np.testing.assert_allclose(distance, np.linalg.norm(points[first] - points[second], axis=1))
+
+    def test_near_points_with_small_radius_on_sparse_points(self):
+        points = np.array([[0.0, 0.0, 0.0], [0.05, 0.0, 0.0], [1000.0, 1000.0, 1000.0]])
+
+        [first, second, distance] = near_points(points, 1e-1)
+
+        self.assertListEqual(sorted([first[0], second[0]]), [0, 1])
+        self.assertEqual(len(distance), 1)
+
+
+class FilterTest(unittest.TestCase):
+
+    def test_run2_makes_weighted_average_of_near_elements(self):
+        cg = {1: [0.0, 0.0, 0.0], 2: [1.0, 0.0, 0.0], 3: [3.0, 0.0, 0.0], 4: [50.0, 0.0, 0.0]}
+        filter_matrix = prepare2s(cg, [0.0, 0.0, 0.0], [50.0, 0.0, 0.0], 2.5, [1, 2, 3])
+        sensitivity_number = np.array([1.0, 2.0, 4.0])  # ordered as filter_matrix.element_numbers
+
+        filtered = run2('', sensitivity_number, filter_matrix)
+
+        self.assertEqual(filter_matrix.empty_rows, 0)
+        self.assertListEqual(filter_matrix.element_numbers.tolist(), [1, 2, 3])
+        np.testing.assert_allclose(filtered, [2.0, (1.5 * 1.0 + 0.5 * 4.0) / 2.0, 2.0])
+
+    def test_run2_returns_unfiltered_numbers_when_element_has_no_near_element(self):
+        cg = {1: [0.0, 0.0, 0.0], 2: [1.0, 0.0, 0.0], 3: [9.0, 0.0, 0.0]}
+        filter_matrix = prepare2s(cg, [0.0, 0.0, 0.0], [9.0, 0.0, 0.0], 2.0, [1, 2, 3])
+        sensitivity_number = np.array([1.0, 2.0, 4.0])
+
+        filtered = run2('', sensitivity_number, filter_matrix)
+
+        self.assertEqual(filter_matrix.empty_rows, 1)
+        np.testing.assert_array_equal(filtered, sensitivity_number)
+
+
+if __name__ == '__main__':
+    unittest.main()
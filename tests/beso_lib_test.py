@@ -0,0 +1,310 @@
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from beso.beso_lib import (DatFollower, ElementNodeIncidence, EnergyDensityParser, absolute_include_paths,
+                           elm_volume_cg, parse_inp_template, split_inp_template_steps, split_inp_templates,
+                           switching)
+from beso.element_index import CATEGORIES, ElementIndex
+from beso.element_states import ElementStates
+
+DAT = """
+                        S T E P       1
+
+
+ stresses (elem, integ.pnt.,sxx,syy,szz,sxy,sxz,syz) for set EALL and time  0.1000000E+01
+
+         1    1  1.0E+00  1.0E+00  1.0E+00  1.0E+00  1.0E+00  1.0E+00
+
+ internal energy density (element, integration point, energy) for set EALL and time  0.1000000E+01
+
+         1    1  1.000000E+00
+         1    2  3.000000E+00
+         3    1  5.000000E+00
+
+ internal energy density (element, integration point, energy) for set OTHER and time  0.1000000E+01
+
+         2    1  9.000000E+00
+
+                        S T E P       2
+
+
+ internal energy density (element, integration point, energy) for set EALL and time  0.2000000E+01
+
+         1    1  4.000000E+00
+         2    1  6.000000E+00
+         2    2  8.000000E+00
+"""
+
+
+class EnergyDensityParserTest(unittest.TestCase):
+
+    def test_energy_densities_are_averaged_over_integration_points(self):
+        parser = EnergyDensityParser([1, 2, 3], ['Eall'])
+        parser.feed(DAT)
+
+        [energy_density_step, energy_density_eigen] = parser.close()
+
+        np.testing.assert_array_equal(energy_density_step, [[2.0, np.nan, 5.0], [4.0, 7.0, np.nan]])
+        self.assertDictEqual(energy_density_eigen, {})
+
+    def test_text_fed_in_chunks_gives_same_result(self):
+        parser = EnergyDensityParser([1, 2, 3], ['Eall'])
+        for position in range(0, len(DAT), 7):
+            parser.feed(DAT[position:position + 7])
+
+        [energy_density_step, _] = parser.close()
+
+        np.testing.assert_array_equal(energy_density_step, [[2.0, np.nan, 5.0], [4.0, 7.0, np.nan]])
+
+    def test_values_of_block_are_parsed_before_its_end(self):
+        parser = EnergyDensityParser([1, 2, 3], ['Eall'])
+        last_block = DAT.index(' internal energy density (element, integration point, energy) for set EALL and '
+                               'time  0.2')
+        parser.feed(DAT[:last_block])
+        block = DAT[last_block:]
+        # the block is fed without its end, integration points of element 2 are split between chunks
+        parser.feed(block[:block.index('2    2') + 3])
+
+        np.testing.assert_array_equal(parser.energy_density_step[-1], [4.0, np.nan, np.nan])
+        self.assertListEqual(parser.line_rest.split(), ['2'])  # only the incomplete line is kept
+
+        parser.feed(block[block.index('2    2') + 3:])
+        np.testing.assert_array_equal(parser.energy_density_step[-1], [4.0, np.nan, np.nan])
+        [energy_density_step, _] = parser.close()
+
+        np.testing.assert_array_equal(energy_density_step, [[2.0, np.nan, 5.0], [4.0, 7.0, np.nan]])
+
+
+class DatFollowerTest(unittest.TestCase):
+
+    def test_file_written_during_following_is_parsed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_nameW = os.path.join(directory, 'file000')
+            follower = DatFollower(file_nameW, EnergyDensityParser([1, 2, 3], ['Eall']), poll_interval=0.001)
+            follower.start()
+            with open(file_nameW + '.dat', 'w') as f:
+                for position in range(0, len(DAT), 50):
+                    f.write(DAT[position:position + 50])
+                    f.flush()
+                    time.sleep(0.001)
+
+            [energy_density_step, _] = follower.results()
+
+        np.testing.assert_array_equal(energy_density_step, [[2.0, np.nan, 5.0], [4.0, 7.0, np.nan]])
+
+
+INP = """*NODE
+1, 0.0, 0.0, 0.0
+*ELSET, ELSET=A
+1
+*STEP
+*STATIC
+*CLOAD
+1, 1, 10.0
+*NODE FILE
+U
+*END STEP
+*STEP
+*STATIC
+*CLOAD
+1, 2, 20.0
+*NODE FILE
+U
+*END STEP
+"""
+
+
+class SplitInpTemplateStepsTest(unittest.TestCase):
+
+    def test_each_load_case_contains_model_and_one_step(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'two_steps.inp')
+            with open(file_name, 'w') as f:
+                f.write(INP)
+            inp_template = parse_inp_template(file_name)
+
+        load_cases = split_inp_template_steps(inp_template)
+
+        self.assertEqual(len(load_cases), 2)
+        for load_case, cload in zip(load_cases, [b'1, 1, 10.0', b'1, 2, 20.0']):
+            text = b''.join(text for kind, text in load_case)
+            self.assertEqual(text.count(b'*STEP'), 1)
+            self.assertIn(b'*NODE\n1, 0.0', text)
+            self.assertIn(cload, text)
+            self.assertListEqual([kind for kind, text in load_case if kind not in ('static', 'optional')],
+                                 ['elsets', 'sections', 'outputs'])
+
+
+
+class SplitInpTemplatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        file_name = os.path.join(self.directory.name, 'two_steps.inp')
+        with open(file_name, 'w') as f:
+            f.write(INP)
+        self.load_cases = split_inp_template_steps(parse_inp_template(file_name))
+        self.file_nameI = os.path.join(self.directory.name, 'file_static')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def resolve_includes(self, inp_template):
+        text = b''.join(text for kind, text in inp_template)
+        for include_file in os.listdir(self.directory.name):
+            with open(os.path.join(self.directory.name, include_file), 'rb') as f:
+                text = text.replace(b'*INCLUDE, INPUT=' + include_file.encode() + b'\n', f.read())
+        return text
+
+    def test_static_segments_are_written_once_and_included(self):
+        with mock.patch('beso.beso_lib.INCLUDE_MIN_SIZE', 1):
+            [split_templates, include_files] = split_inp_templates(self.load_cases, self.file_nameI)
+
+        static_segments = set(text for load_case in self.load_cases for kind, text in load_case
+                              if kind == 'static' and text)
+        self.assertEqual(len(include_files), len(static_segments))  # the model shared by load cases only once
+        self.assertEqual(split_templates[0][0], split_templates[1][0])
+        for load_case, split_template in zip(self.load_cases, split_templates):
+            self.assertEqual(self.resolve_includes(split_template), b''.join(text for kind, text in load_case))
+
+    def test_segments_shorter_than_include_min_size_are_kept(self):
+        longest = max(len(text) for load_case in self.load_cases for kind, text in load_case if kind == 'static')
+        with mock.patch('beso.beso_lib.INCLUDE_MIN_SIZE', longest + 1):
+            [split_templates, include_files] = split_inp_templates(self.load_cases, self.file_nameI)
+        self.assertListEqual(split_templates, self.load_cases)
+        self.assertListEqual(include_files, [])
+
+        with mock.patch('beso.beso_lib.INCLUDE_MIN_SIZE', longest):
+            [split_templates, include_files] = split_inp_templates(self.load_cases, self.file_nameI)
+        for load_case, split_template in zip(self.load_cases, split_templates):
+            for [kind, text], [split_kind, split_text] in zip(load_case, split_template):
+                self.assertEqual(split_text.startswith(b'*INCLUDE'), kind == 'static' and len(text) == longest)
+        self.assertEqual(len(include_files), 2)  # steps of both load cases are of the same length
+
+class AbsoluteIncludePathsTest(unittest.TestCase):
+
+    def test_relative_include_paths_are_resolved_from_directory(self):
+        absolute_include = os.path.abspath('/mesh/nodes.inp')
+        inp_template = [('static', b'*INCLUDE, INPUT=loads.inp\n*include,input=' + absolute_include.encode() + b'\n'),
+                        ('elsets', b'')]
+
+        [(kind, text), elsets] = absolute_include_paths(inp_template, 'model')
+
+        self.assertEqual(text, b'*INCLUDE, INPUT=' + os.path.abspath(os.path.join('model', 'loads.inp')).encode() +
+                         b'\n*include,input=' + absolute_include.encode() + b'\n')
+        self.assertEqual(elsets, ('elsets', b''))
+
+
+class ElmVolumeCgTest(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = {}
+        self.elements = SimpleNamespace(**{category: {} for category in CATEGORIES})
+
+    def add_element(self, category, en, corners, mid_nodes=()):
+        """Element of category with nodes at corners followed by mid_nodes (mid-points of corner pairs)."""
+        points = list(corners) + [(np.array(corners[a]) + np.array(corners[b])) / 2 for a, b in mid_nodes]
+        node_numbers = list(range(len(self.nodes) + 1, len(self.nodes) + len(points) + 1))
+        self.nodes.update({nn: [float(c) for c in point] for nn, point in zip(node_numbers, points)})
+        getattr(self.elements, category)[en] = node_numbers
+
+    def box(self, origin, size):
+        [x, y, z] = origin
+        [a, b, c] = size
+        return [(x, y, z), (x + a, y, z), (x + a, y + b, z), (x, y + b, z),
+                (x, y, z + c), (x + a, y, z + c), (x + a, y + b, z + c), (x, y + b, z + c)]
+
+    def test_areas_and_centres_of_shells(self):
+        self.add_element('tria3', 1, [(0, 0, 0), (2, 0, 0), (0, 2, 0)])
+        self.add_element('quad4', 2, [(0, 0, 1), (2, 0, 1), (2, 1, 1), (0, 1, 1)])
+        self.add_element('quad8', 3, [(0, 0, 0), (0, 3, 0), (0, 3, 1), (0, 0, 1)],
+                         [(0, 1), (1, 2), (2, 3), (3, 0)])
+
+        [cg, cg_min, cg_max, volume_elm, area_elm] = elm_volume_cg('', self.nodes, self.elements)
+
+        self.assertDictEqual(volume_elm, {})
+        np.testing.assert_allclose([area_elm[1], area_elm[2], area_elm[3]], [2.0, 2.0, 3.0])
+        np.testing.assert_allclose(cg[1], [2 / 3, 2 / 3, 0.0])
+        np.testing.assert_allclose(cg[2], [1.0, 0.5, 1.0])
+        np.testing.assert_allclose(cg[3], [0.0, 1.5, 0.5])
+        np.testing.assert_allclose(cg_min, [0.0, 0.5, 0.0])
+        np.testing.assert_allclose(cg_max, [1.0, 1.5, 1.0])
+
+    def test_volumes_and_centres_of_split_volume_elements(self):
+        wedge = [(0, 0, 0), (3, 0, 0), (0, 3, 0), (0, 0, 2), (3, 0, 2), (0, 3, 2)]
+        self.add_element('tetra4', 1, [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)])
+        self.add_element('hexa8', 2, self.box((1, 0, 0), (2, 1, 1)))
+        # hexa20 and penta15 are split as hexa8 and penta6 by their corners
+        self.add_element('hexa20', 3, self.box((0, 2, 1), (1, 2, 3)),
+                         [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4),
+                          (0, 4), (1, 5), (2, 6), (3, 7)])
+        self.add_element('penta6', 4, wedge)
+        self.add_element('penta15', 5, [(x + 5, y, z) for x, y, z in wedge],
+                         [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (0, 3), (1, 4), (2, 5)])
+
+        [cg, cg_min, cg_max, volume_elm, area_elm] = elm_volume_cg('', self.nodes, self.elements)
+
+        self.assertDictEqual(area_elm, {})
+        np.testing.assert_allclose([volume_elm[en] for en in range(1, 6)], [1 / 6, 2.0, 6.0, 9.0, 9.0])
+        np.testing.assert_allclose(cg[1], [0.25, 0.25, 0.25])
+        np.testing.assert_allclose(cg[2], [2.0, 0.5, 0.5])
+        np.testing.assert_allclose(cg[3], [0.5, 3.0, 2.5])
+        np.testing.assert_allclose(cg[4], [1.0, 1.0, 1.0])
+        np.testing.assert_allclose(cg[5], [6.0, 1.0, 1.0])
+        np.testing.assert_allclose(cg_min, [0.25, 0.25, 0.25])
+        np.testing.assert_allclose(cg_max, [6.0, 3.0, 2.5])
+
+    def test_mid_nodes_of_second_order_elements_are_ignored(self):
+        self.add_element('hexa20', 1, self.box((0, 0, 0), (1, 1, 1)),
+                         [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4),
+                          (0, 4), (1, 5), (2, 6), (3, 7)])
+        self.nodes[9] = [0.5, -1.0, 0.0]  # mid-node of the first edge moved out of the element
+
+        [cg, _, _, volume_elm, _] = elm_volume_cg('', self.nodes, self.elements)
+
+        self.assertAlmostEqual(volume_elm[1], 1.0)
+        np.testing.assert_allclose(cg[1], [0.5, 0.5, 0.5])
+
+
+class ElementNodeIncidenceTest(unittest.TestCase):
+
+    def test_element_values_are_averaged_at_nodes(self):
+        categories = ['tria3', 'tria6', 'quad4', 'quad8', 'tetra4', 'tetra10', 'penta6', 'penta15', 'hexa8', 'hexa20']
+        elements = SimpleNamespace(**{category: {} for category in categories})
+        elements.tria3[8] = [3, 5, 6]
+        elements.quad4[2] = [1, 2, 5, 3]
+
+        incidence = ElementNodeIncidence(ElementIndex(elements))
+
+        self.assertListEqual(incidence.element_numbers.tolist(), [8, 2])
+        self.assertListEqual(incidence.node_numbers.tolist(), [1, 2, 3, 5, 6])
+        self.assertListEqual(incidence.valence.tolist(), [1, 1, 2, 2, 1])
+        self.assertListEqual(incidence.nodal_average([1.0, 0.0]).tolist(), [0.0, 0.0, 0.5, 0.5, 1.0])
+
+
+class SwitchingTest(unittest.TestCase):
+
+    def test_lowest_sensitivity_elements_are_switched_down(self):
+        elm_states = ElementStates([1, 2, 3, 4, 5], [1, 1, 1, 1, 0])
+        sensitivity_number = np.array([0.5, 0.1, 0.9, 0.2, 0.8])  # ordered as rows of element_index
+        volume_elm = {en: 1.0 for en in elm_states}
+        elements = SimpleNamespace(**{category: {} for category in CATEGORIES})
+        elements.hexa8.update({en: list(range(1, 9)) for en in [1, 2, 3, 4, 5]})
+        element_index = ElementIndex(elements, {'A': [1, 2, 3, 4, 5]}, ['A'], {}, volume_elm)
+
+        [elm_states, mass] = switching(elm_states, ['A'], {'A': True}, {'A': [0.0, 1.0]}, {'A': []}, element_index,
+                                       sensitivity_number, [4.0], 4.0, 0.25, 0.5, 0, 1, 0.0)
+
+        # element 5 is switched up first, then elements 2 and 4 are switched down
+        self.assertListEqual(elm_states.get([1, 2, 3, 4, 5]).tolist(), [1, 0, 1, 0, 1])
+        self.assertListEqual(mass, [4.0, 3.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from beso.checkpoint import load_checkpoint, save_checkpoint
+from beso.element_states import ElementStates
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint_file = os.path.join(self.directory.name, 'checkpoint.npz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_checkpoint_returns_saved_values(self):
+        elm_states = ElementStates([4, 2, 9], [1, 0, 1])
+        save_checkpoint(self.checkpoint_file, 3, elm_states, [3.0, 2.9, 2.8, 2.7], [0.5, 0.4, 0.45], [0.1, np.nan, 0.2],
+                        2, True, 1.2, ElementStates([4, 2, 9], [1, 1, 1]))
+
+        checkpoint = load_checkpoint(self.checkpoint_file, [4, 2, 9])
+
+        self.assertEqual(checkpoint['i'], 3)
+        self.assertEqual(checkpoint['elm_states'], elm_states)
+        self.assertListEqual(checkpoint['mass'], [3.0, 2.9, 2.8, 2.7])
+        self.assertListEqual(checkpoint['energy_density_mean'], [0.5, 0.4, 0.45])
+        np.testing.assert_array_equal(checkpoint['sensitivity_number_old'], [0.1, np.nan, 0.2])
+        self.assertEqual(checkpoint['i_violated'], 2)
+        self.assertTrue(checkpoint['check_tolerance'])
+        self.assertEqual(checkpoint['mass_goal_i'], 1.2)
+        self.assertListEqual(checkpoint['elm_states_before_last'].array.tolist(), [1, 1, 1])
+
+    def test_undefined_values_are_restored_as_none(self):
+        save_checkpoint(self.checkpoint_file, 1, ElementStates([1, 2]), [2.0, 1.9], [0.5], [], 0, False, None, None)
+
+        checkpoint = load_checkpoint(self.checkpoint_file, [1, 2])
+
+        self.assertIsNone(checkpoint['mass_goal_i'])
+        self.assertIsNone(checkpoint['elm_states_before_last'])
+
+    def test_missing_checkpoint_returns_none(self):
+        self.assertIsNone(load_checkpoint(self.checkpoint_file, [1, 2]))
+
+    def test_checkpoint_of_different_elements_is_rejected(self):
+        save_checkpoint(self.checkpoint_file, 1, ElementStates([1, 2]), [2.0], [], [], 0, False, None, None)
+        with self.assertRaises(ValueError):
+            load_checkpoint(self.checkpoint_file, [1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from beso.element_index import ElementIndex
+
+
+class Elements:
+    tria3 = {7: [1, 2, 3]}
+    tria6 = {}
+    quad4 = {2: [1, 2, 3, 4], 5: [2, 3, 4, 5]}
+    quad8 = {}
+    tetra4 = {9: [1, 2, 3, 6]}
+    tetra10 = {}
+    hexa8 = {4: [1, 2, 3, 4, 5, 6, 7, 8]}
+    hexa20 = {}
+    penta6 = {}
+    penta15 = {}
+
+
+class ElementIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        domains = {'plate': [2, 5, 7], 'solid': [9, 4], 'mixed': [5, 9, 12]}
+        self.element_index = ElementIndex(Elements, domains, ['plate', 'solid', 'mixed'])
+
+    def test_rows_follow_categories(self):
+        np.testing.assert_array_equal(self.element_index.element_numbers, [7, 2, 5, 9, 4])
+        np.testing.assert_array_equal(self.element_index.rows([4, 7, 5]), [4, 0, 2])
+        np.testing.assert_array_equal(self.element_index.nodes_per_element, [3, 4, 4, 4, 8])
+        np.testing.assert_array_equal(self.element_index.category_codes, [0, 2, 2, 4, 8])
+
+    def test_connectivity_follows_rows(self):
+        np.testing.assert_array_equal(self.element_index.connectivity[:11], [1, 2, 3, 1, 2, 3, 4, 2, 3, 4, 5])
+        self.assertEqual(len(self.element_index.connectivity), 23)
+
+    def test_shells_and_volumes_of_domains(self):
+        np.testing.assert_array_equal(self.element_index.shells('plate'), [7, 2, 5])
+        np.testing.assert_array_equal(self.element_index.volumes('plate'), [])
+        np.testing.assert_array_equal(self.element_index.volumes('solid'), [9, 4])
+        np.testing.assert_array_equal(self.element_index.shells('mixed'), [5])
+        np.testing.assert_array_equal(self.element_index.volumes('mixed'), [9])
+
+    def test_domain_rows_skip_elements_not_imported(self):
+        np.testing.assert_array_equal(self.element_index.domain_rows['solid'], [3, 4])
+        np.testing.assert_array_equal(self.element_index.domain_rows['mixed'], [2, 3])
+
+    def test_measure_is_area_of_shells_and_volume_of_volume_elements(self):
+        area_elm = {7: 0.5, 2: 1.0, 5: 2.0}
+        volume_elm = {9: 3.0, 4: 4.0}
+
+        element_index = ElementIndex(Elements, area_elm=area_elm, volume_elm=volume_elm)
+
+        np.testing.assert_array_equal(element_index.measure, [0.5, 1.0, 2.0, 3.0, 4.0])
+
+    def test_unknown_element_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            self.element_index.rows([2, 12])
+
+
+if __name__ == '__main__':
+    unittest.main()
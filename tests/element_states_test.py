@@ -0,0 +1,39 @@
+import unittest
+
+from beso.element_states import ElementStates
+
+
+class ElementStatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.elm_states = ElementStates([7, 3, 12], [1, 0, 1])
+
+    def test_states_are_accessed_by_element_numbers(self):
+        self.assertEqual(self.elm_states[3], 0)
+        self.assertListEqual(self.elm_states.get([12, 7]).tolist(), [1, 1])
+        self.elm_states.set([3, 12], [2, 0])
+        self.assertListEqual(self.elm_states.array.tolist(), [1, 2, 0])
+        self.assertListEqual(list(self.elm_states), [7, 3, 12])
+
+    def test_unknown_element_raises_key_error(self):
+        self.assertNotIn(5, self.elm_states)
+        with self.assertRaises(KeyError):
+            self.elm_states[5]
+        with self.assertRaises(KeyError):
+            self.elm_states.get([7, 5])
+
+    def test_fingerprint_follows_states(self):
+        snapshot = self.elm_states.copy()
+        self.elm_states[3] = 1
+        self.assertNotEqual(self.elm_states.fingerprint, snapshot.fingerprint)
+        self.assertNotEqual(self.elm_states, snapshot)
+        self.assertEqual(snapshot[3], 0)
+
+        self.elm_states[3] = 0
+        self.assertEqual(self.elm_states.fingerprint, snapshot.fingerprint)
+        self.assertEqual(self.elm_states, snapshot)
+        self.assertEqual(self.elm_states, ElementStates([7, 3, 12], [1, 0, 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
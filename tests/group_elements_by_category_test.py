@@ -1,5 +1,5 @@
 import unittest
-from beso.group_elements_by_category import group_elements_by_category
+from beso.group_elements_by_category import category_by_element_type, group_elements_by_category
 import os
 
 
@@ -31,6 +31,25 @@ class GroupElementsByCategory(unittest.TestCase):
             4: [40, 50, 60]
         })
 
+    def test_group_elements_by_category_separates_bricks_from_shells(self):
+        element_dict_by_type = {
+            'C3D8': {
+                1: [1, 2, 3, 4, 5, 6, 7, 8]
+            },
+            'S8': {
+                2: [1, 2, 3, 4, 5, 6, 7, 8]
+            }
+        }
+        element_dict_by_category = group_elements_by_category(element_dict_by_type)
+
+        self.assertDictEqual(element_dict_by_category['hexa8'], {1: [1, 2, 3, 4, 5, 6, 7, 8]})
+        self.assertDictEqual(element_dict_by_category['quad8'], {2: [1, 2, 3, 4, 5, 6, 7, 8]})
+
+    def test_category_by_element_type(self):
+        self.assertEqual(category_by_element_type['CPS4R'], 'quad4')
+        self.assertEqual(category_by_element_type['C3D20R'], 'hexa20')
+        self.assertNotIn('B31', category_by_element_type)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from beso.element_states import ElementStates
+from beso.history import HistoryReader, HistoryWriter
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'resulting_history.npz')
+        self.element_numbers = [5, 7, 9, 11]
+        self.states = [[1, 1, 1, 1], [1, 0, 1, 1], [1, 0, 0, 1], [1, 0, 0, 0], [0, 1, 0, 0]]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, iterations, resume_iteration=None, states=None):
+        writer = HistoryWriter(self.file_name, self.element_numbers, keyframe_interval=3,
+                               resume_iteration=resume_iteration)
+        for i in iterations:
+            sensitivity_number = i + 0.5 * np.arange(len(self.element_numbers))
+            writer.record(i, ElementStates(self.element_numbers, (states or self.states)[i]), sensitivity_number,
+                          10.0 - i, 0.1 * i)
+
+    def test_any_iteration_is_rebuilt(self):
+        self.write(range(5))
+
+        with HistoryReader(self.file_name) as reader:
+            self.assertListEqual(reader.iterations, [0, 1, 2, 3, 4])
+            for i in [4, 0, 2, 3, 1]:
+                self.assertListEqual(reader.states(i).tolist(), self.states[i])
+            self.assertListEqual(reader.switched(2).tolist(), [9])
+            self.assertListEqual(reader.switched(3).tolist(), [11])  # keyframe iteration
+            np.testing.assert_allclose(reader.sensitivity_number(2), [2.0, 2.5, 3.0, 3.5])
+            self.assertListEqual(reader.mass().tolist(), [10.0, 9.0, 8.0, 7.0, 6.0])
+            np.testing.assert_allclose(reader.energy_density_mean(), [0.0, 0.1, 0.2, 0.3, 0.4])
+
+    def test_resumed_run_appends_to_history(self):
+        self.write(range(3))
+        self.write(range(3, 5), resume_iteration=3)
+
+        with HistoryReader(self.file_name) as reader:
+            self.assertListEqual(reader.iterations, [0, 1, 2, 3, 4])
+            for i in range(5):
+                self.assertListEqual(reader.states(i).tolist(), self.states[i])
+
+    def test_resumed_run_replaces_records_from_resumed_iteration(self):
+        self.write(range(5))  # iterations 2 to 4 were recorded before the crash and are solved again
+        states_resumed = self.states[:2] + [[0, 0, 1, 1], [0, 0, 1, 0], [1, 0, 1, 0]]
+        self.write(range(2, 5), resume_iteration=2, states=states_resumed)
+
+        with HistoryReader(self.file_name) as reader:
+            names = reader.npz.zip.namelist()
+            self.assertEqual(len(names), len(set(names)))  # no duplicate members
+            self.assertListEqual(reader.iterations, [0, 1, 2, 3, 4])
+            for i in range(5):
+                self.assertListEqual(reader.states(i).tolist(), states_resumed[i])
+            self.assertListEqual(reader.switched(3).tolist(), [11])
+            self.assertListEqual(reader.mass().tolist(), [10.0, 9.0, 8.0, 7.0, 6.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+
+from beso.optimizer import Config, Optimizer
+
+INP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inp')
+
+
+class ConfigTest(unittest.TestCase):
+
+    def test_from_file_reads_options_and_ignores_other_variables(self):
+        with tempfile.TemporaryDirectory() as directory:
+            conf_file = os.path.join(directory, 'beso_conf.py')
+            with open(conf_file, 'w') as f:
+                f.write('elset_name = "solid"\n'
+                        'domain_optimized[elset_name] = True\n'
+                        'domain_density[elset_name] = [1e-6, 1]\n'
+                        'mass_goal_ratio = 0.3\n')
+
+            config = Config.from_file(conf_file)
+
+        self.assertDictEqual(config.domain_optimized, {'solid': True})
+        self.assertEqual(config.mass_goal_ratio, 0.3)
+        self.assertEqual(config.filter_radius, 0)
+        self.assertDictEqual(config.domain_offset, {'solid': 0.0})
+        self.assertFalse(hasattr(config, 'elset_name'))
+
+    def test_copy_overrides_options_without_changing_original(self):
+        config = Config(domain_optimized={'solid': True}, mass_goal_ratio=0.4)
+
+        overridden = config.copy(mass_goal_ratio=0.3)
+        overridden.domain_optimized['solid'] = False
+
+        self.assertEqual(overridden.mass_goal_ratio, 0.3)
+        self.assertEqual(config.mass_goal_ratio, 0.4)
+        self.assertDictEqual(config.domain_optimized, {'solid': True})
+
+    def test_unknown_option_raises_type_error(self):
+        with self.assertRaises(TypeError):
+            Config(mass_goal=0.3)
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)  # the log file is written to the working directory
+        with open(os.path.join(INP_DIR, '2DBeam.inp')) as f:
+            inp = f.read()
+        with open('2DBeam.inp', 'w') as f:  # without the special type elements added for import tests
+            f.write(inp[:inp.index('** axisymmetry elements')] + inp[inp.index('** Face elements'):])
+        dn = 'SolidMaterialElementGeometry2D'
+        self.config = Config(domain_optimized={dn: True}, domain_density={dn: [1e-6, 1]},
+                             domain_thickness={dn: [1.0, 1.0]},
+                             domain_material={dn: ['*ELASTIC \n210000e-6,  0.3', '*ELASTIC \n210000,  0.3']},
+                             file_name='2DBeam.inp', filter_radius=2, save_iteration_results=0,
+                             save_resulting_format='', solver_backend='mock')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_runs_reuse_prepared_model(self):
+        optimizer = Optimizer(self.config)
+        optimizer.prepare()
+        nodes = optimizer.nodes
+
+        result_light = optimizer.run(mass_goal_ratio=0.5)
+        result_heavy = optimizer.run(mass_goal_ratio=0.7)
+
+        self.assertIs(optimizer.nodes, nodes)
+        self.assertLess(result_light.mass[-1], result_heavy.mass[-1])
+        self.assertAlmostEqual(result_light.mass[-1] / result_light.mass[0], 0.5, delta=0.02)
+        self.assertEqual(len(result_light.mass), result_light.iterations + 1)
+        self.assertEqual(self.config.mass_goal_ratio, 0.4)
+
+    def test_callback_returning_true_stops_iterations(self):
+        iterations = []
+
+        def callback(i, elm_states, sensitivity_number, mass, energy_density_mean):
+            iterations.append(i)
+            return i == 2
+
+        result = Optimizer(self.config).run(callbacks=[callback])
+
+        self.assertListEqual(iterations, [0, 1, 2])
+        self.assertEqual(result.iterations, 2)
+
+    def test_scratch_directory_is_removed_after_error(self):
+        os.mkdir('scratch')
+
+        def callback(i, elm_states, sensitivity_number, mass, energy_density_mean):
+            if i == 1:
+                raise RuntimeError('stopped by an error')
+
+        with self.assertRaisesRegex(RuntimeError, 'stopped by an error'):
+            Optimizer(self.config).run(callbacks=[callback], scratch_dir='scratch')
+
+        self.assertListEqual(os.listdir('scratch'), [])
+
+    def test_split_solver_deck_writes_same_deck_with_includes(self):
+        def callback(i, elm_states, sensitivity_number, mass, energy_density_mean):
+            return i == 1
+
+        decks = {}
+        for split_solver_deck in [False, True]:
+            os.mkdir(str(split_solver_deck))
+            os.chdir(str(split_solver_deck))
+            with open(os.path.join('..', '2DBeam.inp')) as f:
+                inp = f.read()
+            with open('2DBeam.inp', 'w') as f:
+                f.write(inp)
+            Optimizer(self.config).run(callbacks=[callback], split_solver_deck=split_solver_deck,
+                                       save_solver_files='inp')
+            with open('file001.inp') as f:
+                decks[split_solver_deck] = f.read()
+            include_files = sorted(file_name for file_name in os.listdir('.') if file_name.startswith('file_static'))
+            resolved = []
+            for line in decks[split_solver_deck].splitlines(keepends=True):
+                if line.upper().startswith('*INCLUDE, INPUT=FILE_STATIC'):
+                    with open(line.split('=', 1)[1].strip()) as f:
+                        line = f.read()
+                resolved.append(line)
+            os.chdir('..')
+
+        self.assertListEqual(include_files, ['file_static000.inp'])  # the mesh, other segments are short
+        self.assertEqual(decks[True].count('*INCLUDE'), 1)
+        self.assertLess(len(decks[True]), len(decks[False]) / 2)
+        self.assertEqual(''.join(resolved), decks[False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+from beso.beso_lib import export_convergence
+from beso.plot import read_convergence
+
+
+class ReadConvergenceTest(unittest.TestCase):
+
+    def test_read_convergence_returns_exported_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'convergence.csv')
+            export_convergence(file_name, [1080.0, 1047.0, 1015.5], [3.769216398656401, 3.7737126516418895, 3.8])
+
+            [mass, energy_density_mean] = read_convergence(file_name)
+
+        self.assertListEqual(mass, [1080.0, 1047.0, 1015.5])
+        self.assertListEqual(energy_density_mean, [3.769216398656401, 3.7737126516418895, 3.8])
+
+    def test_read_convergence_skips_not_evaluated_last_iteration(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'convergence.csv')
+            export_convergence(file_name, [1080.0, 1047.0], [3.769216398656401])
+
+            [mass, energy_density_mean] = read_convergence(file_name)
+
+        self.assertListEqual(mass, [1080.0, 1047.0])
+        self.assertListEqual(energy_density_mean, [3.769216398656401])
+
+
+if __name__ == '__main__':
+    unittest.main()
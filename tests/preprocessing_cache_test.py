@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from beso.beso_filters import prepare2s
+from beso.beso_lib import elm_volume_cg
+from beso.import_inp import import_inp
+from beso.preprocessing_cache import get_cache_key, load_preprocessed, save_preprocessed
+
+
+class PreprocessingCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(os.path.abspath(
+            os.path.dirname(__file__)), 'inp', '2DBeam.inp')
+        self.domain_optimized = {'SolidMaterialElementGeometry2D': True}
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_load_preprocessed_returns_saved_values(self):
+        mesh = import_inp(self.filename, list(self.domain_optimized), self.domain_optimized)
+        geometry = elm_volume_cg(self.filename, mesh[0], mesh[1])
+        filter_matrix = prepare2s(geometry[0], geometry[1], geometry[2], 2, mesh[3])
+        cache_key = get_cache_key(self.filename, self.domain_optimized, 2)
+        save_preprocessed(self.cache_dir.name, cache_key, list(mesh), list(geometry), filter_matrix)
+
+        [cached_mesh, cached_geometry, cached_filter_matrix] = load_preprocessed(self.cache_dir.name, cache_key)
+
+        self.assertDictEqual(cached_mesh[0], mesh[0])
+        self.assertDictEqual(cached_mesh[1].quad4, mesh[1].quad4)
+        self.assertDictEqual(cached_mesh[2], mesh[2])
+        self.assertListEqual(cached_mesh[3], mesh[3])
+        self.assertSetEqual(cached_mesh[4], mesh[4])
+        self.assertSetEqual(cached_mesh[6], mesh[6])
+        self.assertDictEqual(cached_geometry[0], geometry[0])
+        self.assertDictEqual(cached_geometry[4], geometry[4])
+        self.assertEqual(cached_filter_matrix.empty_rows, filter_matrix.empty_rows)
+        np.testing.assert_array_equal(cached_filter_matrix.data, filter_matrix.data)
+
+    def test_cache_key_depends_on_filter_radius(self):
+        self.assertNotEqual(get_cache_key(self.filename, self.domain_optimized, 2),
+                            get_cache_key(self.filename, self.domain_optimized, 3))
+        self.assertIsNone(load_preprocessed(self.cache_dir.name, 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from beso.beso_lib import run_ccx_jobs
+from beso.element_states import ElementStates
+from beso.solvers import MockSolver, check_job_results, check_missing_elements, write_energy_density_dat
+
+
+class MockSolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.domains = {'A': [1, 2], 'B': [3]}
+        self.cg = {1: [0.0, 0.0, 0.0], 2: [1.0, 0.5, 0.0], 3: [2.0, 1.0, 0.0]}
+        self.elm_states = ElementStates([1, 2, 3], [1, 0, 1])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def solve(self, solver, job_names):
+        return solver.solve([os.path.join(self.directory.name, job_name) for job_name in job_names], self.elm_states)
+
+    def test_energy_densities_are_written_and_parsed_back(self):
+        solver = MockSolver(self.domains, ['A', 'B'], [1, 2, 3], self.cg, 2)
+
+        [energy_density_step, energy_density_eigen] = self.solve(solver, ['file000_lc0', 'file000_lc1'])
+
+        self.assertEqual(energy_density_step.shape, (2, 3))
+        np.testing.assert_allclose(energy_density_step[0], solver.energy_density(0, self.elm_states)[0], rtol=1e-6)
+        np.testing.assert_allclose(energy_density_step[1], solver.energy_density(1, self.elm_states)[0], rtol=1e-6)
+        self.assertLess(energy_density_step[0][1], energy_density_step[0][0])  # element 2 is in the lower state
+        self.assertDictEqual(energy_density_eigen, {os.path.join(self.directory.name, 'file000_lc0'): {},
+                                                    os.path.join(self.directory.name, 'file000_lc1'): {}})
+        for extension in ['frd', 'sta', 'cvg']:
+            self.assertTrue(os.path.isfile(os.path.join(self.directory.name, 'file000_lc0.' + extension)))
+
+    def test_recorded_dat_is_replayed(self):
+        recording = MockSolver(self.domains, ['A', 'B'], [1, 2, 3], self.cg, 2)
+        [recorded, _] = self.solve(recording, ['recorded'])
+
+        solver = MockSolver(self.domains, ['A', 'B'], [1, 2, 3], self.cg, 2,
+                            os.path.join(self.directory.name, 'recorded.dat'))
+        self.elm_states.set([1, 2, 3], 0)
+        [energy_density_step, _] = self.solve(solver, ['file001'])
+
+        np.testing.assert_allclose(energy_density_step, recorded, rtol=1e-6)
+
+    def test_recorded_dat_without_some_elements_raises_error(self):
+        recorded_dat = os.path.join(self.directory.name, 'recorded')
+        write_energy_density_dat(recorded_dat, self.domains, ['A'], [1, 2, 3], np.ones((1, 3)))
+
+        with self.assertRaisesRegex(RuntimeError, 'Energy densities of 1 elements not found .* elements \\[3\\]'):
+            MockSolver(self.domains, ['A', 'B'], [1, 2, 3], self.cg, 2, recorded_dat + '.dat')
+
+
+class CheckJobResultsTest(unittest.TestCase):
+
+    def test_job_without_energy_densities_raises_error_naming_it(self):
+        energy_density_step_jobs = [np.ones((1, 3)), np.empty((0, 3)), np.ones((2, 3))]
+
+        with self.assertRaisesRegex(RuntimeError, 'file000_lc1 \\(no energy densities'):
+            check_job_results(['file000_lc0', 'file000_lc1', 'file000_lc2'], energy_density_step_jobs)
+
+    def test_job_with_exit_code_raises_error_naming_it(self):
+        energy_density_step_jobs = [np.ones((1, 3)), np.ones((1, 3))]
+
+        with self.assertRaisesRegex(RuntimeError, 'file000_lc0 \\(exit code 201\\)'):
+            check_job_results(['file000_lc0', 'file000_lc1'], energy_density_step_jobs, [201, 0])
+        check_job_results(['file000_lc0', 'file000_lc1'], energy_density_step_jobs, [0, 0])
+
+    def test_elements_missing_in_dat_raise_error_naming_them(self):
+        with self.assertRaisesRegex(RuntimeError, 'Energy densities of 2 elements not found in file000_lc1.dat, '
+                                                  'e.g. elements \\[2, 3\\]'):
+            check_missing_elements('file000_lc1', np.array([1, 2, 3]), np.array([[1.0, np.nan, 5.0],
+                                                                                 [4.0, 7.0, np.nan]]))
+        check_missing_elements('file000_lc0', np.array([1, 2, 3]), np.ones((2, 3)))
+
+    @unittest.skipUnless(sys.platform == 'linux', 'the solver is run without a shell only on linux')
+    def test_run_ccx_jobs_returns_exit_codes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ccx_path = os.path.join(directory, 'ccx')
+            with open(ccx_path, 'w') as f:
+                f.write('#!/bin/sh\n[ "$1" = "failing" ] && exit 201\nexit 0\n')
+            os.chmod(ccx_path, os.stat(ccx_path).st_mode | stat.S_IEXEC)
+
+            exit_codes = run_ccx_jobs(ccx_path, ['file000', 'failing'], directory, 2, jobs_limit=2)
+
+        self.assertListEqual(exit_codes, [0, 201])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from beso.beso_lib import export_convergence
+from beso.sweep import expand_grid, parse_grid, read_input_file, read_job_result, read_log_table, write_job
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expand_grid_returns_all_combinations(self):
+        parameter_sets = expand_grid({'mass_goal_ratio': [0.3, 0.4], 'filter_radius': [2, 3]})
+
+        self.assertListEqual(parameter_sets, [{'mass_goal_ratio': 0.3, 'filter_radius': 2},
+                                              {'mass_goal_ratio': 0.3, 'filter_radius': 3},
+                                              {'mass_goal_ratio': 0.4, 'filter_radius': 2},
+                                              {'mass_goal_ratio': 0.4, 'filter_radius': 3}])
+
+    def test_parse_grid_evaluates_literals(self):
+        grid = parse_grid(['mass_goal_ratio=0.3,0.4', 'sensitivity_averaging=True', 'save_solver_files=""'])
+
+        self.assertDictEqual(grid, {'mass_goal_ratio': [0.3, 0.4], 'sensitivity_averaging': [True],
+                                    'save_solver_files': ['']})
+
+    def test_write_job_overrides_base_configuration(self):
+        input_file = os.path.join(self.directory.name, 'model.inp')
+        with open(input_file, 'w') as f:
+            f.write('*INCLUDE, INPUT=mesh.inp\n*STEP\n')
+        job_dir = os.path.join(self.directory.name, 'job000')
+
+        conf_file = write_job(job_dir, 'path = "model"\nfilter_radius = 2\n', input_file, {'filter_radius': 3}, 2)
+
+        conf = {}
+        with open(conf_file) as f:
+            exec(f.read(), conf)
+        self.assertEqual(conf['path'], '.')
+        self.assertEqual(conf['file_name'], 'model.inp')
+        self.assertEqual(conf['cpu_cores'], 2)
+        self.assertEqual(conf['filter_radius'], 3)
+        self.assertTrue(conf['headless'])
+        with open(os.path.join(job_dir, 'model.inp')) as f:
+            self.assertEqual(f.readline().strip(),
+                             '*INCLUDE, INPUT=' + os.path.join(os.path.abspath(self.directory.name), 'mesh.inp'))
+
+    def test_read_input_file_joins_path_and_file_name(self):
+        conf_file = os.path.join(self.directory.name, 'beso_conf.py')
+        with open(conf_file, 'w') as f:
+            f.write('path = "models"\nfile_name = "beam.inp"\ndomain_optimized["solid"] = True\n')
+
+        self.assertEqual(read_input_file(conf_file), os.path.join('models', 'beam.inp'))
+
+    def test_read_log_table_returns_last_row(self):
+        log_file = os.path.join(self.directory.name, 'beam.log')
+        with open(log_file, 'w') as f:
+            f.write('INFO:root:\n   i              mass    ener_dens_mean\n\n'
+                    'INFO:root:   0            1080.0   3.769216398656401\n'
+                    'INFO:root:   1            1069.2  3.7737126516418895\n'
+                    'INFO:root:\nFinished at  Sun Oct 18 19:44:58 2026\n')
+
+        self.assertTupleEqual(read_log_table(log_file), (1, 1069.2, 3.7737126516418895))
+        self.assertIsNone(read_log_table(os.path.join(self.directory.name, 'missing.log')))
+
+    def test_read_job_result_returns_last_evaluated_iteration(self):
+        export_convergence(os.path.join(self.directory.name, 'convergence.csv'), [1080.0, 1047.0, 1015.5],
+                           [3.769216398656401, 3.7737126516418895])
+
+        self.assertTupleEqual(read_job_result(self.directory.name, 'beam.log'), (1, 1047.0, 3.7737126516418895))
+
+
+if __name__ == '__main__':
+    unittest.main()
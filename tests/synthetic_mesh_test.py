@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from beso.beso_lib import elm_volume_cg, import_FI_int_pt
+from beso.import_inp import import_inp
+from beso.synthetic_mesh import ELEMENT_TYPES, NONDESIGN_SET, OPTIMIZED_SET, StructuredMesh, grid_divisions
+
+
+class SyntheticMeshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_grid_divisions_approximate_element_count(self):
+        self.assertTupleEqual(grid_divisions('hexa8', 2000), (20, 10, 10))
+        self.assertTupleEqual(grid_divisions('quad4', 2000), (64, 32))
+        self.assertTupleEqual(grid_divisions('tetra4', 48), (4, 2, 2))
+
+    def test_written_deck_is_imported_with_positive_volumes(self):
+        domains_from_config = [OPTIMIZED_SET, NONDESIGN_SET]
+        for category in ELEMENT_TYPES:
+            with self.subTest(category=category):
+                mesh = StructuredMesh(category, 200)
+                file_name = os.path.join(self.directory.name, category + '.inp')
+                mesh.write_inp(file_name, steps=2)
+
+                [nodes, Elements, domains, opt_domains] = import_inp(
+                    file_name, domains_from_config, {OPTIMIZED_SET: True, NONDESIGN_SET: False})[:4]
+                [volume_elm, area_elm] = elm_volume_cg(file_name, nodes, Elements)[3:]
+
+                self.assertEqual(len(getattr(Elements, category)), len(mesh))
+                self.assertCountEqual(opt_domains, mesh.element_numbers[mesh.optimized].tolist())
+                self.assertCountEqual(domains[NONDESIGN_SET], mesh.domains[NONDESIGN_SET])
+                measures = list(volume_elm.values()) + list(area_elm.values())
+                self.assertGreater(min(measures), 0)
+                self.assertAlmostEqual(sum(measures), np.prod(mesh.divisions))
+
+    def test_written_deck_defines_section_of_every_element_set(self):
+        for category in ['quad4', 'hexa8']:
+            with self.subTest(category=category):
+                file_name = os.path.join(self.directory.name, category + '.inp')
+                StructuredMesh(category, 100).write_inp(file_name)
+                with open(file_name) as f:
+                    lines = f.read().splitlines()
+
+                elsets = [line.split('=')[1] for line in lines if line.startswith('*ELSET')]
+                materials = [line.split('=')[1] for line in lines if line.startswith('*MATERIAL')]
+                sections = {}  # elset: [material, line after the section]
+                for position, line in enumerate(lines):
+                    if line.startswith('*SOLID SECTION'):
+                        options = dict(option.strip().split('=') for option in line.split(',')[1:])
+                        sections[options['ELSET']] = [options['MATERIAL'], lines[position + 1]]
+
+                self.assertCountEqual(elsets, [OPTIMIZED_SET, NONDESIGN_SET])
+                self.assertCountEqual(sections, elsets)
+                for [material, next_line] in sections.values():
+                    self.assertIn(material, materials)
+                    # plane stress elements need a thickness
+                    self.assertEqual(next_line, '1.0' if category == 'quad4' else '')
+
+    def test_written_dat_is_parsed_as_calculix_results(self):
+        mesh = StructuredMesh('hexa8', divisions=(4, 2, 2))
+        file_nameW = os.path.join(self.directory.name, 'hexa8')
+        mesh.write_dat(file_nameW, steps=2)
+
+        energy_density_step = import_FI_int_pt(file_nameW, mesh.element_numbers, list(mesh.domains))[0]
+
+        np.testing.assert_allclose(energy_density_step, mesh.energy_density(2), rtol=1e-6)
+        self.assertGreater(energy_density_step[0, 0], energy_density_step[0, -1])  # highest at the fixed end
+
+    def test_unknown_category_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            StructuredMesh('penta6', 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+
+from beso.background import BackgroundWorker
+from beso.telemetry import Telemetry
+
+
+class TelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'telemetry.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_lines(self):
+        with open(self.file_name) as f:
+            return [json.loads(line) for line in f]
+
+    def test_record_writes_times_of_phases_since_previous_record(self):
+        telemetry = Telemetry(self.file_name)
+        with telemetry.phase('write_inp'):
+            pass
+        with telemetry.phase('write_inp'):
+            pass
+        telemetry.record(iteration=0, switched_up=1, switched_down=2)
+        with telemetry.phase('solver'):
+            pass
+        telemetry.record(iteration=1)
+        telemetry.close()
+
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]['iteration'], 0)
+        self.assertEqual(lines[0]['switched_down'], 2)
+        self.assertListEqual(list(lines[0]['time']), ['write_inp'])
+        self.assertListEqual(list(lines[1]['time']), ['solver'])
+        self.assertNotIn('memory_peak', lines[0])
+
+    def test_memory_adds_peaks_of_phases(self):
+        telemetry = Telemetry(self.file_name, memory=True)
+        with telemetry.phase('switching'):
+            data = list(range(10000))
+        telemetry.record(iteration=0)
+        telemetry.close()
+
+        line = self.read_lines()[0]
+        self.assertGreater(line['memory_peak']['switching'], 10000 * 8)
+        self.assertIn('rss_peak_kb', line)
+        del data
+
+    def test_memory_peaks_of_phases_without_reset_peak(self):
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)  # missing before Python 3.9
+        if reset_peak:
+            del tracemalloc.reset_peak
+        try:
+            telemetry = Telemetry(self.file_name, memory=True)
+            with telemetry.phase('export'):
+                data = list(range(100000))
+                del data
+            with telemetry.phase('switching'):
+                data = list(range(1000))
+            telemetry.record(iteration=0)
+            telemetry.close()
+        finally:
+            if reset_peak:
+                tracemalloc.reset_peak = reset_peak
+
+        memory_peak = self.read_lines()[0]['memory_peak']
+        self.assertGreater(memory_peak['export'], 100000 * 8)
+        self.assertGreater(memory_peak['switching'], 1000 * 8)
+        self.assertLess(memory_peak['switching'], 100000 * 8)
+        del data
+
+    def test_profile_dumps_stats_of_each_phase(self):
+        profile_dir = os.path.join(self.directory.name, 'profiles')
+        telemetry = Telemetry(self.file_name, profile_dir=profile_dir)
+        with telemetry.phase('filtering'):
+            sorted(range(100))
+        telemetry.close()
+
+        self.assertListEqual(os.listdir(profile_dir), ['filtering.prof'])
+
+    def test_background_tasks_are_timed_by_function_name(self):
+        telemetry = Telemetry(self.file_name)
+        worker = BackgroundWorker(telemetry=telemetry)
+        worker.submit(sorted, [3, 1, 2])
+        worker.close()
+        telemetry.record(iteration=0)
+
+        self.assertListEqual(list(self.read_lines()[0]['time']), ['sorted'])
+
+    def test_memory_lists_phases_overlapping_background_tasks(self):
+        telemetry = Telemetry(self.file_name, memory=True)
+        worker = BackgroundWorker(telemetry=telemetry)
+        event = threading.Event()
+        worker.submit(event.wait)
+        with telemetry.phase('solver'):
+            event.set()
+            worker.flush()
+        with telemetry.phase('switching'):
+            pass
+        worker.close()
+        telemetry.record(iteration=0)
+        telemetry.close()
+
+        line = self.read_lines()[0]
+        self.assertListEqual(sorted(line['memory_peak']), ['solver', 'switching'])
+        self.assertListEqual(line['memory_shared'], ['solver'])
+
+    def test_disabled_telemetry_writes_nothing(self):
+        telemetry = Telemetry()
+        with telemetry.phase('solver'):
+            pass
+        telemetry.record(iteration=0)
+        telemetry.close()
+
+        self.assertFalse(os.path.exists(self.file_name))
+
+
+if __name__ == '__main__':
+    unittest.main()
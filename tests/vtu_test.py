@@ -0,0 +1,88 @@
+import os
+import re
+import tempfile
+import unittest
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from beso.element_index import ElementIndex
+from beso.element_states import ElementStates
+from beso.vtu import PvdSeries, VtuMesh, export_vtu
+
+
+def read_vtu(file_name):
+    """Arrays of a .vtu file with appended raw data by their names."""
+    with open(file_name, 'rb') as f:
+        content = f.read()
+    [header, appended] = content.split(b'<AppendedData encoding="raw">\n_')
+    header = header.decode()
+    compressed = 'vtkZLibDataCompressor' in header
+    arrays = {}
+    for attributes in re.findall(r'<DataArray ([^>]*)/>', header):
+        array_type = re.search(r'type="(\w+)"', attributes).group(1)
+        name = re.search(r'Name="(\w+)"', attributes)
+        offset = int(re.search(r'offset="(\d+)"', attributes).group(1))
+        if compressed:
+            [blocks, _, _] = np.frombuffer(appended, dtype='<u8', count=3, offset=offset)
+            sizes = np.frombuffer(appended, dtype='<u8', count=int(blocks), offset=offset + 24)
+            start = offset + 24 + 8 * int(blocks)
+            data = b''
+            for size in sizes.tolist():
+                data += zlib.decompress(appended[start:start + size])
+                start += size
+        else:
+            size = int(np.frombuffer(appended, dtype='<u8', count=1, offset=offset)[0])
+            data = appended[offset + 8:offset + 8 + size]
+        dtype = {'Float64': '<f8', 'Int64': '<i8', 'UInt8': 'u1'}[array_type]
+        arrays[name.group(1) if name else 'Points'] = np.frombuffer(data, dtype=dtype)
+    return arrays
+
+
+class VtuTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.nodes = {1: [0.0, 0.0, 0.0], 2: [1.0, 0.0, 0.0], 3: [1.0, 1.0, 0.0], 4: [0.0, 1.0, 0.0],
+                      5: [2.0, 0.0, 0.0], 9: [5.0, 5.0, 5.0]}
+        categories = ['tria3', 'tria6', 'quad4', 'quad8', 'tetra4', 'tetra10', 'penta6', 'penta15', 'hexa8', 'hexa20']
+        self.elements = SimpleNamespace(**{category: {} for category in categories})
+        self.elements.tria3[20] = [2, 5, 3]
+        self.elements.quad4[10] = [1, 2, 3, 4]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_results_are_written_with_topology(self):
+        for compress in [True, False]:
+            vtu_mesh = VtuMesh(self.nodes, ElementIndex(self.elements), compress=compress)
+            file_nameW = os.path.join(self.directory.name, 'file000')
+            export_vtu(file_nameW, vtu_mesh, ElementStates([10, 20], [1, 0]), np.array([0.25, 0.5]))
+
+            arrays = read_vtu(file_nameW + '.vtu')
+
+            self.assertListEqual(arrays['Points'].reshape(-1, 3).tolist(),
+                                 [self.nodes[nn] for nn in [1, 2, 3, 4, 5]])  # node 9 is not in any element
+            self.assertListEqual(arrays['connectivity'].tolist(), [1, 4, 2, 0, 1, 2, 3])
+            self.assertListEqual(arrays['offsets'].tolist(), [3, 7])
+            self.assertListEqual(arrays['types'].tolist(), [5, 9])
+            self.assertListEqual(arrays['element_states'].tolist(), [0, 1])
+            self.assertListEqual(arrays['sensitivity_number'].tolist(), [0.25, 0.5])
+            self.assertListEqual(arrays['element_states_averaged_at_nodes'].tolist(), [1.0, 0.5, 0.5, 1.0, 0.0])
+
+    def test_pvd_series_keeps_iterations_before_resumed_one(self):
+        file_name = os.path.join(self.directory.name, 'resulting_states.pvd')
+        pvd_series = PvdSeries(file_name)
+        for i in range(1, 4):
+            pvd_series.add(i, 'resulting_states' + str(i).zfill(3) + '.vtu')
+
+        resumed_series = PvdSeries(file_name, resume=True)
+        resumed_series.add(3, 'resulting_states003.vtu')
+
+        with open(file_name) as f:
+            self.assertListEqual(re.findall(r'timestep="(\d+)"', f.read()), ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()